@@ -25,6 +25,11 @@ def create_app(config_class=Config):
     else:
         app.config.from_object(config_class)
     
+    # Encode JSON with orjson when it is installed; the output is the same
+    from app.serializers import FastJSONProvider, orjson
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
+    
     # Configure logging
     import logging
     from logging.handlers import RotatingFileHandler
@@ -56,8 +61,25 @@ def create_app(config_class=Config):
     app.logger.info(f'Logging level: {logging.getLevelName(log_level)}')
     app.logger.info(f'Application root: {os.path.abspath(os.curdir)}')
     
-    # Initialize extensions
+    # Initialize extensions, with connection pools sized for this process' role
+    from app.database import engine_options, configure_sqlite
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config['SQLITE_PRAGMAS'])
+        
+        # Per-request query counts for spotting N+1 queries
+        from app.query_count import init_query_count
+        init_query_count(app, db.engine)
+    
+    # Cached pages and listings are invalidated as public analyses change
+    from app.page_cache import init_page_cache
+    init_page_cache(app)
+    
+    # Cached JSON of changed analyses is dropped as they change
+    from app.serializers import init_serializer_cache
+    init_serializer_cache(app)
+    
     csrf.init_app(app)
     mail.init_app(app)
     
@@ -91,6 +113,16 @@ def create_app(config_class=Config):
     # Create database tables
     with app.app_context():
         db.create_all()
+        
+        # Full-text search index and the triggers keeping it in sync
+        from app.search import get_search_backend
+        get_search_backend(app).install()
+    
+    # Start the analysis workers now instead of on the first submission, so
+    # jobs interrupted by a crash or deploy resume right away
+    if app.config.get('PIPELINE_AUTOSTART'):
+        from app.pipeline import get_analysis_pipeline
+        get_analysis_pipeline(app)
     
     # Add context processor to make current year available in all templates
     @app.context_processor
@@ -98,6 +130,12 @@ def create_app(config_class=Config):
         from datetime import datetime
         return {'now': datetime.utcnow()}
     
+    # Favorite status for templates; resolve a page's IDs with favorited_ids() first
+    @app.context_processor
+    def inject_favorites():
+        from app.favorites import favorited_ids, is_favorited
+        return {'favorited_ids': favorited_ids, 'is_favorited': is_favorited}
+    
     # Initialize database with admin user if in development
     if app.config.get('FLASK_ENV') == 'development':
         try:
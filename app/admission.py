@@ -0,0 +1,234 @@
+import math
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from .models import db, Analysis, StageTiming
+from .database import write
+
+def _fit_line(points):
+    """Least-squares fit of elapsed = overhead + rate * segment_seconds.
+
+    Returns:
+        tuple: (overhead, rate), both clamped to be non-negative
+    """
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+
+    # All timings are for the same segment length: only the ratio is known
+    if var_x < 1e-9:
+        return 0.0, (mean_y / mean_x if mean_x else 0.0)
+
+    rate = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    rate = max(rate, 0.0)
+    return max(mean_y - rate * mean_x, 0.0), rate
+
+class CostModel:
+    """Estimate the worker-seconds an analysis will take.
+
+    Every stage is modelled as ``overhead + rate * segment_seconds``, fitted
+    to the most recent StageTiming rows of that stage, profile and backend.
+    Stages with fewer than COST_MODEL_MIN_SAMPLES timings fall back to the
+    profile's COST_MODEL_DEFAULTS.
+    """
+
+    def __init__(self, defaults, fitted=None):
+        self.defaults = defaults
+        self.fitted = fitted or {}  # (stage, profile, backend) -> (overhead, rate)
+        self.created = time.monotonic()
+
+    @classmethod
+    def calibrate(cls, config):
+        """Fit a model to the recorded stage timings."""
+        ranked = db.session.query(
+            StageTiming.stage, StageTiming.profile, StageTiming.backend,
+            StageTiming.segment_seconds, StageTiming.elapsed_seconds,
+            func.row_number().over(
+                partition_by=(StageTiming.stage, StageTiming.profile, StageTiming.backend),
+                order_by=StageTiming.id.desc()
+            ).label('rank')
+        ).subquery()
+        rows = db.session.query(ranked).filter(ranked.c.rank <= config['COST_MODEL_HISTORY']).all()
+
+        samples = {}
+        for row in rows:
+            samples.setdefault((row.stage, row.profile, row.backend), []).append(
+                (row.segment_seconds, row.elapsed_seconds))
+
+        fitted = {key: _fit_line(points) for key, points in samples.items()
+                  if len(points) >= config['COST_MODEL_MIN_SAMPLES']}
+        return cls(config['COST_MODEL_DEFAULTS'], fitted)
+
+    def stage_cost(self, stage, segment_seconds, profile, backend):
+        """Estimated seconds one stage takes for a segment."""
+        overhead, rate = self.fitted.get((stage, profile, backend),
+                                         self.defaults[profile][stage])
+        return overhead + rate * segment_seconds
+
+    def estimate(self, segment_seconds, profile, backend):
+        """Estimated seconds a whole analysis takes, summed over its stages."""
+        return sum(self.stage_cost(stage, segment_seconds, profile, backend)
+                   for stage in self.defaults[profile])
+
+def get_cost_model(app=None):
+    """Return this process' cost model, recalibrating it every COST_MODEL_REFRESH seconds."""
+    app = app or current_app._get_current_object()
+    model = app.extensions.get('cost_model')
+    if model is None or time.monotonic() - model.created > app.config['COST_MODEL_REFRESH']:
+        model = CostModel.calibrate(app.config)
+        app.extensions['cost_model'] = model
+    return model
+
+def profile_backend(profile):
+    """Return the pitch backend an analysis profile runs with."""
+    profiles = current_app.config['ANALYSIS_PROFILES']
+    return profiles.get(profile, profiles[current_app.config['DEFAULT_PROFILE']])['backend']
+
+def estimate_cost(segment_seconds, profile=None):
+    """Estimate the worker-seconds needed to analyze a segment with a profile."""
+    profile = profile or current_app.config['DEFAULT_PROFILE']
+    return get_cost_model().estimate(segment_seconds, profile, profile_backend(profile))
+
+def record_stage_timing(analysis_id, stage, profile, segment_seconds, elapsed_seconds):
+    """Store how long a stage took so the cost model can learn from it."""
+    write(db.session.add, StageTiming(
+        analysis_id=analysis_id,
+        stage=stage,
+        profile=profile,
+        backend=profile_backend(profile),
+        segment_seconds=segment_seconds,
+        elapsed_seconds=elapsed_seconds
+    ), wait=False)
+
+class Admission:
+    """Outcome of an admission check for a new or requeued analysis."""
+
+    def __init__(self, cost, wait, profile, status_code=None, error=None, retry_after=None):
+        self.cost = cost  # Estimated worker-seconds of the analysis itself
+        self.profile = profile  # Profile the analysis is to be run with
+        self.wait = wait  # Estimated seconds before a worker gets to it
+        self.status_code = status_code
+        self.error = error
+        self.retry_after = retry_after  # Seconds, for the Retry-After header
+
+    @property
+    def admitted(self):
+        return self.status_code is None
+
+    @property
+    def estimated_seconds(self):
+        """Estimated seconds until the analysis is completed."""
+        return self.wait + self.cost
+
+    @property
+    def estimated_completion(self):
+        return datetime.utcnow() + timedelta(seconds=self.estimated_seconds)
+
+    def describe_eta(self):
+        """Human-readable time until completion, for flash messages."""
+        minutes = math.ceil(self.estimated_seconds / 60)
+        if minutes <= 1:
+            return 'in about a minute'
+        return f'in about {minutes} minutes'
+
+    def to_dict(self):
+        return {
+            'profile': self.profile,
+            'estimated_cost': round(self.cost, 1),
+            'estimated_wait': round(self.wait, 1),
+            'estimated_completion': self.estimated_completion.isoformat()
+        }
+
+def _remaining_cost(row, now, model):
+    """Estimated worker-seconds an unfinished analysis still needs."""
+    cost = row.estimated_cost
+    if cost is None:
+        # Submitted before admission control existed
+        profile = row.profile or current_app.config['DEFAULT_PROFILE']
+        cost = model.estimate(row.duration or 0.0, profile, profile_backend(profile))
+    if row.status == 'processing' and row.started_at:
+        cost -= (now - row.started_at).total_seconds()
+    return max(cost, 0.0)
+
+def choose_profile(model, segment_seconds, wait, max_cost):
+    """Pick the most accurate profile that fits the latency target and the budget.
+
+    With an idle queue this is DEFAULT_PROFILE. As the estimated wait grows
+    the scheduler steps down through ANALYSIS_PROFILES (lower sample rate and
+    coarser hops, then the YIN backend) until wait + cost fits into
+    QUALITY_LATENCY_SLO; if nothing fits, the cheapest profile is used.
+    Degraded results are redone in the background when the queue is idle.
+    """
+    config = current_app.config
+    profiles = list(config['ANALYSIS_PROFILES'])
+    candidates = profiles[profiles.index(config['DEFAULT_PROFILE']):]
+    for profile in candidates:
+        cost = model.estimate(segment_seconds, profile, profile_backend(profile))
+        if wait + cost <= config['QUALITY_LATENCY_SLO'] and cost <= max_cost:
+            return profile
+    return candidates[-1]
+
+def check_admission(user_id, segment_seconds, profile=None, exclude_id=None):
+    """Decide whether an analysis may be queued, with which profile, and when it would finish.
+
+    Refuses with 400 when the segment alone is over the per-user budget, 429
+    while the user's unfinished analyses would exceed ADMISSION_USER_BUDGET
+    and 503 while the queue's estimated wait exceeds ADMISSION_QUEUE_LIMIT.
+    The backlog is assumed to drain at one worker-second per second on each
+    pitch worker, which is the stage that bounds throughput.
+
+    Args:
+        user_id: Submitting user
+        segment_seconds: Length of the segment to analyze
+        profile: Analysis profile; chosen from the load (see choose_profile) if None
+        exclude_id: Analysis being re-checked after an edit, left out of the backlog
+
+    Returns:
+        Admission
+    """
+    config = current_app.config
+    model = get_cost_model()
+    budget = config['ADMISSION_USER_BUDGET']
+
+    # Sum up the work still ahead of this analysis
+    query = db.session.query(Analysis.id, Analysis.user_id, Analysis.status,
+                             Analysis.estimated_cost, Analysis.started_at,
+                             Analysis.duration, Analysis.profile)\
+        .filter(Analysis.status.in_(Analysis.ACTIVE_STATUSES))
+    if exclude_id is not None:
+        query = query.filter(Analysis.id != exclude_id)
+
+    now = datetime.utcnow()
+    backlog = 0.0
+    user_backlog = 0.0
+    for row in query.all():
+        remaining = _remaining_cost(row, now, model)
+        backlog += remaining
+        if row.user_id == user_id:
+            user_backlog += remaining
+
+    workers = max(1, config['PIPELINE_CPU_WORKERS'])
+    wait = backlog / workers
+
+    profile = profile or choose_profile(model, segment_seconds, wait, budget - user_backlog)
+    cost = model.estimate(segment_seconds, profile, profile_backend(profile))
+
+    if cost > budget:
+        return Admission(cost, 0.0, profile, 400,
+                         f'Segment too long: it would take an estimated {cost:.0f}s to analyze, '
+                         f'the limit is {budget}s')
+
+    if user_backlog + cost > budget:
+        excess = user_backlog + cost - budget
+        return Admission(cost, wait, profile, 429,
+                         'You have too many analyses in progress; try again when some have finished',
+                         retry_after=max(1, math.ceil(excess)))
+
+    if wait > config['ADMISSION_QUEUE_LIMIT']:
+        return Admission(cost, wait, profile, 503,
+                         'The analysis queue is full; try again later',
+                         retry_after=max(1, math.ceil(wait - config['ADMISSION_QUEUE_LIMIT'])))
+
+    return Admission(cost, wait, profile)
@@ -1,13 +1,20 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort, send_from_directory
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort, send_from_directory, make_response
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload
 import os
 import uuid
 from datetime import datetime
-from ..models import db, Analysis, Note, Favorite
+from ..models import db, Analysis, Favorite
+from ..note_store import load_notes
+from ..stats import adjust_user_stats, remove_analysis
 from ..audio_utils import analyze_audio_segment
-from ..tasks import analyze_audio_task
+from ..pipeline import enqueue_analysis
+from ..admission import check_admission
 from ..utils import allowed_file
+from ..favorites import invalidate_favorites, is_favorited
+from ..http_cache import analysis_validators, page_validators, is_not_modified, cache_response
+from ..export import negotiate_format, stream_export
 
 bp = Blueprint('analysis', __name__)
 
@@ -25,6 +32,27 @@ def new_analysis():
         shruthi = request.form.get('shruthi', 'C#')
         is_public = 'is_public' in request.form
         
+        def form_response(status_code, retry_after=None):
+            response = make_response(render_template('analysis/new.html',
+                                                     title='New Analysis',
+                                                     default_shruthi=shruthi,
+                                                     default_start=start_time,
+                                                     default_end=end_time), status_code)
+            if retry_after:
+                response.headers['Retry-After'] = str(retry_after)
+            return response
+        
+        if end_time <= start_time:
+            flash('The end time must be after the start time.', 'danger')
+            return form_response(400)
+        
+        # Refuse work the user or the queue has no capacity for, and pick
+        # the analysis quality the current load allows
+        admission = check_admission(current_user.id, end_time - start_time)
+        if not admission.admitted:
+            flash(admission.error, 'warning')
+            return form_response(admission.status_code, admission.retry_after)
+        
         # Create a new analysis record
         analysis = Analysis(
             user_id=current_user.id,
@@ -33,7 +61,10 @@ def new_analysis():
             video_url=video_url,
             start_time=start_time,
             end_time=end_time,
+            duration=end_time - start_time,
             shruthi=shruthi,
+            profile=admission.profile,
+            estimated_cost=admission.cost,
             is_public=is_public,
             status='queued'
         )
@@ -54,12 +85,14 @@ def new_analysis():
                 analysis.audio_path = filepath
         
         db.session.add(analysis)
+        adjust_user_stats(current_user.id, analysis_count=1)
         db.session.commit()
         
-        # Start the analysis task in the background
-        analyze_audio_task.delay(analysis.id)
+        # Start the analysis in the background pipeline
+        enqueue_analysis(analysis.id)
         
-        flash('Your analysis has been queued. You will be notified when it is complete!', 'info')
+        flash(f'Your analysis has been queued and should be ready {admission.describe_eta()}. '
+              'You will be notified when it is complete!', 'info')
         return redirect(url_for('analysis.view_analysis', analysis_id=analysis.id))
     
     # For GET request, show the analysis form
@@ -72,7 +105,7 @@ def new_analysis():
 @bp.route('/<int:analysis_id>')
 def view_analysis(analysis_id):
     """View an analysis and its results."""
-    analysis = Analysis.query.get_or_404(analysis_id)
+    analysis = Analysis.query.options(joinedload(Analysis.author)).get_or_404(analysis_id)
     
     # Check if the analysis is public or belongs to the current user
     if not analysis.is_public and (not current_user.is_authenticated or 
@@ -80,31 +113,30 @@ def view_analysis(analysis_id):
         flash('You do not have permission to view this analysis.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get all notes for this analysis
-    notes = analysis.notes.order_by(Note.start_time).all()
+    # Skip loading the notes if the browser's copy of the page is current
+    favorited = is_favorited(analysis.id)
+    validators = page_validators(analysis, analysis.author.username, favorited)
+    if validators and is_not_modified(*validators):
+        return cache_response(None, *validators, public=False, per_user=True)
+    
+    # Every note: the page has no client code to fetch later windows yet
+    notes = load_notes(analysis.id).all()
     
     # Prepare data for visualization
     note_data = [{
-        'time': note.start_time,
-        'note': note.note_name,
-        'duration': note.duration,
-        'frequency': note.frequency
+        'time': note['start_time'],
+        'note': note['note'],
+        'duration': note['duration'],
+        'frequency': note['frequency']
     } for note in notes]
     
-    # Check if the current user has favorited this analysis
-    is_favorited = False
-    if current_user.is_authenticated:
-        is_favorited = Favorite.query.filter_by(
-            user_id=current_user.id,
-            analysis_id=analysis.id
-        ).first() is not None
-    
-    return render_template('analysis/view.html',
+    response = make_response(render_template('analysis/view.html',
                          analysis=analysis,
                          notes=notes,
                          note_data=note_data,
-                         is_favorited=is_favorited,
-                         title=f'Analysis: {analysis.title}')
+                         is_favorited=favorited,
+                         title=f'Analysis: {analysis.title}'))
+    return cache_response(response, *validators, public=False, per_user=True) if validators else response
 
 @bp.route('/<int:analysis_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -118,26 +150,54 @@ def edit_analysis(analysis_id):
         return redirect(url_for('analysis.view_analysis', analysis_id=analysis.id))
     
     if request.method == 'POST':
+        requeue = False
+        
         # Update analysis with form data
         analysis.title = request.form.get('title', analysis.title)
         analysis.description = request.form.get('description', analysis.description)
         analysis.is_public = 'is_public' in request.form
         
         # Only allow changing these if the analysis hasn't started
-        if analysis.status in ['queued', 'failed']:
+        if analysis.status in Analysis.EDITABLE_STATUSES:
             analysis.video_url = request.form.get('video_url', analysis.video_url)
             analysis.start_time = float(request.form.get('start_time', analysis.start_time))
             analysis.end_time = float(request.form.get('end_time', analysis.end_time))
+            analysis.duration = analysis.end_time - analysis.start_time
             analysis.shruthi = request.form.get('shruthi', analysis.shruthi)
             
-            # If the analysis failed, requeue it
-            if analysis.status == 'failed':
+            if analysis.duration <= 0:
+                db.session.rollback()
+                flash('The end time must be after the start time.', 'danger')
+                return redirect(url_for('analysis.edit_analysis', analysis_id=analysis.id))
+            
+            # The edited segment has to fit the user's budget like a new one
+            admission = check_admission(analysis.user_id, analysis.duration,
+                                        analysis.requested_profile, exclude_id=analysis.id)
+            if not admission.admitted:
+                db.session.rollback()
+                flash(admission.error, 'warning')
+                response = make_response(render_template('analysis/edit.html',
+                                                         analysis=analysis,
+                                                         title=f'Edit: {analysis.title}'),
+                                         admission.status_code)
+                if admission.retry_after:
+                    response.headers['Retry-After'] = str(admission.retry_after)
+                return response
+            analysis.profile = admission.profile
+            analysis.estimated_cost = admission.cost
+            
+            # If the analysis failed or was cancelled, requeue it
+            requeue = analysis.status in ['failed', 'cancelled']
+            if requeue:
                 analysis.status = 'queued'
                 analysis.error_message = None
-                analyze_audio_task.delay(analysis.id)
         
         db.session.commit()
         
+        # Enqueue only after the commit so the worker sees the edited fields
+        if requeue:
+            enqueue_analysis(analysis.id)
+        
         flash('Analysis updated successfully!', 'success')
         return redirect(url_for('analysis.view_analysis', analysis_id=analysis.id))
     
@@ -146,6 +206,30 @@ def edit_analysis(analysis_id):
                          analysis=analysis,
                          title=f'Edit: {analysis.title}')
 
+@bp.route('/<int:analysis_id>/cancel', methods=['POST'])
+@login_required
+def cancel_analysis(analysis_id):
+    """Cancel a queued or running analysis."""
+    analysis = Analysis.query.get_or_404(analysis_id)
+    
+    # Check if the current user owns this analysis or is admin
+    if current_user.id != analysis.user_id and not current_user.is_admin:
+        flash('You do not have permission to cancel this analysis.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    if analysis.status not in Analysis.ACTIVE_STATUSES:
+        flash('This analysis is not running.', 'warning')
+        return redirect(url_for('analysis.view_analysis', analysis_id=analysis.id))
+    
+    # The worker notices the status change between stages and kills the
+    # download or pitch-tracking process it is supervising
+    analysis.status = 'cancelled'
+    analysis.stage = None
+    db.session.commit()
+    
+    flash('Analysis cancelled.', 'success')
+    return redirect(url_for('analysis.view_analysis', analysis_id=analysis.id))
+
 @bp.route('/<int:analysis_id>/delete', methods=['POST'])
 @login_required
 def delete_analysis(analysis_id):
@@ -157,11 +241,8 @@ def delete_analysis(analysis_id):
         flash('You do not have permission to delete this analysis.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Delete associated notes
-    Note.query.filter_by(analysis_id=analysis_id).delete()
-    
-    # Delete the analysis
-    db.session.delete(analysis)
+    # Delete the analysis with its notes, updating the dashboard counters
+    remove_analysis(analysis)
     db.session.commit()
     
     flash('Analysis deleted successfully!', 'success')
@@ -172,22 +253,20 @@ def delete_analysis(analysis_id):
 def toggle_favorite(analysis_id):
     """Add or remove an analysis from favorites."""
     analysis = Analysis.query.get_or_404(analysis_id)
-    favorite = Favorite.query.filter_by(
-        user_id=current_user.id,
-        analysis_id=analysis_id
-    ).first()
-    
-    if favorite:
-        # Remove from favorites
-        db.session.delete(favorite)
+    
+    # Remove it from favorites if it was one, in a single statement
+    if Favorite.query.filter_by(user_id=current_user.id, analysis_id=analysis_id).delete():
+        adjust_user_stats(current_user.id, favorite_count=-1)
         action = 'removed'
     else:
         # Add to favorites
         favorite = Favorite(user_id=current_user.id, analysis_id=analysis_id)
         db.session.add(favorite)
+        adjust_user_stats(current_user.id, favorite_count=1)
         action = 'added'
     
     db.session.commit()
+    invalidate_favorites(current_user.id)
     
     if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return jsonify({
@@ -202,24 +281,29 @@ def toggle_favorite(analysis_id):
 @bp.route('/<int:analysis_id>/export')
 @login_required
 def export_analysis(analysis_id):
-    """Export analysis data as JSON."""
-    analysis = Analysis.query.get_or_404(analysis_id)
+    """Export analysis data as JSON, NDJSON or CSV (``?format=`` or the Accept header)."""
+    analysis = Analysis.query.options(joinedload(Analysis.author)).get_or_404(analysis_id)
     
     # Check if the analysis is public or belongs to the current user
     if not analysis.is_public and current_user.id != analysis.user_id:
         flash('You do not have permission to export this analysis.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get all notes for this analysis
-    notes = [{
-        'note': note.note_name,
-        'frequency': note.frequency,
-        'start_time': note.start_time,
-        'duration': note.duration,
-        'confidence': note.confidence
-    } for note in analysis.notes.order_by(Note.start_time).all()]
+    export_format = negotiate_format()
+    if export_format is None:
+        flash('Unknown export format.', 'danger')
+        return redirect(url_for('analysis.view_analysis', analysis_id=analysis.id))
+    
+    # Skip loading the notes if the client's copy is current (the export
+    # names the author, whose username can change without updated_at)
+    etag, last_modified = analysis_validators(analysis, analysis.author.username, export_format)
+    if is_not_modified(etag, last_modified):
+        response = cache_response(None, etag, last_modified, analysis.is_public)
+        if 'format' not in request.args:
+            response.vary.add('Accept')
+        return response
     
-    # Prepare the export data
+    # Prepare the export data; the notes are streamed in after it
     export_data = {
         'id': analysis.id,
         'title': analysis.title,
@@ -232,14 +316,16 @@ def export_analysis(analysis_id):
         'status': analysis.status,
         'created_at': analysis.created_at.isoformat() if analysis.created_at else None,
         'completed_at': analysis.completed_at.isoformat() if analysis.completed_at else None,
-        'notes': notes,
         'user': {
-            'id': analysis.user.id,
-            'username': analysis.user.username
+            'id': analysis.author.id,
+            'username': analysis.author.username
         }
     }
     
-    # Return as JSON response
-    response = jsonify(export_data)
-    response.headers['Content-Disposition'] = f'attachment; filename=analysis_{analysis.id}.json'
-    return response
+    # Read from the database a chunk at a time while the response is sent
+    chunks = load_notes(analysis.id).chunks(current_app.config['EXPORT_CHUNK_SIZE'])
+    response = stream_export(export_data, chunks, export_format)
+    response.headers['Content-Disposition'] = f'attachment; filename=analysis_{analysis.id}.{export_format}'
+    if 'format' not in request.args:
+        response.vary.add('Accept')
+    return cache_response(response, etag, last_modified, analysis.is_public)
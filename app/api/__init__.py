@@ -1,9 +1,25 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, url_for, Response, stream_with_context
 from flask_login import current_user, login_required
-from ..models import db, Analysis, Note, User, Favorite
+from ..models import db, Analysis, User, Favorite, ContourTile
 from ..auth.auth import token_auth
+from ..admission import check_admission
+from ..note_store import load_notes, load_track, CENTS_REFERENCE_HZ
+from ..contour import contour_levels
+from ..columnar import COLUMNAR_FORMATS, columnar_export, note_columns, track_columns, \
+    is_available as columnar_available
+from ..pagination import keyset_paginate, InvalidCursor
+from ..search import search_analyses
+from ..stats import adjust_user_stats, remove_analysis
+from ..favorites import favorited_ids, invalidate_favorites, is_favorited
+from ..http_cache import analysis_validators, is_not_modified, cache_response
+from ..page_cache import get_page_cache
+from ..serializers import analysis_json, notes_json, json_response, get_fragment_cache
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
+import json
+import math
 import os
+import time
 
 bp = Blueprint('api', __name__)
 
@@ -16,43 +32,112 @@ def get_token():
     db.session.commit()
     return jsonify({'token': token, 'expires_in': 3600})
 
+def _keyset_listing(query, key_columns, max_per_page):
+    """Return one page of a listing as JSON, paginated by cursor (see app/pagination.py).
+    
+    Query parameters: ``cursor`` (from ``_meta`` of an earlier page),
+    ``per_page`` and ``count=1`` to include the cached total.
+    """
+    per_page = max(1, min(request.args.get('per_page', 10, type=int), max_per_page))
+    
+    # to_dict() includes the author; load the page's authors in one query
+    query = query.options(selectinload(Analysis.author))
+    try:
+        page = keyset_paginate(query, key_columns, per_page,
+                               cursor=request.args.get('cursor'),
+                               count=request.args.get('count', 0, type=int) == 1)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def link(cursor):
+        if cursor is None:
+            return None
+        args = dict(request.args.to_dict(), cursor=cursor)
+        return url_for(request.endpoint, **dict(args, **request.view_args))
+    
+    meta = {
+        'per_page': per_page,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    }
+    if page.total is not None:
+        meta['total_items'] = page.total
+    
+    # Heart icons for a signed-in user: the whole page's favorite status in one lookup
+    favorited = None
+    if current_user.is_authenticated:
+        favorited = favorited_ids(item.id for item in page.items)
+    
+    # Items are spliced in as cached JSON (see app/serializers.py)
+    return json_response({
+        '_meta': meta,
+        '_links': {
+            'next': link(page.next_cursor),
+            'prev': link(page.prev_cursor)
+        }
+    }, items=[analysis_json(item, favorited=None if favorited is None else item.id in favorited)
+              for item in page.items])
+
+def _search(query, key_columns):
+    """Apply the ``q`` search parameter; matches are then listed by relevance."""
+    if 'q' in request.args:
+        query, score = search_analyses(query, request.args.get('q'))
+        if score is not None:
+            key_columns = (score, Analysis.id)
+    return query, key_columns
+
 @bp.route('/analyses', methods=['GET'])
 def get_analyses():
     """Get a list of public analyses."""
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
-    
     # Base query for public analyses
     query = Analysis.query.filter_by(is_public=True)
+    key = (Analysis.created_at, Analysis.id)
     
     # Apply filters
     if 'user_id' in request.args:
         query = query.filter_by(user_id=request.args.get('user_id', type=int))
     
-    if 'q' in request.args:
-        search = f"%{request.args.get('q')}%"
-        query = query.filter(
-            (Analysis.title.ilike(search)) |
-            (Analysis.description.ilike(search))
-        )
+    query, key = _search(query, key)
     
-    # Order and paginate
-    data = query.order_by(Analysis.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    return jsonify({
-        'items': [item.to_dict() for item in data.items],
-        '_meta': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': data.pages,
-            'total_items': data.total
-        }
-    })
+    # Newest first (best match first when searching), by cursor
+    return _keyset_listing(query, key, 100)
 
 @bp.route('/analyses/<int:id>')
 def get_analysis(id):
     """Get a single analysis by ID."""
+    analysis = Analysis.query.options(joinedload(Analysis.author)).get_or_404(id)
+    
+    # Check if the analysis is public or belongs to the current user
+    if not analysis.is_public and (not current_user.is_authenticated or 
+                                  current_user.id != analysis.user_id):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    # Revalidated by ETag; the favorite flag makes a signed-in user's copy their own.
+    # The author's username is embedded but changes without bumping updated_at
+    favorited = is_favorited(analysis.id) if current_user.is_authenticated else None
+    etag, last_modified = analysis_validators(analysis, analysis.author.username, favorited)
+    public = analysis.is_public and favorited is None
+    if is_not_modified(etag, last_modified):
+        return cache_response(None, etag, last_modified, public, per_user=True)
+    response = current_app.response_class(analysis_json(analysis, favorited), mimetype='application/json')
+    return cache_response(response, etag, last_modified, public, per_user=True)
+
+def _sse_message(event, data, event_id=None):
+    """Format a single Server-Sent Events message."""
+    message = f'event: {event}\n'
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    return message + f'data: {json.dumps(data)}\n\n'
+
+@bp.route('/analyses/<int:id>/events')
+def analysis_events(id):
+    """Stream status and progress changes for an analysis as Server-Sent Events.
+    
+    Emits a ``status`` event whenever status, stage or progress change and
+    closes the stream once the job is finished. With ``?notes=1`` detected notes
+    are pushed as ``notes`` events; their event IDs are note IDs, so a client
+    reconnecting with ``Last-Event-ID`` only receives notes it has not seen.
+    """
     analysis = Analysis.query.get_or_404(id)
     
     # Check if the analysis is public or belongs to the current user
@@ -60,12 +145,86 @@ def get_analysis(id):
                                   current_user.id != analysis.user_id):
         return jsonify({'error': 'Forbidden'}), 403
     
-    return jsonify(analysis.to_dict())
+    include_notes = request.args.get('notes', 0, type=int) == 1
+    last_note_id = request.headers.get('Last-Event-ID', 0, type=int)
+    poll_interval = current_app.config['SSE_POLL_INTERVAL']
+    heartbeat_interval = current_app.config['SSE_HEARTBEAT_INTERVAL']
+    note_batch_size = current_app.config['SSE_NOTE_BATCH_SIZE']
+    
+    # Don't hold a pooled connection for the lifetime of the stream
+    db.session.close()
+    
+    def generate():
+        nonlocal last_note_id
+        last_state = None
+        last_sent = time.monotonic()
+        yield 'retry: 3000\n\n'
+        
+        while True:
+            # Only load the status columns, not the full ORM object
+            row = db.session.query(Analysis.id, Analysis.status, Analysis.stage,
+                                   Analysis.progress, Analysis.error_message)\
+                .filter(Analysis.id == id).first()
+            if row is None:
+                yield _sse_message('deleted', {'id': id})
+                break
+            
+            state = {
+                'id': row.id,
+                'status': row.status,
+                'stage': row.stage,
+                'progress': round(row.progress or 0.0, 4),
+                'error': row.error_message
+            }
+            if state != last_state:
+                yield _sse_message('status', state)
+                last_state = state
+                last_sent = time.monotonic()
+            
+            finished = row.status in Analysis.TERMINAL_STATUSES
+            
+            note_set = load_notes(id) if include_notes else None
+            while include_notes:
+                notes = note_set.since(last_note_id, note_batch_size)
+                if not notes:
+                    break
+                last_note_id = notes[-1]['id']
+                yield _sse_message('notes', notes, last_note_id)
+                last_sent = time.monotonic()
+                if len(notes) < note_batch_size or not finished:
+                    break
+            
+            db.session.close()
+            if finished:
+                break
+            
+            if time.monotonic() - last_sent >= heartbeat_interval:
+                yield ': keep-alive\n\n'
+                last_sent = time.monotonic()
+            time.sleep(poll_interval)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _admission_error(admission):
+    """Build the error response for a refused submission."""
+    response = jsonify({'error': admission.error, 'retry_after': admission.retry_after})
+    response.status_code = admission.status_code
+    if admission.retry_after:
+        response.headers['Retry-After'] = str(admission.retry_after)
+    return response
 
 @bp.route('/analyses', methods=['POST'])
 @token_auth.login_required
 def create_analysis():
-    """Create a new analysis."""
+    """Create a new analysis.
+    
+    Refused with 429 or 503 and a Retry-After header when the user or the
+    queue is over capacity; otherwise the response carries the estimated
+    completion time.
+    """
     data = request.get_json() or {}
     
     # Validate required fields
@@ -73,19 +232,43 @@ def create_analysis():
         return jsonify({'error': 'video_url is required'}), 400
     
     # Create new analysis
-    analysis = Analysis()
-    analysis.from_dict(data)
+    analysis = Analysis(
+        start_time=current_app.config['DEFAULT_START_TIME'],
+        end_time=current_app.config['DEFAULT_END_TIME']
+    )
+    try:
+        analysis.from_dict(data)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start_time and end_time must be numbers'}), 400
+    if analysis.duration <= 0:
+        return jsonify({'error': 'end_time must be after start_time'}), 400
     analysis.user_id = current_user.id
     
+    # An explicit profile opts out of adaptive quality
+    profile = data.get('profile')
+    if profile is not None and profile not in current_app.config['ANALYSIS_PROFILES']:
+        return jsonify({'error': f'Unknown profile: {profile}'}), 400
+    
+    # Refuse work the user or the queue has no capacity for, and pick
+    # the analysis quality the current load allows
+    admission = check_admission(current_user.id, analysis.duration, profile)
+    if not admission.admitted:
+        return _admission_error(admission)
+    analysis.profile = admission.profile
+    analysis.requested_profile = profile
+    analysis.estimated_cost = admission.cost
+    
     db.session.add(analysis)
+    adjust_user_stats(current_user.id, analysis_count=1)
     db.session.commit()
     
-    # In production, you would use a task queue like Celery
-    # to process the analysis in the background
-    from ..tasks import analyze_audio_task
-    analyze_audio_task.delay(analysis.id)
+    # Process the analysis in the background pipeline
+    from ..pipeline import enqueue_analysis
+    enqueue_analysis(analysis.id)
     
-    response = jsonify(analysis.to_dict())
+    data = analysis.to_dict()
+    data.update(admission.to_dict())
+    response = jsonify(data)
     response.status_code = 201
     response.headers['Location'] = url_for('api.get_analysis', id=analysis.id)
     return response
@@ -93,7 +276,13 @@ def create_analysis():
 @bp.route('/analyses/<int:id>', methods=['PUT'])
 @token_auth.login_required
 def update_analysis(id):
-    """Update an existing analysis."""
+    """Update an existing analysis.
+    
+    The segment (video, times, shruthi) and profile can only change while
+    the analysis has not started or has failed or been cancelled. The edit
+    is admitted like a new submission, keeping the profile the client asked
+    for, and a failed or cancelled analysis is queued again.
+    """
     analysis = Analysis.query.get_or_404(id)
     
     # Check if the current user owns this analysis
@@ -101,9 +290,55 @@ def update_analysis(id):
         return jsonify({'error': 'Forbidden'}), 403
     
     data = request.get_json() or {}
-    analysis.from_dict(data)
+    
+    # An explicit profile opts out of adaptive quality; null opts back in
+    profile = data.get('profile', analysis.requested_profile)
+    if profile is not None and profile not in current_app.config['ANALYSIS_PROFILES']:
+        return jsonify({'error': f'Unknown profile: {profile}'}), 400
+    
+    segment = (analysis.video_url, analysis.start_time, analysis.end_time, analysis.shruthi,
+               analysis.requested_profile)
+    try:
+        analysis.from_dict(data)
+    except (TypeError, ValueError):
+        db.session.rollback()
+        return jsonify({'error': 'start_time and end_time must be numbers'}), 400
+    analysis.requested_profile = profile
+    
+    requeue = False
+    if (analysis.video_url, analysis.start_time, analysis.end_time, analysis.shruthi,
+            analysis.requested_profile) != segment:
+        # The stored notes belong to the segment the analysis ran on
+        if analysis.status not in Analysis.EDITABLE_STATUSES:
+            db.session.rollback()
+            return jsonify({'error': 'The segment can only be changed while the analysis is '
+                                     'pending, queued, failed or cancelled'}), 409
+        if analysis.duration <= 0:
+            db.session.rollback()
+            return jsonify({'error': 'end_time must be after start_time'}), 400
+        
+        # The edited segment has to fit the user's budget like a new one
+        admission = check_admission(analysis.user_id, analysis.duration, analysis.requested_profile,
+                                    exclude_id=analysis.id)
+        if not admission.admitted:
+            db.session.rollback()
+            return _admission_error(admission)
+        analysis.profile = admission.profile
+        analysis.estimated_cost = admission.cost
+        
+        # If the analysis failed or was cancelled, requeue it
+        requeue = analysis.status in ['failed', 'cancelled']
+        if requeue:
+            analysis.status = 'queued'
+            analysis.error_message = None
+    
     db.session.commit()
     
+    # Enqueue only after the commit so the worker sees the edited fields
+    if requeue:
+        from ..pipeline import enqueue_analysis
+        enqueue_analysis(analysis.id)
+    
     return jsonify(analysis.to_dict())
 
 @bp.route('/analyses/<int:id>', methods=['DELETE'])
@@ -116,18 +351,34 @@ def delete_analysis(id):
     if current_user.id != analysis.user_id and not current_user.is_admin:
         return jsonify({'error': 'Forbidden'}), 403
     
-    # Delete associated notes
-    Note.query.filter_by(analysis_id=id).delete()
-    
-    # Delete the analysis
-    db.session.delete(analysis)
+    # Delete the analysis with its notes, updating the dashboard counters
+    remove_analysis(analysis)
     db.session.commit()
     
     return '', 204
 
+@bp.route('/analyses/<int:id>/cancel', methods=['POST'])
+@token_auth.login_required
+def cancel_analysis(id):
+    """Cancel a queued or running analysis."""
+    analysis = Analysis.query.get_or_404(id)
+    
+    # Check if the current user owns this analysis or is admin
+    if current_user.id != analysis.user_id and not current_user.is_admin:
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    if analysis.status not in Analysis.ACTIVE_STATUSES:
+        return jsonify({'error': f'Analysis is already {analysis.status}'}), 409
+    
+    analysis.status = 'cancelled'
+    analysis.stage = None
+    db.session.commit()
+    
+    return jsonify(analysis.progress_dict())
+
 @bp.route('/analyses/<int:id>/notes')
 def get_analysis_notes(id):
-    """Get all notes for an analysis."""
+    """Get the notes of an analysis, by page or by time window (``from``/``to`` in seconds)."""
     analysis = Analysis.query.get_or_404(id)
     
     # Check if the analysis is public or belongs to the current user
@@ -135,21 +386,144 @@ def get_analysis_notes(id):
                                   current_user.id != analysis.user_id):
         return jsonify({'error': 'Forbidden'}), 403
     
+    # Nothing to load if the client's copy is current
+    etag, last_modified = analysis_validators(analysis)
+    if is_not_modified(etag, last_modified):
+        return cache_response(None, etag, last_modified, analysis.is_public)
+    
+    # Notes sounding in a time window, for zooming and scrolling the timeline
+    if 'from' in request.args or 'to' in request.args:
+        start = request.args.get('from', 0.0, type=float)
+        end = request.args.get('to', None, type=float)
+        if not math.isfinite(start) or (end is not None and (not math.isfinite(end) or end <= start)):
+            return jsonify({'error': "'from' and 'to' must be numbers with 'from' < 'to'"}), 400
+        limit = max(1, min(request.args.get('limit', current_app.config['NOTES_WINDOW_MAX'], type=int),
+                           current_app.config['NOTES_WINDOW_MAX']))
+        items, truncated = load_notes(analysis.id).window(start, end, limit, analysis.max_note_duration)
+        return cache_response(json_response({
+            '_meta': {
+                'from': start,
+                'to': end,
+                'limit': limit,
+                'truncated': truncated
+            }
+        }, items=notes_json(analysis, items)), etag, last_modified, analysis.is_public)
+    
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 20, type=int), 100)
     
-    # Get paginated notes
-    pagination = analysis.notes.order_by(Note.start_time)\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    # Get paginated notes, rows or packed
+    items, total = load_notes(analysis.id).page(page, per_page)
     
-    return jsonify({
-        'items': [item.to_dict() for item in pagination.items],
+    return cache_response(json_response({
         '_meta': {
             'page': page,
             'per_page': per_page,
-            'total_pages': pagination.pages,
-            'total_items': pagination.total
+            'total_pages': math.ceil(total / per_page) if per_page else 0,
+            'total_items': total
         }
+    }, items=notes_json(analysis, items)), etag, last_modified, analysis.is_public)
+
+@bp.route('/analyses/<int:id>/contour')
+def get_analysis_contour(id):
+    """Get a pitch contour tile, or the list of zoom levels without ``level``/``tile``.
+    
+    Tiles are binary (see app/contour.py): a header and the minimum,
+    maximum and median cents above ``reference_hz`` of each bucket.
+    """
+    analysis = Analysis.query.get_or_404(id)
+    
+    # Check if the analysis is public or belongs to the current user
+    if not analysis.is_public and (not current_user.is_authenticated or 
+                                  current_user.id != analysis.user_id):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    # Tiles only change when the analysis is re-run
+    etag, last_modified = analysis_validators(analysis)
+    if is_not_modified(etag, last_modified):
+        return cache_response(None, etag, last_modified, analysis.is_public)
+    
+    if 'level' not in request.args and 'tile' not in request.args:
+        return cache_response(jsonify({
+            'levels': contour_levels(analysis.id),
+            'tile_size': current_app.config['CONTOUR_TILE_SIZE'],
+            'reference_hz': CENTS_REFERENCE_HZ,
+            'tile_url': url_for('api.get_analysis_contour', id=analysis.id) + '?level={level}&tile={tile}'
+        }), etag, last_modified, analysis.is_public)
+    
+    level = request.args.get('level', type=int)
+    tile = request.args.get('tile', type=int)
+    if level is None or tile is None:
+        return jsonify({'error': "'level' and 'tile' must be integers"}), 400
+    
+    data = db.session.query(ContourTile.data)\
+        .filter_by(analysis_id=analysis.id, level=level, tile=tile).scalar()
+    if data is None:
+        return jsonify({'error': 'No such contour tile'}), 404
+    return cache_response(Response(data, mimetype='application/octet-stream'),
+                          etag, last_modified, analysis.is_public)
+
+@bp.route('/analyses/<int:id>/notes.<any(npz, arrow, parquet):export_format>')
+def export_analysis_notes(id, export_format):
+    """Export the notes as NPZ, Arrow IPC or Parquet columns (schema in app/columnar.py)."""
+    return _columnar_export(id, 'notes', export_format)
+
+@bp.route('/analyses/<int:id>/track.<any(npz, arrow, parquet):export_format>')
+def export_analysis_track(id, export_format):
+    """Export the frame-level pitch track as NPZ, Arrow IPC or Parquet columns."""
+    return _columnar_export(id, 'track', export_format)
+
+def _columnar_export(id, table, export_format):
+    analysis = Analysis.query.get_or_404(id)
+    
+    # Check if the analysis is public or belongs to the current user
+    if not analysis.is_public and (not current_user.is_authenticated or
+                                  current_user.id != analysis.user_id):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    if not columnar_available(export_format):
+        return jsonify({'error': f'{export_format} export needs pyarrow installed on the server'}), 501
+    
+    etag, last_modified = analysis_validators(analysis, table, export_format)
+    if is_not_modified(etag, last_modified):
+        return cache_response(None, etag, last_modified, analysis.is_public)
+    
+    meta = {
+        'id': analysis.id,
+        'title': analysis.title,
+        'start_time': analysis.start_time,
+        'end_time': analysis.end_time,
+        'shruthi': analysis.shruthi,
+        'profile': analysis.profile,
+        'engine_version': current_app.config['ENGINE_VERSION']
+    }
+    if table == 'track':
+        track = load_track(analysis.id)
+        if track is None:
+            return jsonify({'error': 'No pitch track stored for this analysis'}), 404
+        meta.update(sr=track['sr'], hop_length=track['hop_length'])
+        columns = track_columns(track)
+    else:
+        columns = note_columns(load_notes(analysis.id).columns(current_app.config['EXPORT_CHUNK_SIZE']))
+    
+    response = Response(columnar_export(columns, meta, export_format),
+                        mimetype=COLUMNAR_FORMATS[export_format])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename=analysis_{analysis.id}_{table}.{export_format}'
+    return cache_response(response, etag, last_modified, analysis.is_public)
+
+@bp.route('/cache')
+@token_auth.login_required
+def get_cache_stats():
+    """Hit ratios of this process' page cache per region and serializer cache (admins only)."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Forbidden'}), 403
+    cache = get_page_cache()
+    return jsonify({
+        'backend': cache.backend.name,
+        'timeout': cache.timeout,
+        'regions': cache.stats(),
+        'serializer': get_fragment_cache().stats()
     })
 
 @bp.route('/users/<int:id>')
@@ -173,31 +547,13 @@ def get_user_analyses(id):
         query = user.analyses.filter_by(is_public=True)
     else:
         query = user.analyses
-    
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 50)
+    key = (Analysis.created_at, Analysis.id)
     
     # Apply filters
-    if 'q' in request.args:
-        search = f"%{request.args.get('q')}%"
-        query = query.filter(
-            (Analysis.title.ilike(search)) |
-            (Analysis.description.ilike(search))
-        )
+    query, key = _search(query, key)
     
-    # Order and paginate
-    pagination = query.order_by(Analysis.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    return jsonify({
-        'items': [item.to_dict() for item in pagination.items],
-        '_meta': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': pagination.pages,
-            'total_items': pagination.total
-        }
-    })
+    # Newest first (best match first when searching), by cursor
+    return _keyset_listing(query, key, 50)
 
 @bp.route('/me')
 @token_auth.login_required
@@ -209,84 +565,47 @@ def get_current_user():
 @token_auth.login_required
 def get_my_analyses():
     """Get the current user's analyses."""
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 50)
-    
     # Apply filters
     query = current_user.analyses
+    key = (Analysis.created_at, Analysis.id)
     
-    if 'q' in request.args:
-        search = f"%{request.args.get('q')}%"
-        query = query.filter(
-            (Analysis.title.ilike(search)) |
-            (Analysis.description.ilike(search))
-        )
+    query, key = _search(query, key)
     
-    # Order and paginate
-    pagination = query.order_by(Analysis.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    return jsonify({
-        'items': [item.to_dict() for item in pagination.items],
-        '_meta': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': pagination.pages,
-            'total_items': pagination.total
-        }
-    })
+    # Newest first (best match first when searching), by cursor
+    return _keyset_listing(query, key, 50)
 
 @bp.route('/me/favorites', methods=['GET'])
 @token_auth.login_required
 def get_my_favorites():
     """Get the current user's favorite analyses."""
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 50)
-    
     # Get favorite analyses
     query = Analysis.query.join(Favorite)\
         .filter(Favorite.user_id == current_user.id)
+    key = (Favorite.created_at, Favorite.id)
     
     # Apply filters
-    if 'q' in request.args:
-        search = f"%{request.args.get('q')}%"
-        query = query.filter(
-            (Analysis.title.ilike(search)) |
-            (Analysis.description.ilike(search))
-        )
-    
-    # Order and paginate
-    pagination = query.order_by(Favorite.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    query, key = _search(query, key)
     
-    return jsonify({
-        'items': [item.to_dict() for item in pagination.items],
-        '_meta': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': pagination.pages,
-            'total_items': pagination.total
-        }
-    })
+    # Most recently favorited first (best match first when searching), by cursor
+    return _keyset_listing(query, key, 50)
 
 @bp.route('/analyses/<int:id>/favorite', methods=['POST'])
 @token_auth.login_required
 def toggle_favorite(id):
     """Add or remove an analysis from favorites."""
     analysis = Analysis.query.get_or_404(id)
-    favorite = Favorite.query.filter_by(
-        user_id=current_user.id,
-        analysis_id=id
-    ).first()
-    
-    if favorite:
-        # Remove from favorites
-        db.session.delete(favorite)
+    
+    # Remove it from favorites if it was one, in a single statement
+    if Favorite.query.filter_by(user_id=current_user.id, analysis_id=id).delete():
+        adjust_user_stats(current_user.id, favorite_count=-1)
         db.session.commit()
+        invalidate_favorites(current_user.id)
         return jsonify({'status': 'removed', 'favorite': False})
     else:
         # Add to favorites
         favorite = Favorite(user_id=current_user.id, analysis_id=id)
         db.session.add(favorite)
+        adjust_user_stats(current_user.id, favorite_count=1)
         db.session.commit()
+        invalidate_favorites(current_user.id)
         return jsonify({'status': 'added', 'favorite': True})
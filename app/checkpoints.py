@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+
+class PitchCheckpoint:
+    """Chunk-level progress of one analysis job, kept on local disk.
+
+    The directory holds the transcoded segment (so a resumed job skips the
+    download) and one file per finished pitch-tracking chunk. It is tied to
+    the parameters it was created with; if they change (e.g. the segment was
+    edited) the old state is thrown away. Instances are picklable so they can
+    be handed to the pitch-tracking child process.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.write_seconds = 0.0
+        self.resumed_chunks = 0
+
+    @classmethod
+    def for_analysis(cls, root, analysis_id):
+        return cls(os.path.join(root, str(analysis_id)))
+
+    @property
+    def segment_path(self):
+        return os.path.join(self.directory, 'segment.wav')
+
+    @property
+    def has_segment(self):
+        return os.path.exists(self.segment_path)
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _chunk_path(self, index):
+        return os.path.join(self.directory, f'pitch_{index:05d}.npz')
+
+    def begin(self, params):
+        """Open the checkpoint for a run with the given parameters.
+
+        Returns:
+            bool: True if earlier progress with the same parameters was found
+        """
+        try:
+            with open(self._meta_path()) as f:
+                if json.load(f) == params:
+                    return True
+        except (OSError, ValueError):
+            pass
+
+        self.discard()
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_atomic(self._meta_path(), lambda f: f.write(json.dumps(params).encode()))
+        return False
+
+    def load_chunk(self, index):
+        """Return the (f0, voiced_flag, voiced_probs) of a finished chunk, or None."""
+        try:
+            with np.load(self._chunk_path(index)) as data:
+                chunk = (data['f0'], data['voiced_flag'], data['voiced_probs'])
+        except (OSError, ValueError, KeyError):
+            return None
+        self.resumed_chunks += 1
+        return chunk
+
+    def save_chunk(self, index, f0, voiced_flag, voiced_probs):
+        """Persist a finished chunk."""
+        start = time.perf_counter()
+        self._write_atomic(self._chunk_path(index), lambda f: np.savez(
+            f, f0=f0, voiced_flag=voiced_flag, voiced_probs=voiced_probs))
+        self.write_seconds += time.perf_counter() - start
+
+    def commit_segment(self, path):
+        """Move a fully written segment file into the checkpoint."""
+        os.replace(path, self.segment_path)
+
+    def discard(self):
+        """Delete all checkpointed state."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write_atomic(self, path, write):
+        # A crash mid-write must never leave a truncated chunk behind
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,108 @@
+import io
+import json
+import numpy as np
+from .note_store import SWARAS, UNKNOWN_SWARA
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Arrow and Parquet exports answer 501 without pyarrow (in requirements.txt); NPZ always works
+    pa = pq = None
+
+# Columnar export formats and their MIME types
+COLUMNAR_FORMATS = {
+    'npz': 'application/octet-stream',
+    'arrow': 'application/vnd.apache.arrow.file',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Schema, with the same column names in every format.
+#
+# Notes, one row per note in start time order:
+#   start_time   float64  seconds from the start of the analysed segment
+#   duration     float64  seconds
+#   frequency    float64  Hz
+#   confidence   float64  0-1, NaN if unknown
+#   note         the swara; dictionary<uint8, string> in Arrow and Parquet
+#                (null for a name outside CARNATIC_NOTES), in NPZ a uint8
+#                index into the 'note_names' array (255 for such a name)
+#
+# Pitch track, one row per pitch tracker frame:
+#   time         float64  seconds (frame index * hop_length / sr)
+#   f0           float32  Hz, NaN where unvoiced
+#   voiced_prob  float32  0-1
+#   voiced       bool
+#
+# The analysis' fields are a JSON object in the Arrow/Parquet schema
+# metadata under 'analysis', and in NPZ the 'analysis' string array.
+
+def is_available(name):
+    """Whether format ``name`` can be written here (Arrow and Parquet need pyarrow)."""
+    return name == 'npz' or pa is not None
+
+def note_columns(arrays):
+    """Export columns from note arrays (see unpack_notes and NoteSet.columns); no copies."""
+    return {
+        'start_time': arrays['start_time'],
+        'duration': arrays['duration'],
+        'frequency': arrays['frequency'],
+        'confidence': arrays['confidence'],
+        'note': arrays['swara'],
+    }
+
+def track_columns(track):
+    """Export columns from a pitch track (see unpack_track)."""
+    frames = len(track['f0'])
+    return {
+        'time': np.arange(frames) * (track['hop_length'] / track['sr']),
+        'f0': np.asarray(track['f0'], dtype=np.float32),
+        'voiced_prob': np.asarray(track['voiced_probs'], dtype=np.float32),
+        'voiced': np.asarray(track['voiced_flag'], dtype=bool),
+    }
+
+def to_npz(columns, meta):
+    buffer = io.BytesIO()
+    extra = {'note_names': np.array(SWARAS)} if 'note' in columns else {}
+    np.savez(buffer, analysis=np.array(json.dumps(meta)), **columns, **extra)
+    return buffer.getvalue()
+
+def to_table(columns, meta):
+    """An Arrow table over the columns; numeric NumPy arrays are wrapped, not copied."""
+    arrays = {}
+    for name, values in columns.items():
+        if name == 'note':
+            indices = pa.array(values, pa.uint8(), mask=values == UNKNOWN_SWARA)
+            arrays[name] = pa.DictionaryArray.from_arrays(indices, pa.array(SWARAS))
+        else:
+            arrays[name] = pa.array(values)
+    return pa.table(arrays, metadata={'analysis': json.dumps(meta)})
+
+def to_arrow(columns, meta):
+    table = to_table(columns, meta)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def to_parquet(columns, meta):
+    sink = pa.BufferOutputStream()
+    pq.write_table(to_table(columns, meta), sink, compression='zstd')
+    return sink.getvalue().to_pybytes()
+
+WRITERS = {
+    'npz': to_npz,
+    'arrow': to_arrow,
+    'parquet': to_parquet,
+}
+
+def columnar_export(columns, meta, name):
+    """Encode export columns in format ``name`` (a key of COLUMNAR_FORMATS).
+
+    Args:
+        columns: From note_columns or track_columns
+        meta: JSON-serializable analysis fields stored alongside
+
+    Returns:
+        bytes: The file's contents
+    """
+    return WRITERS[name](columns, meta)
@@ -0,0 +1,123 @@
+import struct
+import warnings
+import numpy as np
+from sqlalchemy import func
+from .models import db, ContourTile
+from .note_store import CENTS_REFERENCE_HZ
+
+# A tile starts with a magic/version tag, its zoom level, bucket count,
+# tile index, start time and bucket width (seconds), followed by the
+# minimum, maximum and median cents of every bucket as int16 columns
+_HEADER = struct.Struct('<4sBxHIff')
+_MAGIC = b'RNC1'
+
+# Cents value of a bucket without any voiced frame
+UNVOICED = -32768
+
+def frame_cents(track, confidence_threshold=0.7):
+    """Cents above CENTS_REFERENCE_HZ of every frame of a pitch track; NaN where unvoiced."""
+    f0 = np.asarray(track['f0'], dtype=np.float64)
+    voiced = (np.asarray(track['voiced_flag'], dtype=bool)
+              & (np.asarray(track['voiced_probs']) > confidence_threshold)
+              & (f0 > 0))
+    cents = np.full(len(f0), np.nan)
+    cents[voiced] = 1200 * np.log2(f0[voiced] / CENTS_REFERENCE_HZ)
+    return cents
+
+def _to_int16(values):
+    return np.where(np.isnan(values), UNVOICED, np.clip(np.rint(values), UNVOICED + 1, 32767)).astype('<i2')
+
+def build_pyramid(cents, tile_size=256):
+    """Summarize per-frame cents at 2x zoom steps.
+
+    The first level has one bucket per frame; each next one merges pairs
+    of buckets, until one tile of ``tile_size`` buckets covers everything.
+    Statistics are taken over the frames themselves, not the buckets
+    below, so medians are exact.
+
+    Returns:
+        list: (frames per bucket, min, max, median int16 arrays) per level,
+        finest first
+    """
+    levels = []
+    frames = 1
+    while True:
+        buckets = max(1, -(-len(cents) // frames))
+        grid = np.full(buckets * frames, np.nan)
+        grid[:len(cents)] = cents
+        grid = grid.reshape(buckets, frames)
+        with warnings.catch_warnings():
+            # All-NaN (unvoiced) buckets
+            warnings.simplefilter('ignore', RuntimeWarning)
+            levels.append((frames, _to_int16(np.nanmin(grid, axis=1)), _to_int16(np.nanmax(grid, axis=1)),
+                           _to_int16(np.nanmedian(grid, axis=1))))
+        if buckets <= tile_size:
+            return levels
+        frames *= 2
+
+def pack_tile(level, tile, start, bucket_seconds, mins, maxs, medians):
+    """Encode one tile (see _HEADER)."""
+    return (_HEADER.pack(_MAGIC, level, len(mins), tile, start, bucket_seconds)
+            + mins.tobytes() + maxs.tobytes() + medians.tobytes())
+
+def unpack_tile(data):
+    """Decode a tile into its header fields and min/max/median arrays."""
+    magic, level, count, tile, start, bucket_seconds = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError('Not a contour tile')
+    columns = np.frombuffer(data, '<i2', 3 * count, _HEADER.size).reshape(3, count)
+    return {
+        'level': level,
+        'tile': tile,
+        'start': start,
+        'bucket_seconds': bucket_seconds,
+        'min': columns[0],
+        'max': columns[1],
+        'median': columns[2],
+    }
+
+def contour_tiles(track, tile_size=256, confidence_threshold=0.7):
+    """Build the tiles of a pitch track's contour pyramid.
+
+    Zoom levels are numbered like map tiles: level 0 is the coarsest, a
+    single tile spanning the whole track, and every next level halves the
+    bucket width, down to one bucket per frame. Any request transfers at
+    most ``tile_size`` buckets (6 bytes each) plus a header.
+
+    Returns:
+        list: Dicts with level, tile, bucket_seconds and the encoded data,
+        ready for save_contour
+    """
+    if len(track['f0']) == 0:
+        return []
+    frame_seconds = track['hop_length'] / track['sr']
+    pyramid = build_pyramid(frame_cents(track, confidence_threshold), tile_size)
+
+    tiles = []
+    for level, (frames, mins, maxs, medians) in enumerate(reversed(pyramid)):
+        bucket_seconds = frames * frame_seconds
+        for tile, first in enumerate(range(0, len(mins), tile_size)):
+            span = slice(first, first + tile_size)
+            tiles.append({
+                'level': level,
+                'tile': tile,
+                'bucket_seconds': bucket_seconds,
+                'data': pack_tile(level, tile, first * bucket_seconds, bucket_seconds,
+                                  mins[span], maxs[span], medians[span])
+            })
+    return tiles
+
+def save_contour(analysis_id, tiles):
+    """Replace the contour tiles of an analysis, in the current transaction."""
+    ContourTile.query.filter_by(analysis_id=analysis_id).delete(synchronize_session=False)
+    if tiles:
+        db.session.execute(ContourTile.__table__.insert(),
+                           [dict(tile, analysis_id=analysis_id) for tile in tiles])
+
+def contour_levels(analysis_id):
+    """Zoom levels stored for an analysis: level, bucket width and tile count, coarsest first."""
+    rows = db.session.query(ContourTile.level, func.min(ContourTile.bucket_seconds), func.count(ContourTile.tile))\
+        .filter(ContourTile.analysis_id == analysis_id)\
+        .group_by(ContourTile.level).order_by(ContourTile.level)
+    return [{'level': level, 'bucket_seconds': bucket_seconds, 'tiles': tiles}
+            for level, bucket_seconds, tiles in rows]
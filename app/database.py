@@ -0,0 +1,157 @@
+import queue
+import threading
+from concurrent.futures import Future
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+def engine_options(config):
+    """SQLAlchemy engine options for this process' DB_ROLE.
+
+    Pool sizes come from DB_ENGINE_OPTIONS; SQLALCHEMY_ENGINE_OPTIONS, if
+    set, takes precedence. In-memory SQLite has a single static connection
+    and gets no pool options.
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+        options.update(config['DB_ENGINE_OPTIONS'].get(config['DB_ROLE'], {}))
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+def configure_sqlite(engine, pragmas):
+    """Apply ``pragmas`` to every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+class DatabaseWriter:
+    """One thread performing the database writes of a process' workers.
+
+    SQLite has a single write lock per database. Rather than have every
+    pipeline thread compete for it (and time out with "database is locked"
+    under load), workers queue their writes here. A write is a function
+    doing its changes with db.session, in the writer's own app context,
+    without committing. Whatever is queued when the writer wakes up, up to
+    ``max_batch`` writes, goes into one transaction; if that transaction
+    fails, its writes are retried one per transaction so a failing write
+    only fails itself.
+    """
+
+    def __init__(self, app, max_batch=50):
+        self.app = app
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.transactions = 0
+        self.writes = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, func, *args, **kwargs):
+        """Queue a write; returns a Future for its result."""
+        future = Future()
+        self.queue.put((future, func, args, kwargs))
+        return future
+
+    def stop(self):
+        """Finish the queued writes and stop the thread."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            with self.app.app_context():
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch):
+        from .models import db
+        try:
+            results = [func(*args, **kwargs) for _, func, args, kwargs in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0][0].set_exception(e)
+                return
+            # Retry one by one to find the write that failed
+            for item in batch:
+                self._write([item])
+            return
+
+        self.transactions += 1
+        self.writes += len(batch)
+        for (future, *_), result in zip(batch, results):
+            future.set_result(result)
+
+_writer_lock = threading.Lock()
+
+def get_db_writer(app=None):
+    """Return this process' database writer, starting it on first use."""
+    app = app or current_app._get_current_object()
+    writer = app.extensions.get('db_writer')
+    if writer is None:
+        with _writer_lock:
+            writer = app.extensions.get('db_writer')
+            if writer is None:
+                writer = DatabaseWriter(app, app.config['DB_WRITE_BATCH']).start()
+                app.extensions['db_writer'] = writer
+    return writer
+
+def write(func, *args, wait=True, **kwargs):
+    """Run a write and commit it, through the writer thread if DB_WRITE_QUEUE is on.
+
+    ``func`` makes its changes with db.session and must not commit; it gets
+    a session of its own, so it takes IDs and plain values rather than
+    objects loaded by the caller. Writes are committed in the order they
+    were submitted.
+
+    Args:
+        func: Function doing the write
+        wait: Wait for the write and return its result (or raise its
+            exception). Otherwise return None at once and only log a failure.
+    """
+    from .models import db
+    app = current_app._get_current_object()
+    if app.config['DB_WRITE_QUEUE']:
+        writer = get_db_writer(app)
+        if threading.current_thread() is not writer.thread:
+            future = writer.submit(func, *args, **kwargs)
+            if wait:
+                return future.result()
+            future.add_done_callback(lambda done: done.exception() and app.logger.error(
+                f'Database write {func.__name__} failed: {done.exception()}'))
+            return None
+
+    try:
+        result = func(*args, **kwargs)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
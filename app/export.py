@@ -0,0 +1,76 @@
+import io
+import csv
+from flask import Response, request, stream_with_context
+from .serializers import dumps
+
+# Streamed export formats and their MIME types; the first is the default
+EXPORT_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Exported fields of a note, in CSV column order
+NOTE_FIELDS = ('start_time', 'duration', 'note', 'frequency', 'confidence')
+
+def negotiate_format():
+    """The export format asked for: ``?format=``, else the best match of the Accept header.
+
+    Returns:
+        str or None: A key of EXPORT_FORMATS, or None for an unknown ``format``
+    """
+    if 'format' in request.args:
+        name = request.args['format'].lower()
+        return name if name in EXPORT_FORMATS else None
+    mimetype = request.accept_mimetypes.best_match(list(EXPORT_FORMATS.values()))
+    return next((name for name, value in EXPORT_FORMATS.items() if value == mimetype), 'json')
+
+def json_lines(meta, chunks):
+    """The export as one JSON object: ``meta`` with the notes array streamed into it."""
+    yield dumps(meta)[:-1] + b',"notes":['
+    first = True
+    for notes in chunks:
+        if not notes:
+            continue
+        fragment = b','.join(dumps({field: note[field] for field in NOTE_FIELDS}) for note in notes)
+        yield fragment if first else b',' + fragment
+        first = False
+    yield b']}'
+
+def ndjson_lines(meta, chunks):
+    """One JSON object per note and line; the analysis itself is at /api/analyses/<id>."""
+    for notes in chunks:
+        yield b''.join(dumps({field: note[field] for field in NOTE_FIELDS}) + b'\n' for note in notes)
+
+def csv_lines(meta, chunks):
+    """A header row, then one row per note."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(NOTE_FIELDS)
+    for notes in chunks:
+        writer.writerows([note[field] for field in NOTE_FIELDS] for note in notes)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+WRITERS = {
+    'json': json_lines,
+    'ndjson': ndjson_lines,
+    'csv': csv_lines,
+}
+
+def stream_export(meta, chunks, name):
+    """Stream an analysis export in format ``name``.
+
+    Args:
+        meta: JSON-serializable analysis fields (only the JSON format includes them)
+        chunks: Iterable of lists of note dicts, like NoteSet.chunks()
+        name: Key of EXPORT_FORMATS
+
+    Returns:
+        Response: Streamed while the notes are read, so memory stays flat
+        however many notes there are
+    """
+    generate = WRITERS[name](meta, chunks)
+    return Response(stream_with_context(generate), mimetype=EXPORT_FORMATS[name])
@@ -0,0 +1,77 @@
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app, g
+from flask_login import current_user
+from .models import db, Favorite
+
+_cache_lock = threading.Lock()
+
+_TOO_MANY = 'too many'
+
+def _favorite_set(user_id):
+    """All of a user's favorited analysis IDs, from the per-process cache or loaded into it.
+
+    Returns:
+        frozenset or None: The IDs, or None for a user with more than
+        FAVORITES_CACHE_MAX_IDS of them, whose favorites are looked up per page
+    """
+    config = current_app.config
+    cache = current_app.extensions.setdefault('favorites_cache', OrderedDict())
+    with _cache_lock:
+        entry = cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            cache.move_to_end(user_id)
+            return None if entry[1] is _TOO_MANY else entry[1]
+
+    limit = config['FAVORITES_CACHE_MAX_IDS']
+    ids = [analysis_id for analysis_id, in db.session.query(Favorite.analysis_id)
+           .filter(Favorite.user_id == user_id).limit(limit + 1)]
+    ids = _TOO_MANY if len(ids) > limit else frozenset(ids)
+    with _cache_lock:
+        cache[user_id] = (time.monotonic() + config['FAVORITES_CACHE_TTL'], ids)
+        cache.move_to_end(user_id)
+        while len(cache) > config['FAVORITES_CACHE_SIZE']:
+            cache.popitem(last=False)
+    return None if ids is _TOO_MANY else ids
+
+def invalidate_favorites(user_id):
+    """Forget a user's cached favorites; call after adding or removing one."""
+    cache = current_app.extensions.get('favorites_cache')
+    if cache is not None:
+        with _cache_lock:
+            cache.pop(user_id, None)
+    g.pop('favorites', None)
+
+def favorited_ids(analysis_ids):
+    """Return which of ``analysis_ids`` the current user has favorited.
+
+    Resolved for a whole page at once: from the user's cached set of
+    favorites when it is small enough to cache (no query at all once
+    cached), otherwise with one IN query for the IDs not seen yet in this
+    request. Anonymous users have no favorites.
+
+    Other processes' caches are not invalidated by a toggle and may lag
+    behind by up to FAVORITES_CACHE_TTL seconds.
+    """
+    if not current_user.is_authenticated:
+        return set()
+    ids = set(analysis_ids)
+
+    # What this request already knows: the user's whole set, or per-ID answers
+    known = g.get('favorites')
+    if known is None:
+        known = g.favorites = {'all': _favorite_set(current_user.id), 'ids': {}}
+    if known['all'] is not None:
+        return ids & known['all']
+
+    missing = ids - known['ids'].keys()
+    if missing:
+        found = {analysis_id for analysis_id, in db.session.query(Favorite.analysis_id).filter(
+            Favorite.user_id == current_user.id, Favorite.analysis_id.in_(missing))}
+        known['ids'].update((analysis_id, analysis_id in found) for analysis_id in missing)
+    return {analysis_id for analysis_id in ids if known['ids'][analysis_id]}
+
+def is_favorited(analysis_id):
+    """Whether the current user has favorited an analysis (see favorited_ids)."""
+    return analysis_id in favorited_ids([analysis_id])
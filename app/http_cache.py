@@ -0,0 +1,75 @@
+import hashlib
+from datetime import timezone
+from flask import current_app, request, session
+from flask_login import current_user
+
+def analysis_validators(analysis, *variant):
+    """Strong ETag and Last-Modified of a response built from an analysis.
+
+    The ETag covers the analysis ID, its updated_at (bumped by every edit,
+    progress update and note save) and ENGINE_VERSION, plus ``variant``:
+    anything else the response depends on, like the requesting user or
+    the author's username (related rows don't bump updated_at).
+
+    Returns:
+        tuple: (etag, last_modified)
+    """
+    updated_at = analysis.updated_at or analysis.created_at
+    key = '|'.join(str(part) for part in (
+        analysis.id, updated_at.isoformat() if updated_at else '',
+        current_app.config['ENGINE_VERSION'], *variant))
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    last_modified = updated_at.replace(tzinfo=timezone.utc, microsecond=0) if updated_at else None
+    return etag, last_modified
+
+def page_validators(analysis, *variant):
+    """Like analysis_validators, for an HTML page; None if the page must be rendered anew.
+
+    Pages show who is signed in and carry their session's CSRF token, so
+    both are part of the ETag. Pages with flashed messages waiting to be
+    shown are never answered with a 304.
+    """
+    if session.get('_flashes'):
+        return None
+    return analysis_validators(analysis, current_user.get_id(), session.get('csrf_token'), *variant)
+
+def is_not_modified(etag, last_modified):
+    """Whether the request's validators match, so a 304 can be sent without building the response.
+
+    If-None-Match takes precedence over If-Modified-Since, which only has
+    one-second resolution.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+def cache_response(response, etag, last_modified, public, per_user=False):
+    """Add the validators and Cache-Control to a response (or a 304 without a body when ``response`` is None).
+
+    Args:
+        response: The response, or None to send 304 Not Modified
+        public: Whether shared caches may store it (a public analysis)
+        per_user: Whether signed-in users get a different response, so
+            caches must tell requests apart by their credentials
+    """
+    if response is None:
+        response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    if per_user:
+        response.vary.update(('Cookie', 'Authorization'))
+    # Clients revalidate (cheap, see is_not_modified) once max-age is up
+    max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    response.cache_control.max_age = max_age
+    if not max_age:
+        response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import queue
+import signal
+import threading
+import subprocess
+import multiprocessing
+from collections import deque
+
+class JobCancelled(Exception):
+    """Raised when an analysis job has been cancelled or deleted."""
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage runs past its time limit."""
+
+class CancelCheck:
+    """Rate-limited wrapper around a cancellation predicate.
+
+    Supervising loops call this every few hundred milliseconds; the wrapped
+    predicate (usually a database lookup) only runs once per ``interval``.
+    """
+
+    def __init__(self, predicate, interval=2.0):
+        self.predicate = predicate
+        self.interval = interval
+        self._last_check = 0.0
+
+    def __call__(self):
+        now = time.monotonic()
+        if now - self._last_check < self.interval:
+            return False
+        self._last_check = now
+        return bool(self.predicate())
+
+def _kill_process_group(proc):
+    """Terminate a subprocess and everything it spawned (e.g. ffmpeg under yt-dlp)."""
+    if proc.poll() is not None:
+        return
+
+    try:
+        if os.name == 'nt':
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=5)
+                return
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+def run_subprocess(cmd, timeout=None, should_cancel=None, on_line=None, poll_interval=0.5):
+    """Run a command with a hard timeout and cooperative cancellation.
+
+    The command runs in its own process group so that a timeout or
+    cancellation also kills any children it started.
+
+    Args:
+        cmd: Command and arguments
+        timeout: Seconds before the command is killed (None for no limit)
+        should_cancel: Callable returning True when the job has been cancelled
+        on_line: Callable invoked with each line the command writes to stdout
+        poll_interval: Seconds between cancellation and deadline checks
+
+    Returns:
+        int: The command's exit code
+
+    Raises:
+        JobCancelled, StageTimeout, RuntimeError (non-zero exit)
+    """
+    popen_kwargs = {}
+    if os.name == 'nt':
+        popen_kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        popen_kwargs['start_new_session'] = True
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, **popen_kwargs)
+    stdout_lines = queue.Queue()
+    stderr_tail = deque(maxlen=20)
+
+    def read_stdout():
+        for line in proc.stdout:
+            stdout_lines.put(line.rstrip('\n'))
+
+    def read_stderr():
+        for line in proc.stderr:
+            stderr_tail.append(line.rstrip('\n'))
+
+    def drain_stdout():
+        # on_line runs on the calling thread, which may hold an app context
+        while True:
+            try:
+                line = stdout_lines.get_nowait()
+            except queue.Empty:
+                return
+            if on_line:
+                on_line(line)
+
+    readers = [threading.Thread(target=read_stdout, daemon=True),
+               threading.Thread(target=read_stderr, daemon=True)]
+    for reader in readers:
+        reader.start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        while True:
+            try:
+                proc.wait(timeout=poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            drain_stdout()
+
+            if should_cancel and should_cancel():
+                raise JobCancelled(f'{os.path.basename(cmd[0])} cancelled')
+            if deadline and time.monotonic() > deadline:
+                raise StageTimeout(f'{" ".join(cmd[:3])} timed out after {timeout}s')
+    finally:
+        _kill_process_group(proc)
+        for reader in readers:
+            reader.join(timeout=1)
+    drain_stdout()
+
+    if proc.returncode != 0:
+        message = stderr_tail[-1] if stderr_tail else f'exit code {proc.returncode}'
+        raise RuntimeError(f'{" ".join(cmd[:3])} failed: {message}')
+    return proc.returncode
+
+# Modules imported once by the fork server so job children start warm
+FORKSERVER_PRELOAD = ['__main__', 'app.audio_utils']
+
+_mp_context = None
+
+def _get_mp_context():
+    """Pick a multiprocessing start method that is safe in a threaded server."""
+    global _mp_context
+    if _mp_context is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            _mp_context = multiprocessing.get_context('forkserver')
+            _mp_context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        else:
+            _mp_context = multiprocessing.get_context('spawn')
+    return _mp_context
+
+def _child_main(results, target, args, kwargs):
+    """Entry point of the child process started by run_in_child."""
+    def progress(stage, fraction):
+        results.put(('progress', stage, fraction))
+
+    try:
+        results.put(('result', target(*args, progress_callback=progress, **kwargs)))
+    except Exception as e:
+        results.put(('error', f'{type(e).__name__}: {e}'))
+
+def run_in_child(target, args=(), kwargs=None, timeout=None, should_cancel=None,
+                 on_progress=None, poll_interval=0.5):
+    """Run a CPU-bound function in a child process that can be killed.
+
+    ``target`` must be importable (module-level) and accept a
+    ``progress_callback(stage, fraction)`` keyword argument; progress is
+    relayed to ``on_progress`` in the calling process. The child is terminated
+    on timeout or cancellation, which a thread running the same code could not
+    be.
+
+    Returns:
+        The return value of ``target``
+
+    Raises:
+        JobCancelled, StageTimeout, RuntimeError (the child raised or died)
+    """
+    ctx = _get_mp_context()
+    results = ctx.Queue()
+    proc = ctx.Process(target=_child_main, args=(results, target, args, kwargs or {}),
+                       daemon=True)
+    proc.start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        while True:
+            try:
+                message = results.get(timeout=poll_interval)
+            except queue.Empty:
+                if not proc.is_alive():
+                    # Allow a final message that was in flight when the child exited
+                    try:
+                        message = results.get(timeout=1)
+                    except queue.Empty:
+                        raise RuntimeError(f'{target.__name__} exited with code {proc.exitcode}')
+                else:
+                    message = None
+
+            if message is not None:
+                if message[0] == 'result':
+                    proc.join(timeout=5)
+                    return message[1]
+                if message[0] == 'error':
+                    raise RuntimeError(message[1])
+                if on_progress:
+                    on_progress(message[1], message[2])
+
+            if should_cancel and should_cancel():
+                raise JobCancelled(f'{target.__name__} cancelled')
+            if deadline and time.monotonic() > deadline:
+                raise StageTimeout(f'{target.__name__} timed out after {timeout}s')
+    finally:
+        if proc.is_alive():
+            proc.terminate()
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.kill()
+        proc.join()
+        results.close()
+
+def yt_dlp_command(*args):
+    """Build a command line that runs the installed yt-dlp module."""
+    return [sys.executable, '-m', 'yt_dlp', *args]
@@ -1,8 +1,18 @@
-from flask import render_template, jsonify, request, redirect, url_for, flash, current_app
+from flask import render_template, jsonify, request, redirect, url_for, flash, current_app, make_response
 from flask_login import login_required, current_user
 from . import bp
-from ..models import db, Analysis, Note, User, Favorite
+from ..models import db, Analysis, User, Favorite
+from ..note_store import load_notes
+from ..stats import adjust_user_stats, get_user_stats, remove_analysis
+from ..admission import check_admission
+from ..pagination import keyset_paginate, InvalidCursor
+from ..search import search_analyses
+from ..favorites import invalidate_favorites, is_favorited
+from ..http_cache import page_validators, is_not_modified, cache_response
+from ..page_cache import cached_page, cached_analyses
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
 from datetime import datetime
+import json
 import os
 import tempfile
 
@@ -10,14 +20,20 @@ import tempfile
 def index():
     """Home page with featured analyses and app information."""
     try:
-        # Get recent public analyses
-        recent_analyses = Analysis.query.filter_by(is_public=True)\
-            .order_by(Analysis.created_at.desc())\
-            .limit(6).all()
+        # Get recent public analyses (the IDs are cached until one changes)
+        def recent():
+            return Analysis.query.filter_by(is_public=True)\
+                .order_by(Analysis.created_at.desc())\
+                .limit(6).all(), None
         
-        return render_template('main/index.html',
-                            recent_analyses=recent_analyses,
-                            title='Home')
+        # Anonymous visitors share one rendered page
+        def render():
+            recent_analyses, _ = cached_analyses('index_recent', 'recent', recent)
+            return render_template('main/index.html',
+                                recent_analyses=recent_analyses,
+                                title='Home')
+        
+        return cached_page('index_page', render)
     except Exception as e:
         current_app.logger.error(f"Error in index route: {str(e)}")
         return render_template('main/index.html',
@@ -42,20 +58,20 @@ def dashboard():
         # Get user's favorite analyses
         favorites = current_user.favorites\
             .join(Analysis)\
+            .options(contains_eager(Favorite.analysis).selectinload(Analysis.author))\
             .order_by(Analysis.created_at.desc())\
             .limit(5).all()
         
-        # Get some statistics
-        total_analyses = current_user.analyses.count()
-        total_notes = Note.query.join(Analysis)\
-            .filter(Analysis.user_id == current_user.id)\
-            .count()
+        # Get some statistics (maintained counters, see app/stats.py)
+        stats = get_user_stats(current_user.id)
         
         return render_template('main/dashboard.html',
                              recent_analyses=recent_analyses,
                              favorites=favorites,
-                             total_analyses=total_analyses,
-                             total_notes=total_notes,
+                             total_analyses=stats['analysis_count'],
+                             total_notes=stats['note_count'],
+                             total_seconds=stats['analyzed_seconds'],
+                             total_favorites=stats['favorite_count'],
                              title='Dashboard')
     except Exception as e:
         current_app.logger.error(f"Error in dashboard route: {str(e)}")
@@ -65,27 +81,40 @@ def dashboard():
 @bp.route('/browse')
 def browse():
     """Browse public analyses from all users."""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     query = request.args.get('q', '')
     
-    # Base query for public analyses
-    analyses = Analysis.query.filter_by(is_public=True)
+    # Base query for public analyses, with their authors loaded per page
+    analyses = Analysis.query.filter_by(is_public=True).options(selectinload(Analysis.author))
     
-    # Apply search filter if provided
+    key = (Analysis.created_at, Analysis.id)
+    
+    # Apply search filter if provided; matches are listed by relevance
     if query:
-        analyses = analyses.filter(
-            (Analysis.title.ilike(f'%{query}%')) |
-            (Analysis.description.ilike(f'%{query}%'))
-        )
+        analyses, score = search_analyses(analyses, query)
+        if score is not None:
+            key = (score, Analysis.id)
+    
+    # Newest first, by cursor; a bad cursor starts over from the first page
+    def listing():
+        try:
+            page = keyset_paginate(analyses, key, 12, cursor=cursor)
+        except InvalidCursor:
+            page = keyset_paginate(analyses, key, 12)
+        return page.items, [page.next_cursor, page.prev_cursor]
     
-    # Order and paginate
-    analyses = analyses.order_by(Analysis.created_at.desc())\
-        .paginate(page=page, per_page=12, error_out=False)
+    # Pages of results are cached until a public analysis changes, and
+    # anonymous visitors share the rendered page
+    def render():
+        items, (next_cursor, prev_cursor) = cached_analyses('browse_listing', json.dumps([query, cursor]), listing)
+        return render_template('browse.html',
+                             analyses=items,
+                             next_cursor=next_cursor,
+                             prev_cursor=prev_cursor,
+                             query=query,
+                             title='Browse Analyses')
     
-    return render_template('browse.html',
-                         analyses=analyses,
-                         query=query,
-                         title='Browse Analyses')
+    return cached_page('browse_page', render)
 
 @bp.route('/analyze', methods=['GET', 'POST'])
 @login_required
@@ -99,6 +128,27 @@ def analyze():
         title = request.form.get('title', 'Untitled Analysis')
         is_public = 'is_public' in request.form
         
+        def form_response(status_code, retry_after=None):
+            response = make_response(render_template('analyze.html',
+                                                     title='Analyze Audio',
+                                                     default_shruthi=shruthi,
+                                                     default_start=start_time,
+                                                     default_end=end_time), status_code)
+            if retry_after:
+                response.headers['Retry-After'] = str(retry_after)
+            return response
+        
+        if end_time <= start_time:
+            flash('The end time must be after the start time.', 'danger')
+            return form_response(400)
+        
+        # Refuse work the user or the queue has no capacity for, and pick
+        # the analysis quality the current load allows
+        admission = check_admission(current_user.id, end_time - start_time)
+        if not admission.admitted:
+            flash(admission.error, 'warning')
+            return form_response(admission.status_code, admission.retry_after)
+        
         # Create a new analysis record
         analysis = Analysis(
             user_id=current_user.id,
@@ -106,19 +156,22 @@ def analyze():
             video_url=video_url,
             start_time=start_time,
             end_time=end_time,
+            duration=end_time - start_time,
             shruthi=shruthi,
+            profile=admission.profile,
+            estimated_cost=admission.cost,
             is_public=is_public
         )
         
         db.session.add(analysis)
+        adjust_user_stats(current_user.id, analysis_count=1)
         db.session.commit()
         
-        # In a production environment, you would use a task queue like Celery
-        # to process the analysis in the background
-        from ..tasks import analyze_audio_task
-        analyze_audio_task.delay(analysis.id)
+        # Process the analysis in the background pipeline
+        from ..pipeline import enqueue_analysis
+        enqueue_analysis(analysis.id)
         
-        flash('Your analysis has been queued. Please check back in a moment!', 'info')
+        flash(f'Your analysis has been queued and should be ready {admission.describe_eta()}.', 'info')
         return redirect(url_for('main.analysis', analysis_id=analysis.id))
     
     # For GET request, show the analysis form
@@ -131,7 +184,7 @@ def analyze():
 @bp.route('/analysis/<int:analysis_id>')
 def analysis(analysis_id):
     """View analysis results."""
-    analysis = Analysis.query.get_or_404(analysis_id)
+    analysis = Analysis.query.options(joinedload(Analysis.author)).get_or_404(analysis_id)
     
     # Check if the analysis is public or belongs to the current user
     if not analysis.is_public and (not current_user.is_authenticated or 
@@ -139,22 +192,21 @@ def analysis(analysis_id):
         flash('You do not have permission to view this analysis.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get all notes for this analysis
-    notes = analysis.notes.order_by(Note.start_time).all()
+    # Skip loading the notes if the browser's copy of the page is current
+    favorited = is_favorited(analysis.id)
+    validators = page_validators(analysis, analysis.author.username, favorited)
+    if validators and is_not_modified(*validators):
+        return cache_response(None, *validators, public=False, per_user=True)
     
-    # Check if analysis is in user's favorites
-    is_favorite = False
-    if current_user.is_authenticated:
-        is_favorite = Favorite.query.filter_by(
-            user_id=current_user.id,
-            analysis_id=analysis_id
-        ).first() is not None
+    # Every note: the page has no client code to fetch later windows yet
+    notes = load_notes(analysis.id).all()
     
-    return render_template('analysis.html',
+    response = make_response(render_template('analysis.html',
                          analysis=analysis,
                          notes=notes,
-                         is_favorite=is_favorite,
-                         title=f'Analysis: {analysis.title}')
+                         is_favorite=favorited,
+                         title=f'Analysis: {analysis.title}'))
+    return cache_response(response, *validators, public=False, per_user=True) if validators else response
 
 @bp.route('/analysis/<int:analysis_id>/delete', methods=['POST'])
 @login_required
@@ -167,11 +219,8 @@ def delete_analysis(analysis_id):
         flash('You do not have permission to delete this analysis.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Delete associated notes
-    Note.query.filter_by(analysis_id=analysis_id).delete()
-    
-    # Delete the analysis
-    db.session.delete(analysis)
+    # Delete the analysis with its notes, updating the dashboard counters
+    remove_analysis(analysis)
     db.session.commit()
     
     flash('Analysis deleted successfully!', 'success')
@@ -182,24 +231,22 @@ def delete_analysis(analysis_id):
 def toggle_favorite(analysis_id):
     """Add or remove an analysis from favorites."""
     analysis = Analysis.query.get_or_404(analysis_id)
-    favorite = Favorite.query.filter_by(
-        user_id=current_user.id,
-        analysis_id=analysis_id
-    ).first()
-    
-    if favorite:
-        # Remove from favorites
-        db.session.delete(favorite)
+    
+    # Remove it from favorites if it was one, in a single statement
+    if Favorite.query.filter_by(user_id=current_user.id, analysis_id=analysis_id).delete():
+        adjust_user_stats(current_user.id, favorite_count=-1)
         action = 'removed from'
         is_favorite = False
     else:
         # Add to favorites
         favorite = Favorite(user_id=current_user.id, analysis_id=analysis_id)
         db.session.add(favorite)
+        adjust_user_stats(current_user.id, favorite_count=1)
         action = 'added to'
         is_favorite = True
     
     db.session.commit()
+    invalidate_favorites(current_user.id)
     
     if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return jsonify({
@@ -1,4 +1,5 @@
 from datetime import datetime, timezone
+from itertools import islice
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from app import db
@@ -75,18 +76,106 @@ class Analysis(db.Model):
     end_time = db.Column(db.Float, nullable=False)
     duration = db.Column(db.Float, nullable=False)
     shruthi = db.Column(db.String(10), default='C#', nullable=False)  # Base pitch for analysis
-    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    status = db.Column(db.String(20), default='pending')  # pending, queued, processing, completed, failed, cancelled
+    stage = db.Column(db.String(20), nullable=True)  # downloading, decoding, pitch, saving
+    progress = db.Column(db.Float, default=0.0)  # Fraction (0-1) of the current stage completed
+    error_message = db.Column(db.Text, nullable=True)
+    worker_id = db.Column(db.String(64), nullable=True)  # Process whose pipeline holds the job (see app/pipeline.py)
+    lease_renewed_at = db.Column(db.DateTime, nullable=True)  # Last heartbeat of that process; a lapsed lease is recovered
+    profile = db.Column(db.String(20), default='standard', nullable=False)  # Key of Config.ANALYSIS_PROFILES; cheaper than the default when degraded under load
+    requested_profile = db.Column(db.String(20), nullable=True)  # Profile the client asked for; None lets admission control pick (and later upgrade) it
+    estimated_cost = db.Column(db.Float, nullable=True)  # Estimated worker-seconds, set on admission
+    note_count = db.Column(db.Integer, default=0, nullable=False)  # Maintained with the notes (see app/stats.py)
+    max_note_duration = db.Column(db.Float, nullable=True)  # Longest stored note, bounds time window queries (see app/note_store.py)
+    audio_path = db.Column(db.String(512), nullable=True)  # Uploaded audio file, deleted with the analysis
     is_public = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
     
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     # Relationships
     notes = db.relationship('Note', backref='analysis', lazy='dynamic', cascade='all, delete-orphan')
+    packed_notes = db.relationship('PackedNotes', backref='analysis', uselist=False, cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', backref='analysis', lazy='dynamic', cascade='all, delete-orphan')
     
+    # Access paths of the public listings, a user's own analyses and the job queue
+    __table_args__ = (
+        db.Index('ix_analyses_public_created', 'is_public', 'created_at'),
+        db.Index('ix_analyses_user_created', 'user_id', 'created_at'),
+        db.Index('ix_analyses_status_completed', 'status', 'completed_at'),
+    )
+    
+    # Statuses after which the job will not change any more
+    TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+    
+    # Statuses in which the job can still be cancelled
+    ACTIVE_STATUSES = ('pending', 'queued', 'processing')
+    
+    # Statuses in which the segment can still be edited: not started, or
+    # to be run again
+    EDITABLE_STATUSES = ('pending', 'queued', 'failed', 'cancelled')
+    
+    @property
+    def is_finished(self):
+        """Check if the analysis job has reached a terminal status."""
+        return self.status in self.TERMINAL_STATUSES
+    
+    def progress_dict(self):
+        """Return the job status fields reported to polling and streaming clients."""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress or 0.0, 4),
+            'error': self.error_message
+        }
+    
+    def to_dict(self, favorited=None):
+        """Serialize the analysis for the API.
+        
+        Args:
+            favorited: Whether the requesting user favorited it; left out if None
+        """
+        data = {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'video_url': self.video_url,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'shruthi': self.shruthi,
+            'profile': self.profile,
+            'note_count': self.note_count,
+            'is_public': self.is_public,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'user': {
+                'id': self.author.id,
+                'username': self.author.username
+            }
+        }
+        data.update(self.progress_dict())
+        if favorited is not None:
+            data['is_favorited'] = favorited
+        return data
+    
+    def from_dict(self, data):
+        """Update the user-editable fields from API input."""
+        for field in ['title', 'description', 'video_url', 'shruthi', 'is_public']:
+            if field in data:
+                setattr(self, field, data[field])
+        for field in ['start_time', 'end_time']:
+            if field in data:
+                setattr(self, field, float(data[field]))
+        if self.title is None:
+            self.title = 'Untitled Analysis'
+        if self.start_time is not None and self.end_time is not None:
+            self.duration = self.end_time - self.start_time
+    
     def __repr__(self):
         return f'<Analysis {self.title}>'
 
@@ -104,9 +193,129 @@ class Note(db.Model):
     # Foreign Keys
     analysis_id = db.Column(db.Integer, db.ForeignKey('analyses.id'), nullable=False)
     
+    # Notes are always read per analysis in time order
+    __table_args__ = (db.Index('ix_notes_analysis_start', 'analysis_id', 'start_time'),)
+    
+    @classmethod
+    def bulk_insert(cls, analysis_id, notes, batch_size=5000):
+        """Insert detected notes without building ORM objects.
+        
+        ``notes`` are the dicts produced by track_to_notes. Rows go through a
+        Core INSERT executed with executemany, ``batch_size`` rows at a time,
+        on the session's connection: they are part of the current transaction
+        and committed with it. The identity map is bypassed, so Note objects
+        already loaded in the session will not see the new rows.
+        
+        Returns:
+            int: Number of rows inserted
+        """
+        statement = cls.__table__.insert()
+        rows = ({
+            'analysis_id': analysis_id,
+            'note_name': note['note'],
+            'frequency': note['frequency'],
+            'start_time': note['time'],
+            'duration': note['duration'],
+            'confidence': note.get('confidence', 1.0)
+        } for note in notes)
+        
+        inserted = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return inserted
+            db.session.execute(statement, batch)
+            inserted += len(batch)
+    
+    def to_dict(self):
+        """Serialize the note for the API."""
+        return {
+            'id': self.id,
+            'note': self.note_name,
+            'frequency': self.frequency,
+            'start_time': self.start_time,
+            'duration': self.duration,
+            'confidence': self.confidence
+        }
+    
     def __repr__(self):
         return f'<Note {self.note_name} at {self.start_time:.2f}s>'
 
+class UserStats(db.Model):
+    """Counters shown on a user's dashboard, maintained by app/stats.py."""
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    analysis_count = db.Column(db.Integer, default=0, nullable=False)
+    note_count = db.Column(db.Integer, default=0, nullable=False)
+    analyzed_seconds = db.Column(db.Float, default=0.0, nullable=False)  # Duration of completed analyses
+    favorite_count = db.Column(db.Integer, default=0, nullable=False)  # Analyses the user favorited
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<UserStats user_id={self.user_id}>'
+
+class PackedNotes(db.Model):
+    """All notes of an analysis packed into one compressed blob (see app/note_store.py).
+    
+    Used instead of Note rows when NOTE_STORAGE is 'packed'.
+    """
+    __tablename__ = 'packed_notes'
+    
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analyses.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))  # Only loaded when the notes are read
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PackedNotes analysis_id={self.analysis_id} count={self.count}>'
+
+class PitchTrack(db.Model):
+    """Frame-level pitch track of an analysis, compressed (see app/note_store.py).
+    
+    Kept for columnar exports when STORE_PITCH_TRACKS is on.
+    """
+    __tablename__ = 'pitch_tracks'
+    
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analyses.id'), primary_key=True)
+    frames = db.Column(db.Integer, nullable=False)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))  # Only loaded when the track is read
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PitchTrack analysis_id={self.analysis_id} frames={self.frames}>'
+
+class ContourTile(db.Model):
+    """Pitch contour summary of one span of an analysis at one zoom level (see app/contour.py)."""
+    __tablename__ = 'contour_tiles'
+    
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analyses.id'), primary_key=True)
+    level = db.Column(db.Integer, primary_key=True)  # 0 is the coarsest
+    tile = db.Column(db.Integer, primary_key=True)
+    bucket_seconds = db.Column(db.Float, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    
+    def __repr__(self):
+        return f'<ContourTile analysis_id={self.analysis_id} level={self.level} tile={self.tile}>'
+
+class StageTiming(db.Model):
+    """Wall-clock time one pipeline stage took, used to calibrate the cost model."""
+    __tablename__ = 'stage_timings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    analysis_id = db.Column(db.Integer, index=True, nullable=True)  # Not a foreign key: timings outlive analyses
+    stage = db.Column(db.String(20), nullable=False)
+    profile = db.Column(db.String(20), nullable=False)
+    backend = db.Column(db.String(20), nullable=False)
+    segment_seconds = db.Column(db.Float, nullable=False)
+    elapsed_seconds = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_stage_timings_model', 'stage', 'profile', 'backend', 'id'),)
+    
+    def __repr__(self):
+        return f'<StageTiming {self.stage} {self.elapsed_seconds:.2f}s>'
+
 class Favorite(db.Model):
     """Favorite analyses for users."""
     __tablename__ = 'favorites'
@@ -118,8 +327,13 @@ class Favorite(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     analysis_id = db.Column(db.Integer, db.ForeignKey('analyses.id'), nullable=False)
     
-    # Unique constraint
-    __table_args__ = (db.UniqueConstraint('user_id', 'analysis_id', name='_user_analysis_uc'),)
+    # Unique constraint (also the index for lookups by user and analysis),
+    # plus indexes for a user's favorites by date and deletes by analysis
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'analysis_id', name='_user_analysis_uc'),
+        db.Index('ix_favorites_user_created', 'user_id', 'created_at'),
+        db.Index('ix_favorites_analysis', 'analysis_id'),
+    )
     
     def __repr__(self):
         return f'<Favorite user_id={self.user_id} analysis_id={self.analysis_id}>'
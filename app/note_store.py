@@ -0,0 +1,349 @@
+import zlib
+import struct
+import numpy as np
+from sqlalchemy import select, func
+from config import Config
+from .models import db, Analysis, Note, PackedNotes, PitchTrack
+
+# Packed blobs start with a magic/version tag and the note count
+_HEADER = struct.Struct('<4sI')
+_MAGIC = b'RNF1'
+
+# Frequencies are stored as cents above this reference (A4)
+CENTS_REFERENCE_HZ = 440.0
+
+# Swara indices refer to this list; 255 marks a name not in it
+SWARAS = Config.CARNATIC_NOTES
+UNKNOWN_SWARA = 255
+
+# Columns of a packed blob in storage order. Each column is stored
+# contiguously (better compression than interleaved records) and start_ms
+# is delta-encoded, as notes are sorted by start time.
+PACKED_COLUMNS = [
+    ('swara', np.dtype('u1')),
+    ('start_ms', np.dtype('<i4')),
+    ('duration_ms', np.dtype('<i4')),
+    ('cents', np.dtype('<f4')),
+    ('confidence', np.dtype('u1')),
+]
+
+# Packed pitch tracks: a magic/version tag, frame count, sample rate and
+# hop length, then f0 (float32 Hz, NaN where unvoiced), the voicing
+# probabilities (float32) and the voiced flags (one bit per frame)
+_TRACK_HEADER = struct.Struct('<4sIII')
+_TRACK_MAGIC = b'RNT1'
+
+def pack_notes(notes):
+    """Pack note dicts (as produced by track_to_notes) into a compressed blob.
+
+    Times are quantized to milliseconds, frequencies kept as float32 cents
+    and confidences as 1/255 steps.
+    """
+    notes = sorted(notes, key=lambda note: note['time'])
+    count = len(notes)
+    index = {name: i for i, name in enumerate(SWARAS)}
+
+    def column(key, default=None):
+        return np.fromiter((note.get(key, default) for note in notes), np.float64, count)
+
+    start_ms = np.rint(column('time') * 1000).astype(np.int64)
+    frequency = np.maximum(column('frequency'), 1e-6)
+    columns = {
+        'swara': np.fromiter((index.get(note['note'], UNKNOWN_SWARA) for note in notes), np.uint8, count),
+        'start_ms': np.diff(start_ms, prepend=0),
+        'duration_ms': np.rint(column('duration') * 1000),
+        'cents': 1200 * np.log2(frequency / CENTS_REFERENCE_HZ),
+        'confidence': np.rint(np.clip(column('confidence', 1.0), 0.0, 1.0) * 255),
+    }
+    payload = b''.join(columns[name].astype(dtype).tobytes() for name, dtype in PACKED_COLUMNS)
+    return _HEADER.pack(_MAGIC, count) + zlib.compress(payload, 6)
+
+def unpack_notes(blob):
+    """Decode a packed blob into NumPy arrays.
+
+    Returns:
+        dict: swara (uint8 indices into SWARAS), start_time and duration
+        (seconds), frequency (Hz) and confidence (0-1) arrays, sorted by
+        start time
+    """
+    magic, count = _HEADER.unpack_from(blob)
+    if magic != _MAGIC:
+        raise ValueError('Not a packed note blob')
+    payload = zlib.decompress(blob[_HEADER.size:])
+
+    raw = {}
+    offset = 0
+    for name, dtype in PACKED_COLUMNS:
+        raw[name] = np.frombuffer(payload, dtype, count, offset)
+        offset += count * dtype.itemsize
+
+    return {
+        'swara': raw['swara'],
+        'start_time': np.cumsum(raw['start_ms'], dtype=np.int64) / 1000.0,
+        'duration': raw['duration_ms'] / 1000.0,
+        'frequency': CENTS_REFERENCE_HZ * 2.0 ** (raw['cents'].astype(np.float64) / 1200),
+        'confidence': raw['confidence'] / 255.0,
+    }
+
+def pack_track(track):
+    """Pack a pitch track from pitch_track_segment into a compressed blob."""
+    f0 = np.asarray(track['f0'], dtype='<f4')
+    frames = len(f0)
+    payload = (f0.tobytes()
+               + np.asarray(track['voiced_probs'], dtype='<f4').tobytes()
+               + np.packbits(np.asarray(track['voiced_flag'], dtype=bool)).tobytes())
+    return (_TRACK_HEADER.pack(_TRACK_MAGIC, frames, int(track['sr']), int(track['hop_length']))
+            + zlib.compress(payload, 6))
+
+def unpack_track(blob):
+    """Decode a packed pitch track.
+    
+    Returns:
+        dict: f0, voiced_flag and voiced_probs arrays, sr and hop_length,
+        like pitch_track_segment
+    """
+    magic, frames, sr, hop_length = _TRACK_HEADER.unpack_from(blob)
+    if magic != _TRACK_MAGIC:
+        raise ValueError('Not a packed pitch track')
+    payload = zlib.decompress(blob[_TRACK_HEADER.size:])
+    return {
+        'f0': np.frombuffer(payload, '<f4', frames, 0),
+        'voiced_probs': np.frombuffer(payload, '<f4', frames, 4 * frames),
+        'voiced_flag': np.unpackbits(np.frombuffer(payload, 'u1', -1, 8 * frames), count=frames).astype(bool),
+        'sr': sr,
+        'hop_length': hop_length,
+    }
+
+def save_track(analysis_id, track):
+    """Replace the stored pitch track of an analysis (or just drop it if ``track`` is None)."""
+    PitchTrack.query.filter_by(analysis_id=analysis_id).delete(synchronize_session=False)
+    if track is not None and len(track['f0']):
+        db.session.add(PitchTrack(analysis_id=analysis_id, frames=len(track['f0']), data=pack_track(track)))
+
+def load_track(analysis_id):
+    """The stored pitch track of an analysis (see unpack_track), or None."""
+    data = db.session.query(PitchTrack.data).filter_by(analysis_id=analysis_id).scalar()
+    return unpack_track(data) if data is not None else None
+
+class RowNoteSet:
+    """Notes of an analysis stored one Note row per note.
+
+    Notes are read with Core SELECTs of the columns Note.to_dict() uses
+    and turned straight into dicts: building Note objects costs several
+    times more than the rows themselves and nothing here needs them.
+    """
+
+    def __init__(self, analysis_id):
+        self.analysis_id = analysis_id
+
+    def _select(self):
+        return select(Note.id, Note.note_name, Note.frequency, Note.start_time, Note.duration, Note.confidence)\
+            .where(Note.analysis_id == self.analysis_id)
+
+    @staticmethod
+    def _dicts(rows):
+        """Note dicts shaped like Note.to_dict() from _select() rows."""
+        return [{
+            'id': note_id,
+            'note': name,
+            'frequency': frequency,
+            'start_time': start_time,
+            'duration': duration,
+            'confidence': confidence
+        } for note_id, name, frequency, start_time, duration, confidence in rows]
+
+    def count(self):
+        return db.session.scalar(select(func.count(Note.id)).where(Note.analysis_id == self.analysis_id))
+
+    def all(self):
+        """All notes as dicts, ordered by start time."""
+        return self._dicts(db.session.execute(self._select().order_by(Note.start_time)))
+
+    def page(self, page, per_page):
+        """One page of notes ordered by start time.
+
+        Returns:
+            tuple: (list of note dicts, total number of notes)
+        """
+        page = max(page, 1)
+        per_page = per_page if per_page > 0 else 20
+        rows = db.session.execute(self._select().order_by(Note.start_time)
+                                  .limit(per_page).offset((page - 1) * per_page))
+        return self._dicts(rows), self.count()
+
+    def since(self, last_id, limit):
+        """Up to ``limit`` notes with IDs above ``last_id``, in ID order."""
+        return self._dicts(db.session.execute(
+            self._select().where(Note.id > last_id).order_by(Note.id).limit(limit)))
+
+    def columns(self, chunk_size=5000):
+        """All notes as NumPy arrays, shaped like unpack_notes, filled from the cursor a chunk at a time."""
+        count = self.count()
+        arrays = {name: np.empty(count) for name in ('start_time', 'duration', 'frequency', 'confidence')}
+        arrays['swara'] = np.empty(count, np.uint8)
+        index = {name: i for i, name in enumerate(SWARAS)}
+        result = db.session.execute(
+            select(Note.note_name, Note.start_time, Note.duration, Note.frequency, Note.confidence)
+            .where(Note.analysis_id == self.analysis_id)
+            .order_by(Note.start_time)
+            .execution_options(yield_per=chunk_size))
+        start = 0
+        for rows in result.partitions():
+            # Stop short if notes were added since counting; they are in the next export
+            rows = rows[:count - start]
+            span = slice(start, start + len(rows))
+            names, start_times, durations, frequencies, confidences = zip(*rows)
+            arrays['swara'][span] = [index.get(name, UNKNOWN_SWARA) for name in names]
+            arrays['start_time'][span] = start_times
+            arrays['duration'][span] = durations
+            arrays['frequency'][span] = frequencies
+            arrays['confidence'][span] = [np.nan if value is None else value for value in confidences]
+            start += len(rows)
+        return {name: values[:start] for name, values in arrays.items()}
+    
+    def chunks(self, size):
+        """All notes ordered by start time, as lists of up to ``size`` dicts.
+
+        Rows are streamed from the cursor ``size`` at a time as plain
+        tuples, so memory does not grow with the number of notes.
+        """
+        result = db.session.execute(
+            self._select().order_by(Note.start_time).execution_options(yield_per=size))
+        for rows in result.partitions():
+            yield self._dicts(rows)
+
+    def window(self, start, end, limit, lookback=None):
+        """Up to ``limit`` notes sounding between ``start`` and ``end`` seconds, by start time.
+
+        A note overlaps the window if it starts before ``end`` and ends
+        after ``start``; ``end`` None means up to the last note. Without
+        ``lookback`` (the longest note's duration, see
+        Analysis.max_note_duration) every note before the window has to be
+        checked; with it, the search on (analysis_id, start_time) starts at
+        ``start - lookback``.
+
+        Returns:
+            tuple: (list of note dicts, whether more than ``limit`` matched)
+        """
+        query = self._select().where(Note.start_time + Note.duration > start)
+        if lookback is not None:
+            query = query.where(Note.start_time >= start - lookback)
+        if end is not None:
+            query = query.where(Note.start_time < end)
+        rows = db.session.execute(query.order_by(Note.start_time).limit(limit + 1)).all()
+        return self._dicts(rows[:limit]), len(rows) > limit
+
+class PackedNoteSet:
+    """Notes of an analysis stored as a PackedNotes blob.
+
+    The blob is fetched and decoded on first access to the notes, so
+    counting them is free. Packed notes have no row IDs: a note's ID is its
+    1-based position in start time order.
+    """
+
+    def __init__(self, packed):
+        self.packed = packed
+        self._arrays = None
+
+    @property
+    def arrays(self):
+        """The decoded NumPy arrays (see unpack_notes)."""
+        if self._arrays is None:
+            self._arrays = unpack_notes(self.packed.data)
+        return self._arrays
+
+    def count(self):
+        return self.packed.count
+
+    def _dicts(self, index):
+        """Note dicts for a slice or an array of positions."""
+        arrays = self.arrays
+        names = [SWARAS[i] if i < len(SWARAS) else 'Unknown' for i in arrays['swara'][index]]
+        if isinstance(index, slice):
+            positions = range(*index.indices(self.packed.count))
+        else:
+            positions = index.tolist()
+        return [{
+            'id': note_id,
+            'note': name,
+            'frequency': frequency,
+            'start_time': start_time,
+            'duration': duration,
+            'confidence': confidence
+        } for note_id, name, frequency, start_time, duration, confidence in zip(
+            (position + 1 for position in positions),
+            names,
+            arrays['frequency'][index].tolist(),
+            arrays['start_time'][index].tolist(),
+            arrays['duration'][index].tolist(),
+            arrays['confidence'][index].tolist()
+        )]
+
+    def all(self):
+        return self._dicts(slice(None))
+
+    def page(self, page, per_page):
+        start = (max(page, 1) - 1) * per_page
+        return self._dicts(slice(start, start + per_page)), self.packed.count
+
+    def since(self, last_id, limit):
+        return self._dicts(slice(last_id, last_id + limit))
+
+    def columns(self, chunk_size=None):
+        return self.arrays
+    
+    def chunks(self, size):
+        for start in range(0, self.packed.count, size):
+            yield self._dicts(slice(start, start + size))
+
+    def window(self, start, end, limit, lookback=None):
+        """Like RowNoteSet.window, with binary searches in the decoded start times.
+
+        ``lookback`` is ignored: the longest duration is taken from the
+        decoded (millisecond-rounded) durations themselves.
+        """
+        arrays = self.arrays
+        starts = arrays['start_time']
+        lookback = float(arrays['duration'].max()) if len(starts) else 0.0
+        first = np.searchsorted(starts, start - lookback, 'left')
+        stop = len(starts) if end is None else np.searchsorted(starts, end, 'left')
+        index = first + np.flatnonzero(starts[first:stop] + arrays['duration'][first:stop] > start)
+        return self._dicts(index[:limit]), len(index) > limit
+
+def load_notes(analysis_id):
+    """Return the notes of an analysis, whichever way they are stored.
+
+    Both kinds of note set offer count(), all(), page(page, per_page),
+    since(last_id, limit), window(start, end, limit, lookback) and
+    chunks(size), returning dicts shaped like Note.to_dict(), and
+    columns() returning NumPy arrays shaped like unpack_notes().
+    """
+    packed = db.session.get(PackedNotes, analysis_id)
+    if packed is not None:
+        return PackedNoteSet(packed)
+    return RowNoteSet(analysis_id)
+
+def save_notes(analysis_id, notes, storage='rows', batch_size=5000):
+    """Replace the stored notes of an analysis, in the current transaction.
+
+    Args:
+        analysis_id: Analysis the notes belong to
+        notes: Note dicts from track_to_notes
+        storage: 'rows' for one Note row per note, 'packed' for a single blob
+        batch_size: Rows per executemany for row storage
+
+    Returns:
+        int: Number of notes stored
+    """
+    # Notes from an earlier (interrupted or degraded) run, in either format
+    Note.query.filter_by(analysis_id=analysis_id).delete()
+    PackedNotes.query.filter_by(analysis_id=analysis_id).delete()
+
+    # The longest note, so time window queries know how far back to look
+    db.session.execute(Analysis.__table__.update().where(Analysis.id == analysis_id).values(
+        max_note_duration=max((note['duration'] for note in notes), default=None)))
+
+    if storage == 'packed':
+        db.session.add(PackedNotes(analysis_id=analysis_id, count=len(notes), data=pack_notes(notes)))
+        return len(notes)
+    return Note.bulk_insert(analysis_id, notes, batch_size)
@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context, request, session
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import selectinload
+from .models import db, Analysis
+
+# Tag of everything built from public analyses; moved on whenever one is
+# added, changed or removed
+PUBLIC_ANALYSES = 'public_analyses'
+
+# Analysis columns listings don't depend on. Updates touching only these,
+# like the progress reports of a running job, leave cached entries alone;
+# listings may show such values up to PAGE_CACHE_TIMEOUT seconds old.
+UNLISTED_COLUMNS = frozenset({'stage', 'progress', 'updated_at', 'estimated_cost', 'max_note_duration',
+                              'audio_path', 'started_at', 'error_message', 'worker_id',
+                              'lease_renewed_at'})
+
+class CacheBackend:
+    """Storage of the page cache: JSON-serializable values under string keys.
+
+    Backends may drop entries at any time; a missing entry is rebuilt.
+    """
+
+    name = None
+
+    def get(self, key):
+        """The value stored under ``key``, or None if there is none or it expired."""
+        raise NotImplementedError
+
+    def set(self, key, value, timeout):
+        """Store a value for ``timeout`` seconds (None: until evicted)."""
+        raise NotImplementedError
+
+class NullCacheBackend(CacheBackend):
+    """Caches nothing."""
+
+    name = 'none'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """LRU of live objects in this process.
+
+    The fastest backend, but every worker process fills its own and only
+    sees invalidations made in that process; changes written elsewhere
+    (the pipeline in another process, other workers) show once entries
+    time out.
+    """
+
+    name = 'memory'
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+class FileCacheBackend(CacheBackend):
+    """One JSON file per entry in a folder shared by the workers of a host.
+
+    Files are replaced atomically. Expired files are removed when read and
+    every PRUNE_INTERVAL writes, when the oldest go too beyond ``size``.
+    """
+
+    name = 'filesystem'
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, folder, size):
+        self.folder = folder
+        self.size = size
+        self.writes = 0
+
+    def _path(self, key):
+        return os.path.join(self.folder, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                expires, value = json.load(f)
+        except FileNotFoundError:
+            return None
+        if expires is not None and expires <= time.time():
+            self._remove(path)
+            return None
+        return value
+
+    def set(self, key, value, timeout):
+        os.makedirs(self.folder, exist_ok=True)
+        expires = None if timeout is None else time.time() + timeout
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump([expires, value], f, separators=(',', ':'))
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+        self.writes += 1
+        if self.writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries, then the least recently written beyond ``size``."""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    expires = json.load(f)[0]
+                modified = entry.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            if expires is not None and expires <= now:
+                self._remove(entry.path)
+            else:
+                entries.append((modified, entry.path))
+        entries.sort()
+        for modified, path in entries[:max(0, len(entries) - self.size)]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class SqliteCacheBackend(CacheBackend):
+    """A table in its own SQLite file, shared by the workers of a host.
+
+    Kept apart from the application database so cache writes never wait
+    for (or hold up) the application's writers.
+    """
+
+    name = 'sqlite'
+    PRUNE_INTERVAL = 100
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS page_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)'
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.writes = 0
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(self.SCHEMA)
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute('SELECT value, expires FROM page_cache WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, timeout):
+        conn = self._connection()
+        expires = None if timeout is None else time.time() + timeout
+        conn.execute('INSERT OR REPLACE INTO page_cache (key, value, expires) VALUES (?, ?, ?)',
+                     (key, json.dumps(value, separators=(',', ':')), expires))
+        self.writes += 1
+        if self.writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries, then those expiring soonest beyond ``size``."""
+        conn = self._connection()
+        conn.execute('DELETE FROM page_cache WHERE expires <= ?', (time.time(),))
+        conn.execute('DELETE FROM page_cache WHERE key IN (SELECT key FROM page_cache '
+                     'ORDER BY expires IS NOT NULL, expires LIMIT max(0, (SELECT count(*) FROM page_cache) - ?))',
+                     (self.size,))
+
+CACHE_BACKENDS = {
+    'none': lambda config: NullCacheBackend(),
+    'memory': lambda config: MemoryCacheBackend(config['PAGE_CACHE_SIZE']),
+    'filesystem': lambda config: FileCacheBackend(config['PAGE_CACHE_FOLDER'], config['PAGE_CACHE_SIZE']),
+    'sqlite': lambda config: SqliteCacheBackend(config['PAGE_CACHE_DATABASE'], config['PAGE_CACHE_SIZE']),
+}
+
+class PageCache:
+    """Rendered pages and query results, with hit counts per region.
+
+    Entries are tagged with what they were built from. A tag's current
+    version is part of the key of every entry carrying it, so invalidating
+    a tag is a single write that every process sharing the backend sees;
+    the orphaned entries age out on their own. Backend failures are logged
+    and treated as misses.
+    """
+
+    def __init__(self, backend, timeout):
+        self.backend = backend
+        self.timeout = timeout
+        self.counts = {}  # Region: [hits, misses], since this process started
+        self.lock = threading.Lock()
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            current_app.logger.warning(f'Page cache {self.backend.name} {method} failed: {e}')
+            return None
+
+    def _version(self, tag):
+        version = self._call('get', 'tag:' + tag)
+        if version is None:
+            version = uuid.uuid4().hex
+            self._call('set', 'tag:' + tag, version, None)
+        return version
+
+    def invalidate(self, *tags):
+        """Make every entry carrying one of ``tags`` unreachable."""
+        for tag in tags:
+            self._call('set', 'tag:' + tag, uuid.uuid4().hex, None)
+
+    def get_or_build(self, region, key, build, tags=()):
+        """The cached value for ``key`` in ``region``, or build() stored for PAGE_CACHE_TIMEOUT seconds.
+
+        Values must be JSON-serializable (shared backends store them as
+        JSON, so tuples come back as lists) and never None. Tag versions
+        are read before building, so a value built from data an
+        invalidation has since replaced is stored where nobody looks.
+        """
+        full_key = ':'.join([region, *(self._version(tag) for tag in tags), key])
+        value = self._call('get', full_key)
+        with self.lock:
+            self.counts.setdefault(region, [0, 0])[value is None] += 1
+        if value is None:
+            value = build()
+            self._call('set', full_key, value, self.timeout)
+        return value
+
+    def stats(self):
+        """Hits, misses and hit ratio of each region in this process."""
+        with self.lock:
+            return {region: {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 4)
+            } for region, (hits, misses) in self.counts.items()}
+
+def get_page_cache(app=None):
+    """Return the app's page cache, on the backend chosen by PAGE_CACHE_BACKEND."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('page_cache')
+    if cache is None:
+        backend = CACHE_BACKENDS[app.config['PAGE_CACHE_BACKEND']](app.config)
+        cache = PageCache(backend, app.config['PAGE_CACHE_TIMEOUT'])
+        app.extensions['page_cache'] = cache
+    return cache
+
+def cached_page(region, render, tags=(PUBLIC_ANALYSES,)):
+    """Render a page, reusing the HTML anonymous visitors were shown.
+
+    Signed-in users see their own name and links, so they always get a
+    fresh render, as do visitors with flashed messages waiting. Pages are
+    keyed by path and query string.
+    """
+    if current_user.is_authenticated or session.get('_flashes'):
+        return render()
+    return get_page_cache().get_or_build(region, request.full_path, render, tags)
+
+def cached_analyses(region, key, query):
+    """The analyses a listing query returns, with their authors; the IDs are cached.
+
+    On a hit the analyses are loaded by primary key in one query (the
+    authors in a second), instead of running the listing's query.
+
+    Args:
+        query: Callable returning (analyses, extra), where ``extra`` is
+            cached with the IDs, like a page's cursors
+
+    Returns:
+        tuple: (analyses, extra)
+    """
+    built = {}
+
+    def build():
+        built['analyses'], extra = query()
+        return {'ids': [analysis.id for analysis in built['analyses']], 'extra': extra}
+
+    listing = get_page_cache().get_or_build(region, key, build, (PUBLIC_ANALYSES,))
+    if 'analyses' in built:
+        return built['analyses'], listing['extra']
+    if not listing['ids']:
+        return [], listing['extra']
+    found = {analysis.id: analysis for analysis in Analysis.query.options(selectinload(Analysis.author))
+             .filter(Analysis.id.in_(listing['ids']))}
+    return [found[id] for id in listing['ids'] if id in found], listing['extra']
+
+def _mark(session, *tags):
+    session.info.setdefault('page_cache_tags', set()).update(tags)
+
+def _listed_change(analysis):
+    """Whether a flushed change to an analysis can show in public listings."""
+    state = inspect(analysis)
+    public = state.attrs.is_public.history
+    if not (analysis.is_public or True in public.deleted):
+        return False
+    return any(state.attrs[attr.key].history.has_changes()
+               for attr in state.mapper.column_attrs if attr.key not in UNLISTED_COLUMNS)
+
+def _after_flush(session, flush_context):
+    for analysis in session.new:
+        if isinstance(analysis, Analysis) and analysis.is_public:
+            _mark(session, PUBLIC_ANALYSES)
+    for analysis in session.deleted:
+        if isinstance(analysis, Analysis) and analysis.is_public:
+            _mark(session, PUBLIC_ANALYSES)
+    for analysis in session.dirty:
+        if isinstance(analysis, Analysis) and _listed_change(analysis):
+            _mark(session, PUBLIC_ANALYSES)
+
+def _on_execute(orm_execute_state):
+    # Bulk UPDATE and DELETE statements bypass the flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    statement = orm_execute_state.statement
+    if getattr(statement.table, 'name', None) != Analysis.__tablename__:
+        return
+    if orm_execute_state.is_update:
+        columns = set(statement.compile().params) & set(Analysis.__table__.columns.keys())
+        if columns and columns <= UNLISTED_COLUMNS:
+            return
+    _mark(orm_execute_state.session, PUBLIC_ANALYSES)
+
+def _after_commit(session):
+    tags = session.info.pop('page_cache_tags', None)
+    if tags and has_app_context():
+        get_page_cache().invalidate(*tags)
+
+def _after_rollback(session):
+    session.info.pop('page_cache_tags', None)
+
+def init_page_cache(app):
+    """Invalidate cached pages and listings when a transaction changing public analyses commits."""
+    for name, listener in (('after_flush', _after_flush), ('do_orm_execute', _on_execute),
+                           ('after_commit', _after_commit), ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
@@ -0,0 +1,134 @@
+import json
+import time
+import base64
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import tuple_
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by encode_cursor."""
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    raise TypeError(value)
+
+def encode_cursor(direction, key):
+    """Opaque cursor for the page after ('next') or before ('prev') the row with this sort key."""
+    data = json.dumps([direction] + [_encode_value(value) for value in key], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, size=2):
+    """Return (direction, key) from a cursor for a sort key of ``size`` columns."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, key = data[0], tuple(_decode_value(value) for value in data[1:])
+        if direction not in ('next', 'prev') or len(key) != size:
+            raise ValueError(data)
+        return direction, key
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from e
+
+class KeysetPage:
+    """One page of a keyset-paginated listing."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total  # Only counted on request
+
+def keyset_paginate(query, key_columns, per_page, cursor=None, count=False):
+    """Paginate a query in descending key order without OFFSET.
+
+    Listings are keyed on (created_at, id), newest first; search results on
+    (relevance, id). The page is selected with a row-value comparison
+    against the cursor's key, so with an index ending in the key columns
+    every page costs the same as the first. Items are whatever ``query``
+    returns; the key columns may belong to another entity (favorites are
+    listed by when they were added).
+
+    Args:
+        query: Listing query, without ORDER BY
+        key_columns: Sort key columns, the last one unique
+        per_page: Page size
+        cursor: A next/prev cursor from an earlier page, or None for the first page
+        count: Also return the total number of rows (cached, see cached_count)
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        InvalidCursor: If the cursor cannot be decoded
+    """
+    size = len(key_columns)
+    key = tuple_(*key_columns)
+    keyed = query.add_columns(*key_columns)
+    direction = 'next'
+    if cursor:
+        direction, values = decode_cursor(cursor, size)
+        if direction == 'next':
+            keyed = keyed.filter(key < tuple_(*values))
+        else:
+            keyed = keyed.filter(key > tuple_(*values))
+
+    # One row more than needed tells whether there is a further page
+    if direction == 'next':
+        keyed = keyed.order_by(*[column.desc() for column in key_columns])
+    else:
+        keyed = keyed.order_by(*[column.asc() for column in key_columns])
+    rows = keyed.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        if more or direction == 'prev':
+            next_cursor = encode_cursor('next', tuple(last[-size:]))
+        if (more and direction == 'prev') or (cursor and direction == 'next'):
+            prev_cursor = encode_cursor('prev', tuple(first[-size:]))
+
+    return KeysetPage([row[0] for row in rows], next_cursor, prev_cursor,
+                      cached_count(query) if count else None)
+
+_count_lock = threading.Lock()
+
+def cached_count(query):
+    """Count a query's rows, reusing the result for PAGINATION_COUNT_TTL seconds.
+
+    Counts are keyed by the query's SQL and parameters and kept in an LRU of
+    PAGINATION_COUNT_CACHE_SIZE entries per process; they may lag behind
+    inserts and deletes by up to the TTL.
+    """
+    config = current_app.config
+    compiled = query.statement.compile()
+    key = (str(compiled), tuple(sorted((name, repr(value)) for name, value in compiled.params.items())))
+
+    cache = current_app.extensions.setdefault('count_cache', OrderedDict())
+    now = time.monotonic()
+    with _count_lock:
+        entry = cache.get(key)
+        if entry is not None and entry[0] > now:
+            cache.move_to_end(key)
+            return entry[1]
+
+    total = query.order_by(None).count()
+
+    with _count_lock:
+        cache[key] = (now + config['PAGINATION_COUNT_TTL'], total)
+        cache.move_to_end(key)
+        while len(cache) > config['PAGINATION_COUNT_CACHE_SIZE']:
+            cache.popitem(last=False)
+    return total
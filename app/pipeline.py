@@ -0,0 +1,234 @@
+import os
+import time
+import uuid
+import queue
+import socket
+import threading
+from contextlib import nullcontext
+from flask import current_app
+
+# Sentinel that tells a stage worker to exit
+_STOP = object()
+
+class Stage:
+    """A pipeline stage: a function run by a fixed pool of worker threads.
+
+    ``func`` takes the item handed over by the previous stage and returns the
+    item for the next one; returning None drops the item (e.g. a failed or
+    cancelled job). CPU-heavy stages are expected to push the work into a child
+    process (see app.jobs.run_in_child) so their threads only supervise.
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+class StagePipeline:
+    """Run items through a sequence of stages connected by bounded queues.
+
+    Each stage has its own worker pool, so while one job is being
+    pitch-tracked the I/O workers are already downloading the next ones. The
+    queues between stages are bounded: when a downstream stage falls behind,
+    upstream workers block on the hand-off instead of piling up downloads.
+    Submission itself never blocks.
+    """
+
+    def __init__(self, stages, queue_size=2, context_factory=None, on_error=None):
+        self.stages = stages
+        self.context_factory = context_factory or nullcontext
+        self.on_error = on_error
+        self.queues = [queue.Queue()] + [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+        self.busy = {stage.name: 0 for stage in stages}
+        self.completed = 0
+        self._pending = 0
+        self._lock = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads of every stage."""
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,),
+                                          name=f'pipeline-{stage.name}-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def submit(self, item):
+        """Queue an item at the first stage."""
+        with self._lock:
+            self._pending += 1
+        self.queues[0].put(item)
+
+    @property
+    def idle(self):
+        """True when no submitted item is waiting or being processed."""
+        return self._pending == 0
+
+    def join(self, timeout=None):
+        """Block until every submitted item has left the pipeline."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._pending == 0, timeout)
+
+    def shutdown(self):
+        """Stop the workers once the items already queued have been processed."""
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self.queues[index].put(_STOP)
+            for thread in self._threads:
+                if thread.name.startswith(f'pipeline-{stage.name}-'):
+                    thread.join()
+
+    def stats(self):
+        """Return queue depths and busy workers per stage."""
+        return {
+            'completed': self.completed,
+            'pending': self._pending,
+            'stages': [{
+                'name': stage.name,
+                'workers': stage.workers,
+                'busy': self.busy[stage.name],
+                'queued': self.queues[index].qsize()
+            } for index, stage in enumerate(self.stages)]
+        }
+
+    def _done(self, finished):
+        with self._lock:
+            self._pending -= 1
+            if finished:
+                self.completed += 1
+            self._lock.notify_all()
+
+    def _work(self, index):
+        stage = self.stages[index]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+
+            with self._lock:
+                self.busy[stage.name] += 1
+            try:
+                with self.context_factory():
+                    result = stage.func(item)
+            except Exception as e:
+                result = None
+                if self.on_error:
+                    self.on_error(stage, item, e)
+            finally:
+                with self._lock:
+                    self.busy[stage.name] -= 1
+
+            if result is None:
+                self._done(finished=False)
+            elif outbox is None:
+                self._done(finished=True)
+            else:
+                # Blocks while the next stage is saturated (backpressure)
+                outbox.put(result)
+
+_pipeline_lock = threading.Lock()
+
+def _upgrade_when_idle(app, pipeline, interval):
+    """Redo analyses that were degraded under load whenever the pipeline is idle.
+
+    Only one upgrade is submitted at a time, and only while nothing else is
+    queued, so upgrades never delay new submissions for long. An analysis is
+    tried once per process; failures are not retried.
+    """
+    from .tasks import AnalysisJob, find_upgradable_analysis
+    profile = app.config['DEFAULT_PROFILE']
+    attempted = set()
+
+    while True:
+        time.sleep(interval)
+        if not pipeline.idle:
+            continue
+
+        try:
+            with app.app_context():
+                analysis_id = find_upgradable_analysis(profile, exclude=attempted)
+        except Exception as e:
+            app.logger.error(f'Could not look for analyses to upgrade: {e}')
+            continue
+
+        if analysis_id is not None:
+            attempted.add(analysis_id)
+            app.logger.info(f'Upgrading analysis {analysis_id} to the {profile} profile')
+            pipeline.submit(AnalysisJob(analysis_id, profile=profile))
+
+def _renew_leases(app, worker_id, interval):
+    """Keep the leases on this process' unfinished jobs from lapsing while it is alive."""
+    from .database import write
+    from .tasks import renew_leases
+
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                write(renew_leases, worker_id)
+        except Exception as e:
+            app.logger.error(f'Could not renew job leases: {e}')
+
+def pipeline_worker_id(app=None):
+    """Return the ID this process' pipeline holds job leases under."""
+    app = app or current_app._get_current_object()
+    worker_id = app.extensions.get('analysis_worker_id')
+    if worker_id is None:
+        # Made on first use rather than import, so forked workers differ
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        app.extensions['analysis_worker_id'] = worker_id
+    return worker_id
+
+def get_analysis_pipeline(app=None):
+    """Return the analysis pipeline of this process, starting it on first use."""
+    app = app or current_app._get_current_object()
+    pipeline = app.extensions.get('analysis_pipeline')
+    if pipeline is None:
+        with _pipeline_lock:
+            pipeline = app.extensions.get('analysis_pipeline')
+            if pipeline is None:
+                from .tasks import build_analysis_stages
+                pipeline = StagePipeline(
+                    build_analysis_stages(app.config),
+                    queue_size=app.config['PIPELINE_QUEUE_SIZE'],
+                    context_factory=app.app_context,
+                    on_error=lambda stage, job, e: app.logger.error(
+                        f'Pipeline stage {stage.name} crashed: {e}', exc_info=True)
+                ).start()
+                app.extensions['analysis_pipeline'] = pipeline
+
+                # Pick up jobs a crashed or redeployed worker left behind, and
+                # keep other processes from doing so with the jobs held here
+                if app.config['PIPELINE_RECOVER_AFTER']:
+                    from .database import write
+                    from .tasks import AnalysisJob, claim_interrupted_analyses
+                    worker_id = pipeline_worker_id(app)
+                    with app.app_context():
+                        for analysis_id in write(claim_interrupted_analyses,
+                                                 app.config['PIPELINE_RECOVER_AFTER'], worker_id):
+                            app.logger.info(f'Requeueing interrupted analysis {analysis_id}')
+                            pipeline.submit(AnalysisJob(analysis_id))
+                    threading.Thread(target=_renew_leases,
+                                     args=(app, worker_id, app.config['PIPELINE_LEASE_INTERVAL']),
+                                     name='pipeline-leases', daemon=True).start()
+
+                # Redo results that were degraded under load once things are quiet
+                if app.config['QUALITY_UPGRADE_INTERVAL']:
+                    threading.Thread(target=_upgrade_when_idle,
+                                     args=(app, pipeline, app.config['QUALITY_UPGRADE_INTERVAL']),
+                                     name='pipeline-upgrader', daemon=True).start()
+    return pipeline
+
+def enqueue_analysis(analysis_id):
+    """Hand an analysis to the background pipeline, taking the lease on it."""
+    from .database import write
+    from .tasks import AnalysisJob, claim_analyses
+    pipeline = get_analysis_pipeline()
+    if current_app.config['PIPELINE_RECOVER_AFTER']:
+        write(claim_analyses, [analysis_id], pipeline_worker_id())
+    pipeline.submit(AnalysisJob(analysis_id))
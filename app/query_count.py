@@ -0,0 +1,56 @@
+import threading
+from flask import g, has_request_context
+from sqlalchemy import event
+
+class QueryCounter:
+    """Record the SQL statements an engine runs while the counter is active.
+
+    Only statements from the thread that entered the counter are recorded,
+    so background writers and workers don't skew the numbers:
+
+        with QueryCounter(db.engine) as queries:
+            client.get('/api/analyses?per_page=50')
+        assert queries.count == 3
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self._thread = None
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        self._thread = threading.get_ident()
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+def init_query_count(app, engine):
+    """Report how many statements each request ran, if QUERY_COUNT_HEADER is on.
+
+    The count goes into the X-Query-Count response header and the debug
+    log. Streamed responses only count the queries run before streaming.
+    """
+    if not app.config['QUERY_COUNT_HEADER']:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+    @app.after_request
+    def add_query_count(response):
+        count = g.get('query_count', 0)
+        response.headers['X-Query-Count'] = str(count)
+        app.logger.debug(f'{count} queries for {response.status_code} response')
+        return response
@@ -0,0 +1,151 @@
+import os
+import time
+import shutil
+from datetime import datetime, timedelta
+from flask import current_app
+from .models import db, Analysis, Favorite
+from .stats import remove_analyses
+
+class CleanupReport:
+    """What a cleanup run deleted, and how fast."""
+
+    def __init__(self):
+        self.analyses = 0
+        self.rows = 0  # Analyses plus their notes, contour tiles, pitch tracks and favorites
+        self.batches = 0
+        self.files = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+        return self
+
+    def rate(self, amount):
+        return amount / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f'{self.analyses} analyses ({self.rows} rows, {self.batches} batches) and '
+                f'{self.files} files ({self.bytes} bytes) in {self.elapsed:.1f}s: '
+                f'{self.rate(self.rows):.0f} rows/s, {self.rate(self.bytes):.0f} bytes/s')
+
+def expired_analyses(days):
+    """Query the IDs of analyses past retention.
+
+    That is analyses created more than ``days`` ago that are private, not
+    favorited by anyone and not waiting for or being processed.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    favorited = db.session.query(Favorite.id).filter(Favorite.analysis_id == Analysis.id).exists()
+    return db.session.query(Analysis.id).filter(
+        Analysis.is_public == False,
+        Analysis.created_at < cutoff,
+        Analysis.status.notin_(Analysis.ACTIVE_STATUSES),
+        ~favorited
+    )
+
+def remove_path(path, report):
+    """Delete a file or directory tree, counting what it freed."""
+    try:
+        if os.path.isdir(path):
+            size = sum(os.path.getsize(os.path.join(dirpath, name))
+                       for dirpath, _, names in os.walk(path) for name in names)
+            shutil.rmtree(path)
+        else:
+            size = os.path.getsize(path)
+            os.remove(path)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        current_app.logger.warning(f'Could not remove {path}: {e}')
+        return
+    report.files += 1
+    report.bytes += size
+
+def delete_expired_analyses(days, batch_size, pause, report):
+    """Delete expired analyses and their files, ``batch_size`` at a time.
+
+    Each batch is its own short transaction, walking the IDs in order, and
+    the database is left alone for ``pause`` seconds between batches so
+    request handlers and workers never wait long for the write lock.
+    """
+    config = current_app.config
+    last_id = 0
+    while True:
+        ids = [row.id for row in expired_analyses(days)
+               .filter(Analysis.id > last_id).order_by(Analysis.id).limit(batch_size)]
+        if not ids:
+            break
+        uploads = [path for path, in db.session.query(Analysis.audio_path)
+                   .filter(Analysis.id.in_(ids), Analysis.audio_path.isnot(None))]
+        deleted = remove_analyses(ids)
+        db.session.commit()
+        report.batches += 1
+        report.analyses += deleted[Analysis.__tablename__]
+        report.rows += sum(deleted.values())
+
+        # Files go once the rows are gone, so a failed batch keeps them
+        for path in uploads:
+            remove_path(os.path.join(config['UPLOAD_FOLDER'], path), report)
+        for analysis_id in ids:
+            remove_path(os.path.join(config['CHECKPOINT_FOLDER'], str(analysis_id)), report)
+
+        last_id = ids[-1]
+        time.sleep(pause)
+
+def _entries(folder, older_than):
+    """Entries of a folder last modified before the timestamp ``older_than``."""
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return []
+    return [entry for entry in entries if entry.stat().st_mtime < older_than]
+
+def collect_orphaned_files(min_age, report):
+    """Delete files no analysis needs any more.
+
+    Only files untouched for ``min_age`` seconds are considered:
+    - uploads no analysis refers to (a failed submission, a deleted row)
+    - checkpoints of analyses that are gone or no longer pending, queued or processing
+    - job scratch directories in TEMP_FOLDER left behind by a crashed worker
+    """
+    config = current_app.config
+    older_than = time.time() - min_age
+    active = {row.id for row in
+              db.session.query(Analysis.id).filter(Analysis.status.in_(Analysis.ACTIVE_STATUSES))}
+
+    upload_folder = config['UPLOAD_FOLDER']
+    referenced = {os.path.normpath(os.path.join(upload_folder, path)) for path, in
+                  db.session.query(Analysis.audio_path).filter(Analysis.audio_path.isnot(None))}
+    extensions = config['ALLOWED_AUDIO_EXTENSIONS']
+    for dirpath, _, names in os.walk(upload_folder):
+        for name in names:
+            path = os.path.normpath(os.path.join(dirpath, name))
+            if (name.rsplit('.', 1)[-1].lower() in extensions and path not in referenced
+                    and os.path.getmtime(path) < older_than):
+                remove_path(path, report)
+
+    for entry in _entries(config['CHECKPOINT_FOLDER'], older_than):
+        if entry.is_dir() and entry.name.isdigit() and int(entry.name) not in active:
+            remove_path(entry.path, report)
+
+    # Scratch directories are named analysis-<id>-<random>
+    for entry in _entries(config['TEMP_FOLDER'], older_than):
+        parts = entry.name.split('-')
+        if entry.is_dir() and len(parts) == 3 and parts[0] == 'analysis' \
+                and not (parts[1].isdigit() and int(parts[1]) in active):
+            remove_path(entry.path, report)
+
+def run_cleanup(days=None):
+    """Apply the retention policy and collect orphaned files.
+
+    Returns:
+        CleanupReport
+    """
+    config = current_app.config
+    report = CleanupReport()
+    delete_expired_analyses(config['RETENTION_DAYS'] if days is None else days,
+                            config['CLEANUP_BATCH_SIZE'], config['CLEANUP_BATCH_PAUSE'], report)
+    collect_orphaned_files(config['ORPHAN_FILE_MIN_AGE'], report)
+    return report.finish()
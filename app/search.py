@@ -0,0 +1,154 @@
+import re
+from flask import current_app
+from sqlalchemy import func, literal_column, select, table, column, text
+from sqlalchemy.exc import OperationalError
+from .models import db, Analysis
+
+# Words of a search string; everything else is ignored
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+class SearchBackend:
+    """Search over analysis titles and descriptions.
+
+    Backends narrow a listing query down to the analyses matching a search
+    string and may provide a relevance score to order the results by.
+    """
+
+    name = None
+
+    def install(self):
+        """Create whatever the backend needs in the database; safe to call on every start."""
+
+    def search(self, query, terms):
+        """Restrict an Analysis query to matches for the search string ``terms``.
+
+        Returns:
+            tuple: (filtered query, score column to order by descending, or
+            None to keep the listing's own order)
+        """
+        raise NotImplementedError
+
+class LikeSearchBackend(SearchBackend):
+    """Substring match with ILIKE; works on any database but scans every analysis."""
+
+    name = 'like'
+
+    def search(self, query, terms):
+        pattern = f'%{terms}%'
+        return query.filter(Analysis.title.ilike(pattern) | Analysis.description.ilike(pattern)), None
+
+class Fts5SearchBackend(SearchBackend):
+    """SQLite FTS5 index over title and description.
+
+    The index is an external-content table over ``analyses``, kept in sync
+    by triggers on insert, delete and updates of the two indexed columns
+    (status and progress updates don't touch it). Every word of the search
+    string must match as a prefix; results are ranked by BM25 with title
+    matches weighted TITLE_WEIGHT times higher.
+    """
+
+    name = 'fts5'
+    TABLE = 'analyses_fts'
+    TITLE_WEIGHT = 5.0
+
+    SCHEMA = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+            title, description,
+            content='analyses', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON analyses BEGIN
+            INSERT INTO {TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON analyses BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update AFTER UPDATE OF title, description ON analyses BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+    ]
+
+    def __init__(self):
+        self.index = table(self.TABLE, column('rowid'))
+
+    def install(self):
+        with db.engine.begin() as conn:
+            # The triggers go away with the analyses table (db.drop_all()),
+            # the virtual table doesn't
+            synced = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"),
+                                  {'name': f'{self.TABLE}_insert'}).first() is not None
+            for statement in self.SCHEMA:
+                conn.execute(text(statement))
+            # Index analyses written while there was no index or no triggers
+            if not synced:
+                self.rebuild(conn)
+
+    def rebuild(self, conn):
+        """Reindex every analysis from the analyses table."""
+        conn.execute(text(f"INSERT INTO {self.TABLE}({self.TABLE}) VALUES ('rebuild')"))
+
+    @staticmethod
+    def match_expression(terms):
+        """Turn free text into an FTS5 query: every word, as a quoted prefix."""
+        return ' '.join('"{}"*'.format(word) for word in _WORD.findall(terms))
+
+    def search(self, query, terms):
+        expression = self.match_expression(terms)
+        if not expression:
+            return query, None
+
+        # bm25() is lower for better matches; negate it so the score sorts
+        # descending. The LIMIT keeps SQLite from flattening the subquery
+        # into the join, which would run the MATCH once per analysis.
+        index = literal_column(self.TABLE)
+        hits = select(
+            self.index.c.rowid.label('id'),
+            (-func.bm25(index, self.TITLE_WEIGHT, 1.0)).label('score')
+        ).where(index.op('MATCH')(expression)).limit(-1).subquery('search_hits')
+        return query.join(hits, hits.c.id == Analysis.id), hits.c.score
+
+SEARCH_BACKENDS = {
+    'fts5': Fts5SearchBackend,
+    'like': LikeSearchBackend,
+}
+
+def _fts5_available():
+    """Check whether the database is SQLite with the FTS5 extension available."""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)"))
+            conn.execute(text("DROP TABLE temp.fts5_probe"))
+        return True
+    except OperationalError:
+        return False
+
+def get_search_backend(app=None):
+    """Return the app's search backend, chosen by SEARCH_BACKEND.
+
+    'fts5' falls back to 'like' when the database can't provide it.
+    """
+    app = app or current_app._get_current_object()
+    backend = app.extensions.get('search_backend')
+    if backend is None:
+        name = app.config['SEARCH_BACKEND']
+        if name == 'fts5':
+            with app.app_context():
+                if not _fts5_available():
+                    app.logger.warning('FTS5 is not available, falling back to LIKE search')
+                    name = 'like'
+        backend = SEARCH_BACKENDS[name]()
+        app.extensions['search_backend'] = backend
+    return backend
+
+def search_analyses(query, terms):
+    """Restrict an Analysis query to a search, with the configured backend.
+
+    Returns:
+        tuple: (filtered query, relevance score column or None), see SearchBackend.search
+    """
+    return get_search_backend().search(query, terms)
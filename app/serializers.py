@@ -0,0 +1,185 @@
+import json
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from .models import db, Analysis
+
+try:
+    import orjson
+except ImportError:  # JSON is encoded with the standard library instead
+    orjson = None
+
+if orjson is not None:
+    # Sorted keys like the default provider; datetimes and dataclasses go
+    # through its hook, so they come out the same too. NumPy scalars (from
+    # the pitch and note code) are floats to the standard library but not
+    # to orjson without OPT_SERIALIZE_NUMPY
+    _ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                       | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+def dumps(value):
+    """Encode a value as jsonify does outside debug mode (compact, keys sorted), to bytes.
+
+    Uses orjson when it is installed, which writes NaN and infinity as
+    null (the standard library writes them as invalid JSON).
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=DefaultJSONProvider.default, option=_ORJSON_OPTIONS)
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, encoding and decoding with orjson.
+
+    Writes the same JSON as the default provider, always compact and with
+    non-ASCII text as UTF-8 instead of escaped. Calls with options orjson
+    can't honour (``indent``, ``cls``...) fall back to the standard library.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if not set(kwargs) <= {'sort_keys'}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS) + b'\n',
+                                        mimetype=self.mimetype)
+
+class FragmentCache:
+    """Per-process LRU of serialized objects, bounded by their total size.
+
+    Entries are keyed on the object ((table, id), or (table, parent id, id))
+    and hold the version they were serialized at, so an object that changed
+    since, in this process or any other, misses and is serialized anew.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (version, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self.size -= len(self.entries.popitem(last=False)[1][1])
+
+    def evict(self, keys):
+        with self.lock:
+            for key in keys:
+                entry = self.entries.pop(key, None)
+                if entry is not None:
+                    self.size -= len(entry[1])
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'entries': len(self.entries),
+                'bytes': self.size
+            }
+
+def get_fragment_cache(app=None):
+    """Return the app's serializer cache, holding up to SERIALIZER_CACHE_BYTES of JSON."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('fragment_cache')
+    if cache is None:
+        cache = FragmentCache(app.config['SERIALIZER_CACHE_BYTES'])
+        app.extensions['fragment_cache'] = cache
+    return cache
+
+def serialized(key, version, build):
+    """The JSON bytes of build(), cached for ``key`` while ``version`` stays the same."""
+    cache = get_fragment_cache()
+    data = cache.get(key, version)
+    if data is None:
+        data = dumps(build())
+        cache.put(key, version, data)
+    return data
+
+def analysis_json(analysis, favorited=None):
+    """Analysis.to_dict() as JSON bytes, cached on (id, updated_at).
+
+    updated_at is bumped by every write to the row, ORM or Core. The
+    author's username is embedded too, so it is part of the version.
+    """
+    data = serialized(('analyses', analysis.id), (analysis.updated_at, analysis.author.username),
+                      analysis.to_dict)
+    if favorited is None:
+        return data
+    return data[:-1] + (b',"is_favorited":true}' if favorited else b',"is_favorited":false}')
+
+def notes_json(analysis, notes):
+    """Note dicts (shaped like Note.to_dict()) as JSON bytes each, cached on (analysis, id, updated_at).
+
+    Notes are only ever replaced all at once, which bumps the analysis'
+    updated_at; their IDs may be reused then.
+    """
+    return [serialized(('notes', analysis.id, note['id']), analysis.updated_at, lambda note=note: note)
+            for note in notes]
+
+def json_response(value, **fragments):
+    """A JSON response of ``value`` with already encoded members spliced in.
+
+    Args:
+        value: Dict of the members still to be encoded
+        fragments: Member name to JSON bytes, or to a list of them for an array
+    """
+    parts = [dumps(value)[1:-1]] if value else []
+    for name, data in fragments.items():
+        if isinstance(data, list):
+            data = b'[' + b','.join(data) + b']'
+        parts.append(dumps(name) + b':' + data)
+    return current_app.response_class(b'{' + b','.join(parts) + b'}', mimetype='application/json')
+
+def _after_flush(session, flush_context):
+    keys = session.info.setdefault('fragment_cache_keys', set())
+    keys.update(('analyses', analysis.id) for analysis in session.dirty | session.deleted
+                if isinstance(analysis, Analysis))
+
+def _after_commit(session):
+    keys = session.info.pop('fragment_cache_keys', None)
+    if keys and has_app_context():
+        get_fragment_cache().evict(keys)
+
+def _after_rollback(session):
+    session.info.pop('fragment_cache_keys', None)
+
+def init_serializer_cache(app):
+    """Free the cached JSON of analyses changed or deleted through the ORM once the change commits.
+
+    Entries of objects changed by bulk statements, or in another process,
+    are left to the version check and age out of the LRU.
+    """
+    for name, listener in (('after_flush', _after_flush), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
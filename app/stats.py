@@ -0,0 +1,156 @@
+from datetime import datetime
+from sqlalchemy import func, select, case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from .models import db, Analysis, Note, PackedNotes, ContourTile, PitchTrack, Favorite, UserStats
+
+# Maintained UserStats columns
+COUNTERS = ('analysis_count', 'note_count', 'analyzed_seconds', 'favorite_count')
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def compute_user_stats(user_id):
+    """Compute a user's counters from scratch (O(analyses); for reconciliation)."""
+    analysis_count, note_count, analyzed_seconds = db.session.query(
+        func.count(Analysis.id),
+        func.coalesce(func.sum(Analysis.note_count), 0),
+        func.coalesce(func.sum(case((Analysis.status == 'completed', Analysis.duration), else_=0.0)), 0.0)
+    ).filter(Analysis.user_id == user_id).one()
+    favorite_count = Favorite.query.filter_by(user_id=user_id).count()
+    return {
+        'analysis_count': analysis_count,
+        'note_count': note_count,
+        'analyzed_seconds': analyzed_seconds,
+        'favorite_count': favorite_count
+    }
+
+def adjust_user_stats(user_id, **deltas):
+    """Add ``deltas`` to a user's counters, in the current transaction.
+
+    Pending changes are flushed first. The counters are incremented in the
+    database (``SET x = x + delta``), so concurrent writers don't lose
+    updates. A user without a stats row yet gets one computed from the
+    source tables, which already include the flushed change; if another
+    writer created the row meanwhile, the deltas are added to it instead.
+    """
+    db.session.flush()
+    table = UserStats.__table__
+    values = {name: table.c[name] + delta for name, delta in deltas.items() if delta}
+    values['updated_at'] = datetime.utcnow()
+    result = db.session.execute(table.update().where(table.c.user_id == user_id).values(values))
+    if result.rowcount == 0:
+        row = dict(user_id=user_id, updated_at=datetime.utcnow(), **compute_user_stats(user_id))
+        _insert_or_increment(table, row, values)
+
+def _insert_or_increment(table, row, increments):
+    """INSERT ``row``, or apply ``increments`` if its user got a row first (ON CONFLICT DO UPDATE)."""
+    insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        db.session.execute(insert(table).values(row)
+                           .on_conflict_do_update(index_elements=[table.c.user_id], set_=increments))
+        return
+
+    # Other databases: insert in a savepoint and fall back to the update
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(row))
+    except IntegrityError:
+        db.session.execute(table.update().where(table.c.user_id == row['user_id']).values(increments))
+
+def get_user_stats(user_id):
+    """Return a user's counters as a dict.
+
+    Users without a stats row yet (one is created on their first counted
+    change) get them computed, so reading never writes.
+    """
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        return compute_user_stats(user_id)
+    return {name: getattr(stats, name) for name in COUNTERS}
+
+def record_notes_saved(analysis, note_count, completed):
+    """Update the counters for notes saved by the job writer.
+
+    Args:
+        analysis: Analysis whose notes were replaced
+        note_count: Number of notes now stored
+        completed: Whether the analysis just became completed (not an upgrade
+            of an already completed one)
+    """
+    delta = note_count - (analysis.note_count or 0)
+    analysis.note_count = note_count
+    adjust_user_stats(analysis.user_id, note_count=delta,
+                      analyzed_seconds=(analysis.duration or 0.0) if completed else 0.0)
+
+def remove_analysis(analysis):
+    """Delete an analysis with its notes, contour tiles and favorites and update the counters.
+
+    Runs in the current transaction; the caller commits.
+    """
+    remove_analyses([analysis.id])
+
+def remove_analyses(analysis_ids):
+    """Delete a batch of analyses with their notes, contour tiles, pitch tracks and favorites and update the counters.
+
+    Set-based: a handful of statements however many analyses there are.
+    Runs in the current transaction; the caller commits.
+
+    Returns:
+        dict: Number of rows deleted per table
+    """
+    ids = list(analysis_ids)
+    completed_seconds = case((Analysis.status == 'completed', Analysis.duration), else_=0.0)
+    changes = {}
+    owners = db.session.query(
+        Analysis.user_id,
+        func.count(Analysis.id),
+        func.coalesce(func.sum(Analysis.note_count), 0),
+        func.coalesce(func.sum(completed_seconds), 0.0)
+    ).filter(Analysis.id.in_(ids)).group_by(Analysis.user_id)
+    for user_id, analysis_count, note_count, analyzed_seconds in owners:
+        changes[user_id] = {
+            'analysis_count': -analysis_count,
+            'note_count': -note_count,
+            'analyzed_seconds': -analyzed_seconds
+        }
+    favorited_by = db.session.query(Favorite.user_id, func.count(Favorite.id))\
+        .filter(Favorite.analysis_id.in_(ids)).group_by(Favorite.user_id)
+    for user_id, count in favorited_by:
+        changes.setdefault(user_id, {})['favorite_count'] = -count
+
+    # Children first, without syncing the session: their rows are rarely
+    # loaded and fetching every note ID back would double the cost
+    deleted = {}
+    for model in (Note, PackedNotes, ContourTile, PitchTrack, Favorite):
+        deleted[model.__tablename__] = model.query.filter(model.analysis_id.in_(ids))\
+            .delete(synchronize_session=False)
+    deleted[Analysis.__tablename__] = Analysis.query.filter(Analysis.id.in_(ids)).delete()
+    for user_id, deltas in changes.items():
+        adjust_user_stats(user_id, **deltas)
+    return deleted
+
+def reconcile_stats():
+    """Recompute every maintained counter from the source tables.
+
+    Returns:
+        int: Number of users whose stats were rewritten
+    """
+    # Per-analysis note counts, rows and packed alike. Only rows that are
+    # off are written, as every write bumps updated_at and with it the
+    # analysis' ETag and cached JSON
+    row_counts = select(func.count(Note.id)).where(Note.analysis_id == Analysis.id).scalar_subquery()
+    packed_counts = select(PackedNotes.count).where(PackedNotes.analysis_id == Analysis.id).scalar_subquery()
+    note_count = row_counts + func.coalesce(packed_counts, 0)
+    db.session.execute(Analysis.__table__.update()
+                       .where(Analysis.note_count.is_distinct_from(note_count))
+                       .values(note_count=note_count))
+
+    # Per-user counters, rebuilt from scratch
+    UserStats.query.delete()
+    user_ids = {user_id for user_id, in db.session.query(Analysis.user_id).distinct()}
+    user_ids |= {user_id for user_id, in db.session.query(Favorite.user_id).distinct()}
+    for user_id in user_ids:
+        db.session.add(UserStats(user_id=user_id, **compute_user_stats(user_id)))
+    db.session.commit()
+    return len(user_ids)
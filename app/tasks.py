@@ -1,145 +1,484 @@
 import os
+import glob
+import json
 import time
 import tempfile
 import shutil
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import partial
 from flask import current_app
-from .models import db, Analysis, Note
-from .audio_utils import analyze_audio_segment
+from sqlalchemy import update, func
+from sqlalchemy.orm.attributes import set_committed_value
+from .models import db, Analysis
+from .database import write
+from .audio_utils import pitch_track_segment, track_to_notes
+from .note_store import save_notes, save_track
+from .contour import contour_tiles, save_contour
+from .stats import record_notes_saved
+from .retention import run_cleanup
+from .jobs import JobCancelled, CancelCheck, run_subprocess, run_in_child, yt_dlp_command
+from .checkpoints import PitchCheckpoint
+from .admission import record_stage_timing
+from .pipeline import Stage
 
-def analyze_audio_task(analysis_id):
-    """Background task to analyze audio from a video URL."""
-    analysis = Analysis.query.get(analysis_id)
-    if not analysis:
-        current_app.logger.error(f'Analysis {analysis_id} not found')
+# Minimum change in progress fraction worth a database write
+PROGRESS_STEP = 0.01
+
+def report_progress(analysis, stage, progress=0.0):
+    """Record the current pipeline stage and progress fraction of a job.
+    
+    Updates within the same stage are throttled to PROGRESS_STEP so chatty
+    callbacks (download hooks, per-chunk pitch updates) do not turn into a
+    commit each.
+    """
+    progress = min(max(float(progress), 0.0), 1.0)
+    if (stage == analysis.stage and progress < 1.0 and
+            progress - (analysis.progress or 0.0) < PROGRESS_STEP):
         return
     
-    try:
-        # Update status to processing
-        analysis.status = 'processing'
-        analysis.started_at = datetime.utcnow()
-        db.session.commit()
-        
-        # Create a temporary directory for processing
-        temp_dir = tempfile.mkdtemp()
+    # Keep the caller's copy current for the throttling above; the row is
+    # updated by the writer without waiting for it
+    set_committed_value(analysis, 'stage', stage)
+    set_committed_value(analysis, 'progress', progress)
+    write(update_analysis, analysis.id, wait=False, stage=stage, progress=progress)
+
+def update_analysis(analysis_id, **values):
+    """Write: set columns of an analysis row (nothing if it was deleted)."""
+    db.session.execute(update(Analysis).where(Analysis.id == analysis_id).values(**values))
+
+def is_cancelled(analysis_id):
+    """Check whether an analysis was cancelled or deleted while queued or running."""
+    status = db.session.query(Analysis.status).filter(Analysis.id == analysis_id).scalar()
+    return status is None or status == 'cancelled'
+
+def mark_cancelled(analysis_id):
+    """Record the cancelled terminal status, unless the analysis was deleted."""
+    db.session.rollback()
+    write(update_analysis, analysis_id, status='cancelled', stage=None)
+
+def mark_failed(analysis_id, error):
+    """Record the failed terminal status with the error message."""
+    db.session.rollback()
+    write(update_analysis, analysis_id, status='failed', error_message=str(error))
+
+class AnalysisJob:
+    """State handed from stage to stage while one analysis is processed.
+    
+    A job created with a ``profile`` is a background upgrade: it redoes a
+    completed analysis that was degraded under load. Upgrades leave the
+    analysis' status and progress alone, replace its notes only when they
+    succeed and give up if the user changes the analysis meanwhile.
+    """
+    
+    def __init__(self, analysis_id, profile=None):
+        self.analysis_id = analysis_id
+        self.upgrade = profile is not None
+        self.temp_dir = None
+        self.checkpoint = None
+        self.resumed = False  # Continuing a run that was interrupted by a crash
+        self.profile = profile  # Name of the analysis profile
+        self.version = None  # updated_at of the result an upgrade replaces
+        self.settings = None  # Its entry in ANALYSIS_PROFILES
+        self.source_path = None  # Audio as downloaded
+        self.audio_path = None  # Mono WAV of just the requested segment
+        self.segment_duration = None
+        self.track = None  # Frame-level pitch track
+        self.notes = None
+        self.contour = None  # Pitch contour tiles built from the track
+    
+    def load(self):
+        """Load the Analysis row, treating a deleted analysis as cancelled."""
+        analysis = db.session.get(Analysis, self.analysis_id)
+        if analysis is None:
+            raise JobCancelled(f'Analysis {self.analysis_id} was deleted')
+        return analysis
+    
+    def is_cancelled(self):
+        """Check whether the job should stop."""
+        if not self.upgrade:
+            return is_cancelled(self.analysis_id)
         
-        try:
-            # Extract audio from video
-            audio_path = os.path.join(temp_dir, 'audio.wav')
-            
-            # Download and extract audio using yt-dlp
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': os.path.join(temp_dir, 'audio.%(ext)s'),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'wav',
-                    'preferredquality': '192',
-                }],
-                'noplaylist': True,
-                'quiet': True,
-                'no_warnings': True,
-            }
-            
-            import yt_dlp
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([analysis.video_url])
-            
-            # Check if audio file was created
-            if not os.path.exists(audio_path):
-                # Try to find the audio file with different extensions
-                for ext in ['wav', 'mp3', 'm4a', 'ogg']:
-                    test_path = os.path.join(temp_dir, f'audio.{ext}')
-                    if os.path.exists(test_path):
-                        audio_path = test_path
-                        break
-            
-            if not os.path.exists(audio_path):
-                raise Exception('Failed to extract audio from video')
-            
-            # Analyze the audio segment
-            notes = analyze_audio_segment(
-                audio_path=audio_path,
-                start_time=analysis.start_time,
-                end_time=analysis.end_time,
-                shruthi=analysis.shruthi
-            )
-            
-            # Save notes to database
-            for note_data in notes:
-                note = Note(
-                    analysis_id=analysis.id,
-                    note_name=note_data['note'],
-                    frequency=note_data['frequency'],
-                    start_time=note_data['start_time'],
-                    duration=note_data['duration'],
-                    confidence=note_data.get('confidence', 1.0)
-                )
-                db.session.add(note)
-            
-            # Update analysis status and completion time
-            analysis.status = 'completed'
-            analysis.completed_at = datetime.utcnow()
-            db.session.commit()
-            
-            # Send notification email if user has email notifications enabled
-            if analysis.user.email_notifications:
-                from .email import send_analysis_complete_notification
-                send_analysis_complete_notification(analysis.user, analysis)
-            
-        except Exception as e:
-            # Log the error and update status
-            current_app.logger.error(f'Error processing analysis {analysis_id}: {str(e)}', 
-                                   exc_info=True)
-            analysis.status = 'failed'
-            analysis.error_message = str(e)
-            db.session.commit()
-            
-            # Re-raise the exception to trigger task retry if needed
-            raise
-            
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir, ignore_errors=True)
+        # Edited, requeued or deleted since it completed
+        status = db.session.query(Analysis.status).filter(Analysis.id == self.analysis_id).scalar()
+        return status != 'completed'
+    
+    def check_cancelled(self):
+        """Raise JobCancelled if the job should stop; called between stages."""
+        if self.is_cancelled():
+            raise JobCancelled(f'Analysis {self.analysis_id} was cancelled')
+    
+    def should_cancel(self):
+        """Build the cancellation check polled while a stage's process runs."""
+        return CancelCheck(self.is_cancelled, current_app.config['CANCEL_CHECK_INTERVAL'])
+    
+    def report_progress(self, analysis, stage, progress=0.0):
+        """Record progress, except for upgrades which run unseen."""
+        if not self.upgrade:
+            report_progress(analysis, stage, progress)
+    
+    def cleanup(self, keep_checkpoint=False):
+        """Remove the job's temporary files and, unless asked not to, its checkpoint."""
+        if self.temp_dir and os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        self.temp_dir = None
+        if self.checkpoint and not keep_checkpoint:
+            self.checkpoint.discard()
+
+def profile_settings(profile, config):
+    """Return the settings of an analysis profile, falling back to the default one."""
+    profiles = config['ANALYSIS_PROFILES']
+    return profiles.get(profile) or profiles[config['DEFAULT_PROFILE']]
+
+def checkpoint_params(analysis, settings, config):
+    """Parameters a checkpoint is only valid for."""
+    return {
+        'video_url': analysis.video_url,
+        'start_time': analysis.start_time,
+        'end_time': analysis.end_time,
+        'backend': settings['backend'],
+        'sample_rate': settings['sample_rate'],
+        'hop_length': settings['hop_length'],
+        'frame_length': settings['frame_length'],
+        'chunk_seconds': config['PITCH_CHUNK_SECONDS']
+    }
+
+def fetch_metadata(job):
+    """Mark the analysis as processing and validate the segment against the video."""
+    analysis = job.load()
+    if not job.upgrade:
+        write(update_analysis, analysis.id, status='processing', started_at=datetime.utcnow())
+        job.profile = analysis.profile
+    else:
+        job.version = analysis.updated_at
+    job.report_progress(analysis, 'downloading', 0.0)
+    
+    job.segment_duration = analysis.end_time - analysis.start_time
+    job.settings = profile_settings(job.profile, current_app.config)
+    # Scratch space under TEMP_FOLDER, where cleanup finds what a crash left
+    os.makedirs(current_app.config['TEMP_FOLDER'], exist_ok=True)
+    job.temp_dir = tempfile.mkdtemp(prefix=f'analysis-{analysis.id}-', dir=current_app.config['TEMP_FOLDER'])
+    job.checkpoint = PitchCheckpoint.for_analysis(current_app.config['CHECKPOINT_FOLDER'],
+                                                  analysis.id)
+    job.resumed = job.checkpoint.begin(
+        checkpoint_params(analysis, job.settings, current_app.config))
+    
+    # The segment was validated and downloaded before the interruption
+    if job.resumed and job.checkpoint.has_segment:
+        current_app.logger.info(f'Resuming analysis {analysis.id} from checkpoint')
+        job.audio_path = job.checkpoint.segment_path
+        return
+    
+    output = []
+    run_subprocess(
+        yt_dlp_command('--dump-single-json', '--skip-download', '--no-playlist',
+                       '--quiet', '--no-warnings', analysis.video_url),
+        timeout=current_app.config['STAGE_TIMEOUTS'].get('metadata'),
+        should_cancel=job.should_cancel(),
+        on_line=output.append
+    )
+    info = json.loads('\n'.join(output) or '{}')
+    
+    duration = info.get('duration')
+    if duration and analysis.end_time > duration:
+        raise ValueError(f'Segment ends at {analysis.end_time}s but the video is only {duration}s long')
+
+def download_audio(job):
+    """Download the audio track of the analysis' video into the job's temp dir.
+    
+    yt-dlp runs as a subprocess so a hung extraction can be killed when it
+    exceeds the download timeout.
+    """
+    if job.audio_path:
+        return
+    
+    analysis = job.load()
+    
+    def on_line(line):
+        # Lines look like "PROGRESS <downloaded> <total> <estimate>", with NA for unknowns
+        parts = line.split()
+        if len(parts) != 4 or parts[0] != 'PROGRESS' or not parts[1].isdigit():
+            return
+        total = parts[2] if parts[2].isdigit() else parts[3].split('.')[0]
+        if total.isdigit() and int(total) > 0:
+            job.report_progress(analysis, 'downloading', int(parts[1]) / int(total))
+    
+    run_subprocess(
+        yt_dlp_command(
+            '--format', 'bestaudio/best',
+            '--output', os.path.join(job.temp_dir, 'source.%(ext)s'),
+            '--no-playlist', '--quiet', '--no-warnings',
+            '--progress', '--newline',
+            '--progress-template',
+            'download:PROGRESS %(progress.downloaded_bytes)s %(progress.total_bytes)s '
+            '%(progress.total_bytes_estimate)s',
+            analysis.video_url
+        ),
+        timeout=current_app.config['STAGE_TIMEOUTS'].get('download'),
+        should_cancel=job.should_cancel(),
+        on_line=on_line
+    )
+    
+    downloads = [path for path in glob.glob(os.path.join(job.temp_dir, 'source.*'))
+                 if not path.endswith('.part')]
+    if not downloads:
+        raise Exception('Failed to extract audio from video')
+    job.source_path = downloads[0]
+
+def transcode_audio(job):
+    """Cut the requested segment out of the download as mono WAV with ffmpeg."""
+    if job.audio_path:
+        return
+    
+    analysis = job.load()
+    job.report_progress(analysis, 'decoding', 0.0)
+    
+    segment_path = os.path.join(job.temp_dir, 'segment.wav')
+    run_subprocess(
+        ['ffmpeg', '-nostdin', '-y', '-loglevel', 'error',
+         '-ss', str(analysis.start_time), '-t', str(job.segment_duration),
+         '-i', job.source_path,
+         '-ac', '1', '-ar', str(job.settings['sample_rate']),
+         segment_path],
+        timeout=current_app.config['STAGE_TIMEOUTS'].get('transcode'),
+        should_cancel=job.should_cancel()
+    )
+    
+    # Keep the segment with the checkpoint so a resumed job skips the download
+    job.checkpoint.commit_segment(segment_path)
+    job.audio_path = job.checkpoint.segment_path
+    
+    # The compressed download is no longer needed
+    os.remove(job.source_path)
+    job.source_path = None
+
+def track_pitch_stage(job):
+    """Compute the pitch track in a child process that can be killed."""
+    analysis = job.load()
+    job.track = run_in_child(
+        pitch_track_segment,
+        kwargs={
+            'audio_path': job.audio_path,
+            'start_time': 0,
+            'end_time': job.segment_duration,
+            'backend': job.settings['backend'],
+            'sr': job.settings['sample_rate'],
+            'frame_length': job.settings['frame_length'],
+            'hop_length': job.settings['hop_length'],
+            'chunk_seconds': current_app.config['PITCH_CHUNK_SECONDS'],
+            'checkpoint': job.checkpoint
+        },
+        timeout=current_app.config['STAGE_TIMEOUTS'].get('pitch'),
+        should_cancel=job.should_cancel(),
+        on_progress=lambda stage, fraction: job.report_progress(analysis, stage, fraction)
+    )
+    current_app.logger.info(
+        f'Analysis {analysis.id} pitch tracked: {job.track.get("resumed_chunks", 0)} chunks '
+        f'resumed from checkpoint, {job.track.get("checkpoint_seconds", 0.0):.3f}s spent '
+        f'writing checkpoints')
+
+def map_notes(job):
+    """Map the pitch track to grouped Carnatic notes and its contour tiles."""
+    analysis = job.load()
+    job.report_progress(analysis, 'mapping', 0.0)
+    job.notes = track_to_notes(job.track, analysis.shruthi)
+    job.contour = contour_tiles(job.track, current_app.config['CONTOUR_TILE_SIZE'],
+                                current_app.config['CONFIDENCE_THRESHOLD'])
+
+def store_results(analysis_id, notes, contour, track, profile, upgrade, storage, batch_size, version=None):
+    """Write: replace an analysis' notes, contour tiles and pitch track and mark it completed.
+    
+    Notes, tiles, track (None to keep none) and status go in the same
+    transaction. Notes a crashed run managed to commit are replaced, so a
+    resumed job never duplicates them.
+    An upgrade only swaps the results and records the better profile, and
+    only if the analysis is still the completed one at ``version`` it
+    started from.
+    """
+    analysis = db.session.get(Analysis, analysis_id)
+    if analysis is None:
+        raise JobCancelled(f'Analysis {analysis_id} was deleted')
+    
+    # Edited or requeued while the upgrade ran: the result is stale. The
+    # conditional update also takes the write lock before anything changes
+    if upgrade:
+        result = db.session.execute(
+            update(Analysis)
+            .where(Analysis.id == analysis_id, Analysis.status == 'completed',
+                   Analysis.updated_at == version)
+            .values(profile=profile))
+        if result.rowcount == 0:
+            raise JobCancelled(f'Analysis {analysis_id} changed while it was being upgraded')
+    
+    count = save_notes(analysis_id, notes, storage, batch_size)
+    save_contour(analysis_id, contour)
+    save_track(analysis_id, track)
+    
+    if not upgrade:
+        analysis.status = 'completed'
+        analysis.stage = None
+        analysis.progress = 1.0
+        analysis.completed_at = datetime.utcnow()
+    record_notes_saved(analysis, count, completed=not upgrade)
+
+def save_results(job):
+    """Persist the detected notes and mark the analysis as completed."""
+    analysis = job.load()
+    job.report_progress(analysis, 'saving', 0.0)
+    track = job.track if current_app.config['STORE_PITCH_TRACKS'] else None
+    write(store_results, analysis.id, job.notes, job.contour, track, job.profile, job.upgrade,
+          current_app.config['NOTE_STORAGE'], current_app.config['NOTE_INSERT_BATCH_SIZE'],
+          version=job.version)
+    job.cleanup()
+    
+    if job.upgrade:
+        current_app.logger.info(f'Analysis {analysis.id} upgraded to the {job.profile} profile')
+        return
+    
+    # Send notification email if user has email notifications enabled
+    if getattr(analysis.author, 'email_notifications', False):
+        from .email import send_analysis_complete_notification
+        db.session.refresh(analysis)
+        send_analysis_complete_notification(analysis.author, analysis)
+
+# Stages of an analysis job: (name, function, config key of its worker count).
+# The first three are network/disk bound, pitch and notes are CPU bound and
+# saving is serialized through a single writer.
+ANALYSIS_STAGES = [
+    ('metadata', fetch_metadata, 'PIPELINE_IO_WORKERS'),
+    ('download', download_audio, 'PIPELINE_IO_WORKERS'),
+    ('transcode', transcode_audio, 'PIPELINE_IO_WORKERS'),
+    ('pitch', track_pitch_stage, 'PIPELINE_CPU_WORKERS'),
+    ('notes', map_notes, 'PIPELINE_CPU_WORKERS'),
+    ('save', save_results, None),
+]
+
+def run_stage(name, stage_func, job):
+    """Run one stage of an analysis job, handling cancellation and failure.
+    
+    The stage's wall-clock time is recorded to calibrate the cost model,
+    except for resumed jobs whose stages only did part of the work.
+    
+    Returns:
+        AnalysisJob: The job for the next stage, or None once the job has ended
+    """
+    try:
+        job.check_cancelled()
+        started = time.monotonic()
+        stage_func(job)
+        if not job.resumed:
+            record_stage_timing(job.analysis_id, name, job.profile, job.segment_duration,
+                                time.monotonic() - started)
+        return job
+    
+    except JobCancelled:
+        # Cancelled or deleted by the user; the capacity is freed already
+        current_app.logger.info(f'Analysis {job.analysis_id} cancelled in {stage_func.__name__}')
+        if not job.upgrade:
+            mark_cancelled(job.analysis_id)
     
     except Exception as e:
-        # Handle any other unexpected errors
-        current_app.logger.error(f'Unexpected error in analysis task {analysis_id}: {str(e)}', 
+        # Log the error and update status (timeouts included); a failed
+        # upgrade keeps the result the analysis already has
+        current_app.logger.error(f'Error processing analysis {job.analysis_id}: {str(e)}', 
                                exc_info=True)
-        if 'analysis' in locals():
-            analysis.status = 'failed'
-            analysis.error_message = str(e)
-            db.session.commit()
-        raise
+        if job.upgrade:
+            db.session.rollback()
+        else:
+            mark_failed(job.analysis_id, e)
+    
+    job.cleanup()
+    return None
+
+def build_analysis_stages(config):
+    """Build the pipeline stages for analysis jobs with the configured pool sizes."""
+    return [Stage(name, partial(run_stage, name, func),
+                  workers=config[workers_key] if workers_key else 1)
+            for name, func, workers_key in ANALYSIS_STAGES]
+
+def claim_analyses(analysis_ids, worker_id):
+    """Write: take the lease on analyses handed to the pipeline of ``worker_id``.
+    
+    Leases are bookkeeping, so updated_at (and with it the analyses' ETags
+    and cached JSON) is left alone here and in renew_leases.
+    """
+    db.session.execute(update(Analysis).where(Analysis.id.in_(analysis_ids))
+                       .values(worker_id=worker_id, lease_renewed_at=datetime.utcnow(),
+                               updated_at=Analysis.updated_at),
+                       execution_options={'synchronize_session': False})
+
+def renew_leases(worker_id):
+    """Write: renew the leases on the unfinished analyses held by ``worker_id``."""
+    db.session.execute(update(Analysis)
+                       .where(Analysis.worker_id == worker_id,
+                              Analysis.status.in_(Analysis.ACTIVE_STATUSES))
+                       .values(lease_renewed_at=datetime.utcnow(), updated_at=Analysis.updated_at),
+                       execution_options={'synchronize_session': False})
+
+def claim_interrupted_analyses(stale_after, worker_id):
+    """Write: take over the analyses of processes that died, returning their IDs.
+    
+    A job counts as interrupted when it is still pending, queued or
+    processing but the process holding it has not renewed its lease for
+    ``stale_after`` seconds; jobs waiting in a live process' queue are left
+    to it. Claiming and finding them is one transaction, so two processes
+    starting at once never both take the same job. Their checkpoints let
+    them resume where they stopped.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=stale_after)
+    # Rows from before leases existed count from their last progress report
+    renewed = func.coalesce(Analysis.lease_renewed_at, Analysis.updated_at)
+    db.session.execute(update(Analysis)
+                       .where(Analysis.status.in_(Analysis.ACTIVE_STATUSES), renewed < cutoff)
+                       .values(worker_id=worker_id, lease_renewed_at=now, updated_at=Analysis.updated_at),
+                       execution_options={'synchronize_session': False})
+    rows = db.session.query(Analysis.id)\
+        .filter(Analysis.status.in_(Analysis.ACTIVE_STATUSES),
+                Analysis.worker_id == worker_id, Analysis.lease_renewed_at == now)\
+        .order_by(Analysis.id).all()
+    return [row.id for row in rows]
+
+def find_upgradable_analysis(profile, exclude=()):
+    """Return the ID of the oldest completed analysis run with a cheaper profile than ``profile``.
+    
+    Only analyses degraded by admission control qualify; a profile the
+    client asked for is kept.
+    
+    Args:
+        profile: Profile results are upgraded to
+        exclude: IDs not to return (e.g. upgrades that already failed)
+    """
+    query = db.session.query(Analysis.id)\
+        .filter(Analysis.status == 'completed', Analysis.profile != profile,
+                Analysis.requested_profile.is_(None))
+    if exclude:
+        query = query.filter(Analysis.id.notin_(list(exclude)))
+    row = query.order_by(Analysis.completed_at).first()
+    return row.id if row else None
 
-def cleanup_old_analyses(days=30):
-    """Clean up old analysis data that is no longer needed."""
+def analyze_audio_task(analysis_id):
+    """Analyze audio from a video URL, running every stage in the calling thread.
+    
+    Returns:
+        bool: True if the analysis completed
+    """
+    job = AnalysisJob(analysis_id)
+    for name, stage_func, workers_key in ANALYSIS_STAGES:
+        job = run_stage(name, stage_func, job)
+        if job is None:
+            return False
+    return True
+
+def cleanup_old_analyses(days=None):
+    """Delete analyses past retention (RETENTION_DAYS by default) and orphaned files.
+    
+    See app/retention.py for what is kept; deletes run in small batches so
+    the database stays available while the cleanup runs.
+    """
     try:
-        from datetime import datetime, timedelta
-        
-        # Calculate cutoff date
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Find analyses older than the cutoff date that are not marked as saved
-        old_analyses = Analysis.query.filter(
-            Analysis.created_at < cutoff_date,
-            Analysis.is_saved == False
-        ).all()
-        
-        # Delete associated notes and then the analyses
-        for analysis in old_analyses:
-            # Delete associated notes
-            Note.query.filter_by(analysis_id=analysis.id).delete()
-            
-            # Delete analysis record
-            db.session.delete(analysis)
-        
-        # Commit the changes
-        db.session.commit()
-        
-        current_app.logger.info(f'Cleaned up {len(old_analyses)} old analyses')
-        return f'Successfully cleaned up {len(old_analyses)} old analyses'
+        report = run_cleanup(days)
+        current_app.logger.info(f'Cleaned up {report}')
+        return f'Successfully cleaned up {report}'
     
     except Exception as e:
         current_app.logger.error(f'Error cleaning up old analyses: {str(e)}', exc_info=True)
@@ -1,10 +1,15 @@
 import os
 import tempfile
 import json
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
 import yt_dlp
 import numpy as np
 import librosa
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, url_for
 from werkzeug.utils import secure_filename
 import subprocess
 import ffmpeg
@@ -16,6 +21,12 @@ app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp')
 
+# Background analysis jobs
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', 2))  # Jobs analyzed at once
+app.config['ANALYSIS_QUEUE_SIZE'] = int(os.environ.get('ANALYSIS_QUEUE_SIZE', 8))  # Jobs waiting before /analyze returns 503
+app.config['JOB_STORE_SIZE'] = 256  # Jobs remembered for /jobs/<id>
+app.config['JOB_TTL'] = 3600  # Seconds a finished job's result is kept
+
 # Add a context processor to make common variables available in all templates
 @app.context_processor
 def inject_common_vars():
@@ -113,11 +124,9 @@ def analyze_audio(audio_path, shruthi='C#'):
         shruthi (str): The base note to use as Shadjam (Sa)
     """
     try:
-        # Set the base frequency based on the selected shruthi
-        global BASE_FREQ
-        original_base_freq = BASE_FREQ
-        if shruthi in SHRUTHI_FREQUENCIES:
-            BASE_FREQ = SHRUTHI_FREQUENCIES[shruthi]
+        # Set the base frequency based on the selected shruthi (kept local,
+        # several jobs run at once)
+        base_freq = SHRUTHI_FREQUENCIES.get(shruthi, BASE_FREQ)
         
         # Load audio file with a higher sample rate for better frequency resolution
         y, sr = librosa.load(audio_path, sr=44100)
@@ -171,14 +180,14 @@ def analyze_audio(audio_path, shruthi='C#'):
         
         # Map frequencies to Carnatic notes with timing information
         notes = []
-        for i, (freq, time) in enumerate(zip(f0_voiced, times_voiced)):
+        for i, (freq, t) in enumerate(zip(f0_voiced, times_voiced)):
             # Skip if this is likely a shruthi frequency
             if any(abs(freq - df) < 2.0 for df in dominant_freqs):
                 continue
                 
             if freq > 0:  # Only process valid frequencies
                 # Find the closest Carnatic note
-                note_ratios = {note: abs((freq / BASE_FREQ) - ratio) 
+                note_ratios = {note: abs((freq / base_freq) - ratio) 
                              for note, ratio in NOTE_FREQUENCIES.items()}
                 closest_note, min_diff = min(note_ratios.items(), key=lambda x: x[1])
                 
@@ -187,7 +196,7 @@ def analyze_audio(audio_path, shruthi='C#'):
                     notes.append({
                         'note': closest_note,
                         'frequency': float(freq),
-                        'time': float(time)
+                        'time': float(t)
                     })
         
         return notes
@@ -195,45 +204,210 @@ def analyze_audio(audio_path, shruthi='C#'):
         print(f"Error analyzing audio: {str(e)}")
         return []
 
+def run_analysis(video_url, start_time, end_time, shruthi):
+    """Download and analyze a segment; the body of one background job."""
+    # Get audio from video URL
+    audio_path = get_audio_from_video_url(video_url, start_time, end_time)
+    
+    if not audio_path or not os.path.exists(audio_path):
+        raise RuntimeError('Failed to extract audio from video')
+    
+    try:
+        # Analyze the audio with the selected shruthi
+        notes = analyze_audio(audio_path, shruthi=shruthi)
+    finally:
+        # Clean up
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+            os.rmdir(os.path.dirname(audio_path))
+    
+    return {
+        'status': 'success',
+        'notes': notes,
+        'duration': end_time - start_time,
+        'shruthi': shruthi,
+        'base_frequency': SHRUTHI_FREQUENCIES.get(shruthi, 277.18)  # Default to C# if not found
+    }
+
+class JobStore:
+    """Bounded, thread-safe store of analysis jobs and their results.
+    
+    Finished jobs expire after ``ttl`` seconds; when the store is full the
+    oldest finished job is evicted. Queued and running jobs are never evicted
+    (there are at most ANALYSIS_WORKERS + ANALYSIS_QUEUE_SIZE of them).
+    
+    The store lives in the process, so the app must be served by a single
+    worker process (as the Procfile and app_runner.py do) for /jobs/<id> to
+    find jobs created by /analyze.
+    """
+    
+    def __init__(self, max_size=256, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def create(self, params):
+        """Register a new queued job and return it."""
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'params': params,
+            'created_at': datetime.utcnow().isoformat(),
+            'finished': None,
+            'result': None,
+            'error': None
+        }
+        with self._lock:
+            self._evict(room=1)
+            self._jobs[job['id']] = job
+        return job
+    
+    def get(self, job_id):
+        """Return a copy of a job, or None if it is unknown or was evicted."""
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if job['status'] in ('completed', 'failed'):
+                job['finished'] = time.monotonic()
+    
+    def discard(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+    
+    def _evict(self, room=0):
+        # Expired results first, then the oldest finished jobs until there is room
+        now = time.monotonic()
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished'] is not None]
+        for job_id in finished:
+            if now - self._jobs[job_id]['finished'] > self.ttl:
+                del self._jobs[job_id]
+        finished = [job_id for job_id in finished if job_id in self._jobs]
+        while len(self._jobs) + room > self.max_size and finished:
+            del self._jobs[finished.pop(0)]
+
+class AnalysisWorkers:
+    """A fixed pool of threads running analysis jobs from a bounded queue.
+    
+    Threads are started on the first submission, so a pre-forking server
+    starts them in the worker process rather than the master.
+    """
+    
+    def __init__(self, store, workers=2, queue_size=8):
+        self.store = store
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+    
+    def submit(self, params):
+        """Queue an analysis.
+        
+        Returns:
+            dict: The new job, or None if the queue is full
+        """
+        self._start()
+        job = self.store.create(params)
+        try:
+            self.queue.put_nowait(job['id'])
+        except queue.Full:
+            self.store.discard(job['id'])
+            return None
+        return job
+    
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'analysis-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def _work(self):
+        while True:
+            job_id = self.queue.get()
+            job = self.store.get(job_id)
+            if job is None:
+                continue
+            
+            self.store.update(job_id, status='running')
+            try:
+                result = run_analysis(**job['params'])
+                self.store.update(job_id, status='completed', result=result)
+            except Exception as e:
+                print(f"Error in analysis job {job_id}: {str(e)}")
+                self.store.update(job_id, status='failed', error=str(e))
+
+jobs = JobStore(max_size=app.config['JOB_STORE_SIZE'], ttl=app.config['JOB_TTL'])
+workers = AnalysisWorkers(jobs, workers=app.config['ANALYSIS_WORKERS'],
+                          queue_size=app.config['ANALYSIS_QUEUE_SIZE'])
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
+    """Queue an analysis and return its job ID; poll /jobs/<id> for the result."""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         video_url = data.get('video_url')
         start_time = float(data.get('start_time', 0))
         end_time = float(data.get('end_time', 10))
         shruthi = data.get('shruthi', 'C#')  # Default to C# if not specified
-        
-        if not video_url:
-            return jsonify({'error': 'Video URL is required'}), 400
-        
-        # Get audio from video URL
-        audio_path = get_audio_from_video_url(video_url, start_time, end_time)
-        
-        if not audio_path or not os.path.exists(audio_path):
-            return jsonify({'error': 'Failed to extract audio from video'}), 500
-        
-        # Analyze the audio with the selected shruthi
-        notes = analyze_audio(audio_path, shruthi=shruthi)
-        
-        # Clean up
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-            os.rmdir(os.path.dirname(audio_path))
-        
-        return jsonify({
-            'status': 'success',
-            'notes': notes,
-            'duration': end_time - start_time,
-            'shruthi': shruthi,
-            'base_frequency': SHRUTHI_FREQUENCIES.get(shruthi, 277.18)  # Default to C# if not found
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Start and end times must be numbers'}), 400
+    
+    if not video_url:
+        return jsonify({'error': 'Video URL is required'}), 400
+    
+    if end_time <= start_time or start_time < 0:
+        return jsonify({'error': 'Invalid time range'}), 400
+    
+    job = workers.submit({
+        'video_url': video_url,
+        'start_time': start_time,
+        'end_time': end_time,
+        'shruthi': shruthi
+    })
+    if job is None:
+        response = jsonify({'error': 'Too many analyses in progress, please try again shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    status_url = url_for('job_status', job_id=job['id'])
+    response = jsonify({'job_id': job['id'], 'status': job['status'], 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report a job's status, with the analysis result once it has completed."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    
+    data = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'created_at': job['created_at']
+    }
+    if job['status'] == 'completed':
+        data['result'] = job['result']
+    elif job['status'] == 'failed':
+        data['error'] = job['error']
+    return jsonify(data)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5002))
@@ -0,0 +1,88 @@
+"""
+Measure the cost of pitch-tracking checkpoints and what they save on resume.
+
+Tracks a synthetic segment three ways: without checkpoints, with checkpoints,
+and resumed after a simulated crash part-way through.
+
+    python benchmarks/checkpoint_resume.py --seconds 120 --crash-at 0.5
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app.audio_utils import track_pitch
+from app.checkpoints import PitchCheckpoint
+
+class SimulatedCrash(Exception):
+    pass
+
+def synthetic_segment(seconds, sr):
+    """A gliding tone, so pYIN has real work to do."""
+    t = np.arange(int(seconds * sr)) / sr
+    freq = 277.18 * 2 ** (np.sin(2 * np.pi * t / 7) / 2)
+    return (0.5 * np.sin(2 * np.pi * np.cumsum(freq) / sr)).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=120)
+    parser.add_argument('--sr', type=int, default=22050)
+    parser.add_argument('--chunk-seconds', type=float, default=10.0)
+    parser.add_argument('--crash-at', type=float, default=0.5, help='Fraction of chunks done before the crash')
+    args = parser.parse_args()
+
+    y = synthetic_segment(args.seconds, args.sr)
+    params = {'sr': args.sr, 'chunk_seconds': args.chunk_seconds}
+
+    # Compile librosa's numba kernels before timing anything
+    track_pitch(y[:args.sr], args.sr)
+
+    start = time.perf_counter()
+    track_pitch(y, args.sr, chunk_seconds=args.chunk_seconds)
+    plain = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as root:
+        checkpoint = PitchCheckpoint(os.path.join(root, 'full'))
+        checkpoint.begin(params)
+        start = time.perf_counter()
+        track_pitch(y, args.sr, chunk_seconds=args.chunk_seconds, checkpoint=checkpoint)
+        checkpointed = time.perf_counter() - start
+        chunk_bytes = sum(entry.stat().st_size for entry in os.scandir(checkpoint.directory))
+
+        def crash(stage, fraction):
+            if fraction >= args.crash_at:
+                raise SimulatedCrash()
+
+        checkpoint = PitchCheckpoint(os.path.join(root, 'crash'))
+        checkpoint.begin(params)
+        start = time.perf_counter()
+        try:
+            track_pitch(y, args.sr, chunk_seconds=args.chunk_seconds, checkpoint=checkpoint,
+                        progress_callback=crash)
+        except SimulatedCrash:
+            pass
+        before_crash = time.perf_counter() - start
+
+        checkpoint = PitchCheckpoint(os.path.join(root, 'crash'))
+        assert checkpoint.begin(params)
+        start = time.perf_counter()
+        track_pitch(y, args.sr, chunk_seconds=args.chunk_seconds, checkpoint=checkpoint)
+        resumed = time.perf_counter() - start
+
+    print(f'{args.seconds:.0f}s segment at {args.sr} Hz, {args.chunk_seconds:.0f}s chunks')
+    print(f'  no checkpoints:    {plain:7.2f}s')
+    print(f'  with checkpoints:  {checkpointed:7.2f}s  overhead {checkpointed - plain:+.3f}s '
+          f'({(checkpointed - plain) / plain:+.1%}), {chunk_bytes / 1024:.0f} KiB on disk')
+    print(f'  crash after {before_crash:.2f}s, resume took {resumed:.2f}s '
+          f'({checkpoint.resumed_chunks} chunks reused) vs {plain:.2f}s restarting from scratch '
+          f'(saved {plain - resumed:.2f}s)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Compare the JSON export with the NPZ, Arrow IPC and Parquet exports.
+
+For N synthetic notes (and a pitch track of 10 frames per note) it
+reports each format's size, the time to write it and the time for a
+client to parse it back into NumPy arrays. Arrow and Parquet are skipped
+without pyarrow.
+
+    python benchmarks/columnar_export.py --sizes 10000 100000 1000000
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app.export import json_lines, NOTE_FIELDS
+from app.note_store import SWARAS
+from app.columnar import (COLUMNAR_FORMATS, columnar_export, is_available, note_columns, track_columns,
+                          pa, pq)
+
+META = {'id': 1, 'title': 'bench', 'shruthi': 'C', 'sr': 22050, 'hop_length': 256}
+
+def synthetic_notes(count):
+    """Note arrays shaped like unpack_notes output."""
+    rng = np.random.default_rng(0)
+    durations = 0.0116 * rng.integers(1, 20, count)
+    return {
+        'swara': rng.integers(0, len(SWARAS), count).astype(np.uint8),
+        'start_time': np.cumsum(durations) - durations,
+        'duration': durations,
+        'frequency': rng.uniform(200.0, 800.0, count),
+        'confidence': rng.uniform(0.7, 1.0, count),
+    }
+
+def synthetic_track(frames):
+    """A pitch track shaped like unpack_track output."""
+    rng = np.random.default_rng(1)
+    voiced = rng.random(frames) > 0.3
+    return {
+        'f0': np.where(voiced, rng.uniform(200.0, 800.0, frames), np.nan).astype(np.float32),
+        'voiced_probs': rng.random(frames).astype(np.float32),
+        'voiced_flag': voiced,
+        'sr': META['sr'],
+        'hop_length': META['hop_length'],
+    }
+
+def note_chunks(arrays, size=5000):
+    """The notes as export_analysis streams them."""
+    names = [SWARAS[i] for i in arrays['swara']]
+    for first in range(0, len(names), size):
+        yield [{
+            'start_time': float(arrays['start_time'][i]),
+            'duration': float(arrays['duration'][i]),
+            'note': names[i],
+            'frequency': float(arrays['frequency'][i]),
+            'confidence': float(arrays['confidence'][i]),
+        } for i in range(first, min(first + size, len(names)))]
+
+def track_json(track):
+    """The track as a JSON object of per-frame arrays, the obvious JSON equivalent."""
+    columns = track_columns(track)
+    return json.dumps({name: np.where(np.isnan(values), None, values).tolist() if values.dtype.kind == 'f'
+                       else values.tolist() for name, values in columns.items()})
+
+def parse_json_notes(data):
+    notes = json.loads(data)['notes']
+    index = {name: i for i, name in enumerate(SWARAS)}
+    columns = {field: np.fromiter((note[field] for note in notes), float, len(notes))
+               for field in NOTE_FIELDS if field != 'note'}
+    columns['note'] = np.fromiter((index[note['note']] for note in notes), np.uint8, len(notes))
+    return columns
+
+def parse_json_track(data):
+    return {name: np.array(values, dtype=float if name != 'voiced' else bool)
+            for name, values in json.loads(data).items()}
+
+def parse_npz(data):
+    with np.load(io.BytesIO(data)) as archive:
+        return {name: archive[name] for name in archive.files}
+
+def parse_arrow(data):
+    table = pa.ipc.open_file(pa.py_buffer(data)).read_all()
+    return {name: column.to_numpy() for name, column in zip(table.column_names, table.columns)}
+
+def parse_parquet(data):
+    table = pq.read_table(pa.py_buffer(data))
+    return {name: column.to_numpy() for name, column in zip(table.column_names, table.columns)}
+
+PARSERS = {
+    'npz': parse_npz,
+    'arrow': parse_arrow,
+    'parquet': parse_parquet,
+}
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def report(label, fields, encoders):
+    """Print size, write and parse time of each (name, encode, parse) against the first."""
+    rows = len(next(iter(fields.values())))
+    print(f'\n{label}, {rows} rows')
+    print(f'{"format":>8}  {"size":>12}  {"write":>8}  {"parse":>8}  {"smaller":>8}  {"faster":>8}')
+    baseline = None
+    for name, encode, parse in encoders:
+        write_time, data = timed(encode)
+        parse_time, columns = timed(parse, data)
+        assert all(len(columns[field]) == rows for field in fields), name
+        if baseline is None:
+            baseline = (len(data), parse_time)
+        print(f'{name:>8}  {len(data):>10,} B  {write_time:7.3f}s  {parse_time:7.3f}s  '
+              f'{baseline[0] / len(data):7.1f}x  {baseline[1] / parse_time:7.1f}x')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--frames-per-note', type=int, default=10)
+    args = parser.parse_args()
+
+    formats = [name for name in COLUMNAR_FORMATS if is_available(name)]
+    if len(formats) < len(COLUMNAR_FORMATS):
+        print('pyarrow is not installed: only comparing with NPZ')
+
+    for size in args.sizes:
+        arrays = synthetic_notes(size)
+        columns = note_columns(arrays)
+        report('notes', columns, [
+            ('json', lambda: b''.join(json_lines(META, note_chunks(arrays))), parse_json_notes),
+            *((name, lambda name=name: columnar_export(columns, META, name), PARSERS[name]) for name in formats),
+        ])
+
+        frames = size * args.frames_per_note
+        track = synthetic_track(frames)
+        columns = track_columns(track)
+        report('pitch track', columns, [
+            ('json', lambda: track_json(track).encode('utf-8'), parse_json_track),
+            *((name, lambda name=name: columnar_export(columns, META, name), PARSERS[name]) for name in formats),
+        ])
+
+if __name__ == '__main__':
+    main()
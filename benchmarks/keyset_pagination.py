@@ -0,0 +1,105 @@
+"""
+Compare OFFSET pagination with keyset (cursor) pagination at increasing depth.
+
+Seeds a fresh SQLite database with N public analyses, then times fetching
+one page of the public listing at several depths: the old way
+(paginate(): COUNT(*) plus LIMIT/OFFSET) and with keyset_paginate from a
+cursor at the same position.
+
+    python benchmarks/keyset_pagination.py --rows 1000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis
+from app.pagination import keyset_paginate, encode_cursor
+
+def seed(rows, batch_size=50000):
+    """Insert ``rows`` public analyses, one second apart."""
+    user = User(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.commit()
+
+    start = datetime(2020, 1, 1)
+    statement = Analysis.__table__.insert()
+    for offset in range(0, rows, batch_size):
+        db.session.execute(statement, [{
+            'user_id': user.id, 'title': f'Analysis {i}', 'video_url': 'https://example.com/video',
+            'start_time': 0.0, 'end_time': 30.0, 'duration': 30.0, 'shruthi': 'C#',
+            'status': 'completed', 'profile': 'standard', 'is_public': True,
+            'created_at': start + timedelta(seconds=i)
+        } for i in range(offset, min(offset + batch_size, rows))])
+        db.session.commit()
+
+def best_of(func, repeat):
+    """Fastest of ``repeat`` runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'bench.db')
+            LOG_FILE = os.path.join(root, 'bench.log')
+            LOG_LEVEL = 'WARNING'
+            QUALITY_UPGRADE_INTERVAL = 0
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            db.create_all()
+            print(f'Seeding {args.rows} analyses...')
+            seed(args.rows)
+
+            pages = args.rows // args.per_page
+            depths = sorted({1, 10, 100, 1000, pages // 2, pages} & set(range(1, pages + 1)))
+            query = Analysis.query.filter_by(is_public=True)
+
+            print(f'{"page":>8}  {"paginate()":>11}  {"keyset":>9}  speedup')
+            for page in depths:
+                def with_offset():
+                    query.order_by(Analysis.created_at.desc())\
+                        .paginate(page=page, per_page=args.per_page, error_out=False).items
+
+                # The cursor a client would hold after reading the previous page
+                cursor = None
+                if page > 1:
+                    key = query.with_entities(Analysis.created_at, Analysis.id)\
+                        .order_by(Analysis.created_at.desc(), Analysis.id.desc())\
+                        .offset((page - 1) * args.per_page - 1).first()
+                    cursor = encode_cursor('next', tuple(key))
+
+                def with_cursor():
+                    keyset_paginate(query, (Analysis.created_at, Analysis.id),
+                                    args.per_page, cursor=cursor).items
+
+                offset_time = best_of(with_offset, args.repeat)
+                keyset_time = best_of(with_cursor, args.repeat)
+                print(f'{page:>8}  {offset_time * 1000:9.1f}ms  {keyset_time * 1000:7.2f}ms  '
+                      f'{offset_time / keyset_time:6.0f}x')
+
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
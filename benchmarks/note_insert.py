@@ -0,0 +1,107 @@
+"""
+Compare saving notes one ORM object at a time with Note.bulk_insert.
+
+Each run writes N synthetic notes for one analysis into a fresh SQLite
+database and commits them in a single transaction, the way save_results
+does.
+
+    python benchmarks/note_insert.py --sizes 10000 100000 1000000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis, Note
+
+NOTE_NAMES = Config.CARNATIC_NOTES
+
+def synthetic_notes(count):
+    """Notes shaped like track_to_notes output."""
+    rng = random.Random(0)
+    return [{
+        'time': i * 0.0116,
+        'note': rng.choice(NOTE_NAMES),
+        'frequency': rng.uniform(200.0, 800.0),
+        'duration': 0.0116 * rng.randint(1, 20),
+        'confidence': rng.uniform(0.7, 1.0)
+    } for i in range(count)]
+
+def save_with_orm(analysis_id, notes):
+    for note_data in notes:
+        db.session.add(Note(
+            analysis_id=analysis_id,
+            note_name=note_data['note'],
+            frequency=note_data['frequency'],
+            start_time=note_data['time'],
+            duration=note_data['duration'],
+            confidence=note_data.get('confidence', 1.0)
+        ))
+    db.session.commit()
+
+def save_in_bulk(analysis_id, notes):
+    Note.bulk_insert(analysis_id, notes, Config.NOTE_INSERT_BATCH_SIZE)
+    db.session.commit()
+
+def timed_run(writer, notes):
+    """Run a writer against a fresh database and return (seconds, rows stored)."""
+    with tempfile.TemporaryDirectory() as root:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'bench.db')
+            LOG_FILE = os.path.join(root, 'bench.log')
+            LOG_LEVEL = 'WARNING'
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            user = User(username='bench', email='bench@example.com')
+            db.session.add(user)
+            db.session.flush()
+            analysis = Analysis(user_id=user.id, title='bench', video_url='bench',
+                                start_time=0, end_time=60, duration=60, status='processing')
+            db.session.add(analysis)
+            db.session.commit()
+
+            start = time.perf_counter()
+            writer(analysis.id, notes)
+            elapsed = time.perf_counter() - start
+
+            stored = Note.query.filter_by(analysis_id=analysis.id).count()
+            db.session.remove()
+            db.engine.dispose()
+    return elapsed, stored
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--orm-limit', type=int, default=1000000,
+                        help='Skip the ORM run above this many notes')
+    args = parser.parse_args()
+
+    print(f'{"notes":>9}  {"ORM add()":>16}  {"bulk_insert":>16}  speedup')
+    for size in args.sizes:
+        notes = synthetic_notes(size)
+
+        bulk, stored = timed_run(save_in_bulk, notes)
+        assert stored == size, stored
+
+        if size <= args.orm_limit:
+            orm, stored = timed_run(save_with_orm, notes)
+            assert stored == size, stored
+            orm_text = f'{orm:7.2f}s {size / orm:6.0f}/s'
+            speedup = f'{orm / bulk:6.1f}x'
+        else:
+            orm_text, speedup = 'skipped', ''
+
+        print(f'{size:>9}  {orm_text:>16}  {bulk:7.2f}s {size / bulk:6.0f}/s  {speedup}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure note serialization throughput, ORM objects against Core rows.
+
+Seeds a fresh SQLite database with one analysis of N notes and times
+reading a window of notes and encoding it as JSON, in rows per second:
+the former path (Note objects, to_dict(), the json module), Core row
+tuples with the json module, and Core row tuples with the encoder the
+app uses (orjson when installed).
+
+    python benchmarks/note_serialization.py --notes 100000 --window 5000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis, Note
+from app.note_store import RowNoteSet
+from app.serializers import dumps, orjson
+
+def seed(count):
+    """One analysis with ``count`` notes stored as rows; returns its ID."""
+    user = User(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.flush()
+    analysis = Analysis(user_id=user.id, title='bench', video_url='bench',
+                        start_time=0, end_time=count * 0.0116, duration=count * 0.0116, status='completed')
+    db.session.add(analysis)
+    db.session.flush()
+    rng = random.Random(0)
+    Note.bulk_insert(analysis.id, ({
+        'time': i * 0.0116,
+        'note': rng.choice(Config.CARNATIC_NOTES),
+        'frequency': rng.uniform(200.0, 800.0),
+        'duration': 0.0116,
+        'confidence': rng.uniform(0.7, 1.0)
+    } for i in range(count)))
+    db.session.commit()
+    return analysis.id
+
+def stdlib_dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def best_of(func, repeat):
+    """Fastest of ``repeat`` runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--notes', type=int, default=100000)
+    parser.add_argument('--window', type=int, default=5000, help='Notes read and encoded per run')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'bench.db')
+            LOG_FILE = os.path.join(root, 'bench.log')
+            LOG_LEVEL = 'WARNING'
+            QUALITY_UPGRADE_INTERVAL = 0
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            analysis_id = seed(args.notes)
+            note_set = RowNoteSet(analysis_id)
+            end = args.window * 0.0116
+
+            def orm_objects():
+                notes = Note.query.filter(Note.analysis_id == analysis_id, Note.start_time < end)\
+                    .order_by(Note.start_time).all()
+                return stdlib_dumps([note.to_dict() for note in notes])
+
+            def core_rows(encode):
+                return lambda: encode(note_set.window(0.0, end, args.window)[0])
+
+            runs = [
+                ('ORM objects + json', orm_objects),
+                ('Core rows + json', core_rows(stdlib_dumps)),
+            ]
+            if orjson is not None:
+                runs.append(('Core rows + orjson', core_rows(dumps)))
+            else:
+                print('orjson is not installed: skipping it')
+
+            assert len(json.loads(orm_objects())) == len(json.loads(core_rows(dumps)())) == args.window
+            print(f'{"path":<20}  {"time":>9}  {"rows/s":>10}  speedup')
+            baseline = None
+            for label, func in runs:
+                elapsed = best_of(func, args.repeat)
+                baseline = baseline or elapsed
+                print(f'{label:<20}  {elapsed * 1000:7.1f}ms  {args.window / elapsed:10.0f}  '
+                      f'{baseline / elapsed:6.1f}x')
+
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
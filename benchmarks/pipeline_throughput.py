@@ -0,0 +1,100 @@
+"""
+Compare sequential and stage-pipelined job throughput.
+
+Each job downloads a file from a local HTTP server that simulates network
+latency and bandwidth, then burns CPU in a child process (standing in for
+pitch tracking). Run sequentially a worker takes download + CPU per job;
+pipelined it should approach max(download, CPU).
+
+    python benchmarks/pipeline_throughput.py --jobs 12 --latency 0.5 --cpu 0.5
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app.jobs import run_in_child
+from app.pipeline import Stage, StagePipeline
+
+def make_handler(latency, size, chunk=64 * 1024):
+    class SlowMediaHandler(BaseHTTPRequestHandler):
+        """Serve `size` bytes, spreading `latency` seconds over the response."""
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+            chunks = max(1, size // chunk)
+            for _ in range(chunks):
+                time.sleep(latency / chunks)
+                self.wfile.write(b'\0' * chunk)
+
+        def log_message(self, *args):
+            pass
+
+    return SlowMediaHandler
+
+def burn_cpu(seconds, progress_callback=None):
+    """Busy-loop for `seconds` of CPU time."""
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        pass
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds per download')
+    parser.add_argument('--cpu', type=float, default=0.5, help='CPU seconds per job')
+    parser.add_argument('--size', type=int, default=2 * 1024 * 1024, help='Bytes per download')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.latency, args.size))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/media.mp3'
+
+    def download(job):
+        with urllib.request.urlopen(url) as response:
+            while response.read(64 * 1024):
+                pass
+        return job
+
+    def analyze(job):
+        run_in_child(burn_cpu, kwargs={'seconds': args.cpu})
+        return job
+
+    # Warm up the forkserver so its start-up is not billed to either run
+    run_in_child(burn_cpu, kwargs={'seconds': 0})
+
+    start = time.perf_counter()
+    for job in range(args.jobs):
+        analyze(download(job))
+    sequential = time.perf_counter() - start
+
+    pipeline = StagePipeline([Stage('download', download, workers=1),
+                              Stage('pitch', analyze, workers=1)]).start()
+    start = time.perf_counter()
+    for job in range(args.jobs):
+        pipeline.submit(job)
+    pipeline.join()
+    pipelined = time.perf_counter() - start
+    pipeline.shutdown()
+    server.shutdown()
+
+    ideal = args.jobs * max(args.latency, args.cpu) + min(args.latency, args.cpu)
+    print(f'{args.jobs} jobs, {args.latency}s download + {args.cpu}s CPU each (one worker per stage)')
+    print(f'  sequential: {sequential:6.2f}s  {args.jobs / sequential:5.2f} jobs/s')
+    print(f'  pipelined:  {pipelined:6.2f}s  {args.jobs / pipelined:5.2f} jobs/s'
+          f'  (ideal {ideal:.2f}s, speedup {sequential / pipelined:.2f}x)')
+
+if __name__ == '__main__':
+    main()
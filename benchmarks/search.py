@@ -0,0 +1,119 @@
+"""
+Compare LIKE substring search with the FTS5 search index.
+
+Seeds a fresh SQLite database with N public analyses whose titles and
+descriptions are drawn from a raga/word vocabulary, then times what
+/api/analyses?q=...&count=1 does for a few searches with each backend:
+the first page of results, and counting all matches. LIKE lists newest
+first and can stop after one page of common words, FTS5 ranks every match
+by relevance; rare words and counts make LIKE read the whole table.
+
+    python benchmarks/search.py --rows 100000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis
+from app.pagination import keyset_paginate
+from app.search import LikeSearchBackend, Fts5SearchBackend
+
+RAGAS = ['Bhairavi', 'Kalyani', 'Todi', 'Mohanam', 'Shankarabharanam', 'Kambhoji', 'Begada',
+         'Sahana', 'Hindolam', 'Kharaharapriya', 'Abhogi', 'Saveri', 'Madhyamavati', 'Nata']
+WORDS = ['varnam', 'kriti', 'alapana', 'tanam', 'pallavi', 'swaram', 'concert', 'practice',
+         'violin', 'veena', 'vocal', 'slow', 'fast', 'tempo', 'live', 'recording', 'lesson',
+         'gamaka', 'madhyama', 'kalam', 'neraval', 'kalpana', 'morning', 'evening', 'temple']
+
+# One analysis in RARE_EVERY has this raga in its title
+RARE = 'Nilambari'
+RARE_EVERY = 1000
+
+SEARCHES = ['bhairavi', 'kalyani varnam', 'hindo', 'shankarabharanam live recording',
+            'nilambari', 'nilam', 'yamunakalyani']
+
+def seed(rows, batch_size=20000):
+    """Insert ``rows`` public analyses with random titles and descriptions."""
+    rng = random.Random(0)
+    user = User(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.commit()
+
+    start = datetime(2020, 1, 1)
+    statement = Analysis.__table__.insert()
+    for offset in range(0, rows, batch_size):
+        db.session.execute(statement, [{
+            'user_id': user.id,
+            'title': f'{RARE if i % RARE_EVERY == 0 else rng.choice(RAGAS)} {rng.choice(WORDS)}',
+            'description': ' '.join(rng.choice(WORDS + RAGAS) for _ in range(rng.randint(5, 30))),
+            'video_url': 'https://example.com/video', 'start_time': 0.0, 'end_time': 30.0,
+            'duration': 30.0, 'shruthi': 'C#', 'status': 'completed', 'profile': 'standard',
+            'is_public': True, 'created_at': start + timedelta(seconds=i)
+        } for i in range(offset, min(offset + batch_size, rows))])
+        db.session.commit()
+
+def first_page(backend, terms, per_page):
+    query, score = backend.search(Analysis.query.filter_by(is_public=True), terms)
+    key = (score, Analysis.id) if score is not None else (Analysis.created_at, Analysis.id)
+    return keyset_paginate(query, key, per_page).items
+
+def count_matches(backend, terms):
+    query, _ = backend.search(Analysis.query.filter_by(is_public=True), terms)
+    return query.count()
+
+def best_of(func, repeat):
+    """Fastest of ``repeat`` runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'bench.db')
+            LOG_FILE = os.path.join(root, 'bench.log')
+            LOG_LEVEL = 'WARNING'
+            QUALITY_UPGRADE_INTERVAL = 0
+            SEARCH_BACKEND = 'fts5'
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            print(f'Seeding {args.rows} analyses...')
+            start = time.perf_counter()
+            seed(args.rows)
+            print(f'Seeded in {time.perf_counter() - start:.1f}s (search index kept in sync by triggers)')
+
+            like, fts = LikeSearchBackend(), Fts5SearchBackend()
+            print(f'{"":<32}  {"":>7}  {"first page":^20}  {"count":^20}')
+            print(f'{"search":<32}  {"matches":>7}  {"LIKE":>9}  {"FTS5":>9}  {"LIKE":>9}  {"FTS5":>9}')
+            for terms in SEARCHES:
+                matches = count_matches(fts, terms)
+                timings = [best_of(lambda: func(backend, terms), args.repeat)
+                           for func in (lambda b, t: first_page(b, t, args.per_page), count_matches)
+                           for backend in (like, fts)]
+                print(f'{terms:<32}  {matches:>7}  ' + '  '.join(f'{t * 1000:7.1f}ms' for t in timings))
+
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure the serializer cache on 100-item pages of the public listing.
+
+Seeds a fresh SQLite database with N public analyses and times, for one
+page of 100: serializing the loaded analyses with to_dict() and jsonify
+against splicing their cached JSON, and the whole GET /api/analyses
+request with the cache disabled and warm.
+
+    python benchmarks/serializer_cache.py --rows 10000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from flask import jsonify
+from sqlalchemy.orm import selectinload
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis
+from app.serializers import analysis_json, json_response
+
+def seed(rows, batch_size=50000):
+    """Insert ``rows`` completed public analyses, one second apart."""
+    user = User(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.commit()
+
+    start = datetime(2020, 1, 1)
+    statement = Analysis.__table__.insert()
+    for offset in range(0, rows, batch_size):
+        db.session.execute(statement, [{
+            'user_id': user.id, 'title': f'Analysis {i}', 'description': 'Benchmark analysis ' * 5,
+            'video_url': 'https://example.com/video', 'start_time': 0.0, 'end_time': 30.0, 'duration': 30.0,
+            'shruthi': 'C#', 'status': 'completed', 'profile': 'standard', 'is_public': True,
+            'progress': 1.0, 'note_count': 1000, 'created_at': start + timedelta(seconds=i),
+            'updated_at': start + timedelta(seconds=i), 'completed_at': start + timedelta(seconds=i)
+        } for i in range(offset, min(offset + batch_size, rows))])
+        db.session.commit()
+
+def best_of(func, repeat):
+    """Fastest of ``repeat`` runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        def make_app(cache_bytes):
+            class BenchmarkConfig(Config):
+                SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'bench.db')
+                LOG_FILE = os.path.join(root, 'bench.log')
+                LOG_LEVEL = 'WARNING'
+                QUALITY_UPGRADE_INTERVAL = 0
+                SERIALIZER_CACHE_BYTES = cache_bytes
+            return create_app(BenchmarkConfig)
+
+        app = make_app(Config.SERIALIZER_CACHE_BYTES)
+        with app.app_context():
+            print(f'Seeding {args.rows} analyses...')
+            seed(args.rows)
+
+        # Serialization alone, of one page of loaded analyses
+        with app.test_request_context():
+            page = Analysis.query.filter_by(is_public=True).options(selectinload(Analysis.author))\
+                .order_by(Analysis.created_at.desc()).limit(args.per_page).all()
+            with_to_dict = best_of(lambda: jsonify({'items': [item.to_dict() for item in page]}).get_data(),
+                                   args.repeat)
+            spliced = lambda: json_response({}, items=[analysis_json(item) for item in page]).get_data()
+            spliced()
+            with_cache = best_of(spliced, args.repeat)
+        print(f'\nSerializing {len(page)} analyses')
+        print(f'  to_dict() + jsonify  {with_to_dict * 1000:7.2f}ms  {len(page) / with_to_dict:9.0f} items/s')
+        print(f'  cached fragments     {with_cache * 1000:7.2f}ms  {len(page) / with_cache:9.0f} items/s  '
+              f'{with_to_dict / with_cache:.1f}x')
+
+        # Whole requests, including the listing query and loading the authors
+        url = f'/api/analyses?per_page={args.per_page}'
+        print(f'\nGET {url}')
+        for label, cache_bytes in (('cache disabled', 0), ('cache warm', Config.SERIALIZER_CACHE_BYTES)):
+            client = make_app(cache_bytes).test_client()
+            client.get(url)
+            elapsed = best_of(lambda: client.get(url), args.repeat)
+            print(f'  {label:<19}  {elapsed * 1000:7.2f}ms')
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Mixed read/write load on SQLite: a web process against a worker process.
+
+Runs the same load twice on a fresh database: once with SQLite's defaults
+(rollback journal, every worker thread committing on its own) and once
+with the concurrency settings (WAL, synchronous=NORMAL, mmap, busy
+timeout and the single writer thread). The web process reads listing and
+note pages and now and then toggles a favorite; the worker process updates
+job progress and replaces note sets like the pipeline does.
+
+    python benchmarks/sqlite_concurrency.py --seconds 20 --readers 8 --writers 4
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis, Favorite
+from app.database import write
+from app.note_store import load_notes, save_notes
+from app.pagination import keyset_paginate
+from app.stats import adjust_user_stats
+from app.tasks import update_analysis
+
+ANALYSES = 2000
+NOTES_PER_ANALYSIS = 200
+
+def make_config(root, mode, role):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, f'{mode}.db')
+        LOG_FILE = os.path.join(root, 'bench.log')
+        LOG_LEVEL = 'WARNING'
+        QUALITY_UPGRADE_INTERVAL = 0
+        DB_ROLE = role
+
+    if mode == 'default':
+        BenchmarkConfig.SQLITE_PRAGMAS = {}
+        BenchmarkConfig.DB_WRITE_QUEUE = False
+    return BenchmarkConfig
+
+def make_notes(count, seed):
+    rng = random.Random(seed)
+    return [{'time': i * 0.05, 'note': rng.choice(Config.CARNATIC_NOTES), 'frequency': rng.uniform(200, 800),
+             'duration': 0.05, 'confidence': rng.uniform(0.7, 1.0)} for i in range(count)]
+
+def seed(root, mode):
+    app = create_app(make_config(root, mode, 'script'))
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(username=f'user{u}', email=f'user{u}@example.com') for u in range(10)])
+        db.session.commit()
+        db.session.execute(Analysis.__table__.insert(), [{
+            'user_id': 1 + i % 10, 'title': f'Analysis {i}', 'video_url': 'https://example.com/video',
+            'start_time': 0.0, 'end_time': 10.0, 'duration': 10.0, 'shruthi': 'C#', 'status': 'completed',
+            'profile': 'standard', 'is_public': True, 'note_count': 0
+        } for i in range(ANALYSES)])
+        db.session.commit()
+        notes = make_notes(NOTES_PER_ANALYSIS, 0)
+        for analysis_id in range(1, ANALYSES + 1):
+            save_notes(analysis_id, notes, 'rows')
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def run_threads(count, target, seconds):
+    """Run ``count`` threads of ``target(index, deadline)`` and merge their result dicts."""
+    deadline = time.monotonic() + seconds
+    results = [None] * count
+
+    def run(index):
+        results[index] = target(index, deadline)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    merged = {}
+    for result in results:
+        for key, value in result.items():
+            merged[key] = merged.get(key, type(value)()) + value
+    return merged
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+def web_process(root, mode, readers, seconds, out):
+    """Listing and note page reads, with a favorite toggle every 20th request."""
+    app = create_app(make_config(root, mode, 'web'))
+
+    def reader(index, deadline):
+        rng = random.Random(index)
+        result = {'reads': 0, 'read_ms': [], 'web_writes': 0, 'write_ms': [], 'locked': 0}
+        while time.monotonic() < deadline:
+            with app.app_context():
+                start = time.perf_counter()
+                try:
+                    if result['reads'] % 20 == 19:
+                        user_id, analysis_id = 1 + index % 10, rng.randint(1, ANALYSES)
+                        favorite = Favorite.query.filter_by(user_id=user_id, analysis_id=analysis_id).first()
+                        if favorite:
+                            db.session.delete(favorite)
+                            adjust_user_stats(user_id, favorite_count=-1)
+                        else:
+                            db.session.add(Favorite(user_id=user_id, analysis_id=analysis_id))
+                            adjust_user_stats(user_id, favorite_count=1)
+                        db.session.commit()
+                        result['web_writes'] += 1
+                        result['write_ms'].append((time.perf_counter() - start) * 1000)
+                    else:
+                        keyset_paginate(Analysis.query.filter_by(is_public=True),
+                                        (Analysis.created_at, Analysis.id), 20)
+                        load_notes(rng.randint(1, ANALYSES)).page(1, 100)
+                        result['read_ms'].append((time.perf_counter() - start) * 1000)
+                    result['reads'] += 1
+                except OperationalError as e:
+                    db.session.rollback()
+                    if not is_locked(e):
+                        raise
+                    result['locked'] += 1
+        return result
+
+    out.put(run_threads(readers, reader, seconds))
+
+def replace_notes(analysis_id, notes):
+    save_notes(analysis_id, notes, 'rows')
+
+def worker_process(root, mode, writers, seconds, out):
+    """Progress updates, and a note set replaced every 25th write."""
+    app = create_app(make_config(root, mode, 'worker'))
+    notes = make_notes(NOTES_PER_ANALYSIS, 1)
+
+    def worker(index, deadline):
+        rng = random.Random(100 + index)
+        result = {'job_writes': 0, 'job_ms': [], 'locked': 0}
+        while time.monotonic() < deadline:
+            with app.app_context():
+                analysis_id = rng.randint(1, ANALYSES)
+                start = time.perf_counter()
+                try:
+                    if result['job_writes'] % 25 == 24:
+                        write(replace_notes, analysis_id, notes)
+                    else:
+                        write(update_analysis, analysis_id, stage='pitch', progress=rng.random())
+                    result['job_writes'] += 1
+                    result['job_ms'].append((time.perf_counter() - start) * 1000)
+                except OperationalError as e:
+                    if not is_locked(e):
+                        raise
+                    result['locked'] += 1
+                time.sleep(0.002)  # A worker does some work between writes
+        return result
+
+    out.put(run_threads(writers, worker, seconds))
+
+def run_mode(root, mode, args):
+    seed(root, mode)
+    context = multiprocessing.get_context('spawn')
+    out = context.Queue()
+    processes = [context.Process(target=web_process, args=(root, mode, args.readers, args.seconds, out)),
+                 context.Process(target=worker_process, args=(root, mode, args.writers, args.seconds, out))]
+    for process in processes:
+        process.start()
+    results = {}
+    for _ in processes:
+        for key, value in out.get().items():
+            results[key] = results.get(key, type(value)()) + value
+    for process in processes:
+        process.join()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--readers', type=int, default=8, help='Request threads in the web process')
+    parser.add_argument('--writers', type=int, default=4, help='Pipeline threads in the worker process')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'{"mode":>10}  {"reads/s":>8}  {"read p50":>9}  {"read p99":>9}  {"job writes/s":>12}  '
+              f'{"job p99":>9}  {"web write p99":>13}  {"locked":>6}')
+        for mode in ('default', 'tuned'):
+            r = run_mode(root, mode, args)
+            print(f'{mode:>10}  {r["reads"] / args.seconds:8.0f}  {percentile(r["read_ms"], 0.5):7.1f}ms  '
+                  f'{percentile(r["read_ms"], 0.99):7.1f}ms  {r["job_writes"] / args.seconds:12.0f}  '
+                  f'{percentile(r["job_ms"], 0.99):7.1f}ms  {percentile(r["write_ms"], 0.99):11.1f}ms  '
+                  f'{r["locked"]:>6}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Check that listing and detail routes run a constant number of queries.
+
+Seeds a throwaway database and calls each route twice as a logged-in
+user: with a small and a large page (or a user with few and one with many
+favorites). Every analysis has its own author, so a relationship loaded
+per row shows up as extra queries on the larger call. Exits with status 1
+when the two counts differ or a call raises (its counts would be cut
+short, and equal).
+
+    python check_query_counts.py [--verbose]
+"""
+
+import os
+import sys
+import inspect
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from flask_login import login_user
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis, Favorite
+from app.query_count import QueryCounter
+
+# Route, URL arguments, and the (user, query arguments) of a small and a large call
+CHECKS = [
+    ('api.get_analyses', {}, (1, {'per_page': 1}), (1, {'per_page': 50})),
+    ('api.get_analyses', {}, (1, {'per_page': 1, 'q': 'raga'}), (1, {'per_page': 50, 'q': 'raga'})),
+    ('api.get_user_analyses', {'id': 1}, (1, {'per_page': 1}), (1, {'per_page': 50})),
+    ('api.get_my_analyses', {}, (1, {'per_page': 1}), (1, {'per_page': 50})),
+    ('api.get_my_favorites', {}, (2, {'per_page': 1}), (2, {'per_page': 50})),
+    ('main.dashboard', {}, (3, {}), (2, {})),
+    ('main.browse', {}, (1, {'q': 'unique'}), (1, {})),
+    ('api.get_analysis', {'id': 1}, (1, {}), (1, {})),
+    ('main.analysis', {'analysis_id': 1}, (1, {}), (1, {})),
+    ('analysis.view_analysis', {'analysis_id': 1}, (1, {}), (1, {})),
+    ('analysis.export_analysis', {'analysis_id': 1}, (1, {}), (1, {})),
+]
+
+def seed(users=60):
+    """One user per analysis batch; user 2 favorites many analyses, user 3 just one."""
+    start = datetime.utcnow() - timedelta(days=30)
+    db.session.add_all([User(username=f'user{u}', email=f'user{u}@example.com') for u in range(users)])
+    db.session.commit()
+    for u in range(users):
+        for a in range(3):
+            db.session.add(Analysis(
+                user_id=u + 1, title=f'Raga {u}-{a}', video_url='https://example.com/video',
+                description='unique' if (u, a) == (0, 0) else None,
+                start_time=0, end_time=30, duration=30, is_public=True, status='completed',
+                created_at=start + timedelta(minutes=u * 3 + a)))
+    db.session.commit()
+    for analysis_id in range(4, 3 * users, 3):
+        db.session.add(Favorite(user_id=2, analysis_id=analysis_id))
+    db.session.add(Favorite(user_id=3, analysis_id=1))
+    db.session.commit()
+
+def count_queries(app, endpoint, view_args, user_id, query_args):
+    """Call a view without its auth decorators, as the given user; return the statements it ran.
+
+    Returns:
+        tuple: (statements, the exception the view raised or None)
+    """
+    view = inspect.unwrap(app.view_functions[endpoint])
+    with app.test_request_context():
+        url = app.url_for(endpoint, **view_args, **query_args)
+    # Start without cached favorites, so both calls do the same lookups
+    app.extensions.pop('favorites_cache', None)
+    # A fresh app context, so nothing carries over in g like between real requests
+    with app.app_context(), app.test_request_context(url):
+        login_user(db.session.get(User, user_id))
+        error = None
+        with QueryCounter(db.engine) as queries:
+            try:
+                response = app.make_response(view(**view_args))
+                for _ in response.response:
+                    pass
+            except Exception as e:
+                error = e
+        db.session.remove()
+    return queries.statements, error
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='Print the statements of every call')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        class CountConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'counts.db')
+            LOG_FILE = os.path.join(root, 'counts.log')
+            LOG_LEVEL = 'WARNING'
+            TESTING = True
+            QUALITY_UPGRADE_INTERVAL = 0
+
+        app = create_app(CountConfig)
+        failures = 0
+        with app.app_context():
+            db.create_all()
+            seed()
+            db.session.remove()
+
+            for endpoint, view_args, (small_user, small_args), (large_user, large_args) in CHECKS:
+                small, small_error = count_queries(app, endpoint, view_args, small_user, small_args)
+                large, large_error = count_queries(app, endpoint, view_args, large_user, large_args)
+                error = small_error or large_error
+                if error is not None:
+                    status = f'ERROR {type(error).__name__}: {error}'
+                else:
+                    status = 'ok' if len(small) == len(large) else 'GROWS'
+                if status != 'ok':
+                    failures += 1
+                print(f'{endpoint} {large_args or ""}: {len(small)} / {len(large)} queries {status}')
+                if args.verbose or status == 'GROWS':
+                    for statement in large:
+                        print(f'    {" ".join(statement.split())[:160]}')
+
+            db.session.remove()
+            db.engine.dispose()
+
+    print(f'{len(CHECKS)} routes checked, {failures} with a query count that grows or an error')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Check the SQLite query plans of the app's hot paths for full table scans.
+
+Seeds a throwaway database, calls every read route (and the admission and
+upgrade queries behind the write routes) as a logged-in user, records each
+SELECT they run and EXPLAINs it. Exits with status 1 when any of them
+scans a whole table instead of searching an index, or when a route or
+call raises (it may not have run all of its queries).
+
+    python check_query_plans.py [--verbose]
+"""
+
+import os
+import re
+import sys
+import inspect
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from flask_login import login_user
+from sqlalchemy import event
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis, Note, Favorite
+from app.admission import check_admission
+from app.tasks import find_upgradable_analysis
+from app.retention import expired_analyses
+from app.note_store import load_notes
+
+# "SCAN notes" or, before SQLite 3.36, "SCAN TABLE notes"; index scans
+# ("SCAN notes USING INDEX ...") read the rows in index order and pass
+PLAIN_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+# Read routes to check and their URL arguments
+ROUTES = [
+    ('main.index', {}),
+    ('main.dashboard', {}),
+    ('main.browse', {}),
+    ('main.analysis', {'analysis_id': 1}),
+    ('analysis.view_analysis', {'analysis_id': 1}),
+    ('analysis.export_analysis', {'analysis_id': 1}),
+    ('api.get_analyses', {}),
+    ('api.get_analysis', {'id': 1}),
+    ('api.analysis_events', {'id': 1}),
+    ('api.get_analysis_notes', {'id': 1}),
+    ('api.get_user', {'id': 1}),
+    ('api.get_user_analyses', {'id': 1}),
+    ('api.get_current_user', {}),
+    ('api.get_my_analyses', {}),
+    ('api.get_my_favorites', {}),
+]
+
+# Queries run by the write routes and the pipeline
+CALLS = [
+    ('check_admission', lambda user_id: check_admission(user_id, 30.0)),
+    ('find_upgradable_analysis', lambda user_id: find_upgradable_analysis('standard')),
+    ('expired_analyses', lambda user_id: expired_analyses(7).order_by(Analysis.id).limit(500).all()),
+    ('notes_window', lambda user_id: load_notes(1).window(5.0, 10.0, 100, lookback=1.0)),
+]
+
+def seed(users=3, analyses_per_user=100, notes_per_analysis=50):
+    """Fill the database with enough rows that every table has something to scan."""
+    start = datetime.utcnow() - timedelta(days=30)
+    for u in range(users):
+        user = User(username=f'user{u}', email=f'user{u}@example.com')
+        db.session.add(user)
+        db.session.flush()
+        for a in range(analyses_per_user):
+            db.session.add(Analysis(
+                user_id=user.id, title=f'Analysis {u}-{a}', video_url='https://example.com/video',
+                start_time=0, end_time=30, duration=30, is_public=a % 2 == 0,
+                status='queued' if a % 10 == 5 else 'completed',
+                created_at=start + timedelta(minutes=u * analyses_per_user + a)))
+    db.session.commit()
+
+    analysis_ids = [row[0] for row in db.session.query(Analysis.id)]
+    db.session.execute(Note.__table__.insert(), [{
+        'analysis_id': analysis_id, 'note_name': 'Sa', 'frequency': 277.18,
+        'start_time': n * 0.5, 'duration': 0.5, 'confidence': 0.9
+    } for analysis_id in analysis_ids for n in range(notes_per_analysis)])
+    for user_id in range(1, users + 1):
+        for analysis_id in analysis_ids[::7]:
+            db.session.add(Favorite(user_id=user_id, analysis_id=analysis_id))
+    db.session.commit()
+
+def run_route(app, user_id, endpoint, kwargs):
+    """Call a view without its auth decorators, as the given user, and consume its response."""
+    view = inspect.unwrap(app.view_functions[endpoint])
+    with app.test_request_context():
+        url = app.url_for(endpoint, **kwargs)
+    with app.test_request_context(url):
+        login_user(db.session.get(User, user_id))
+        response = app.make_response(view(**kwargs))
+        for _ in response.response:  # Streamed responses run their queries here
+            pass
+
+def scanned_tables(plan, tables):
+    """Tables a query plan reads in full."""
+    scans = []
+    for row in plan:
+        match = PLAIN_SCAN.match(row[3])
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='Print every query plan')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        class PlanConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(root, 'plans.db')
+            LOG_FILE = os.path.join(root, 'plans.log')
+            LOG_LEVEL = 'WARNING'
+            TESTING = True
+            QUALITY_UPGRADE_INTERVAL = 0
+            SSE_POLL_INTERVAL = 0
+
+        app = create_app(PlanConfig)
+        with app.app_context():
+            db.create_all()
+            seed()
+            user_id = 1
+            tables = set(db.metadata.tables)
+
+            # Record the SELECTs each route runs
+            captured = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith('SELECT'):
+                    captured.append((statement, parameters))
+
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            checks = [(endpoint, lambda e=endpoint, k=kwargs: run_route(app, user_id, e, k))
+                      for endpoint, kwargs in ROUTES]
+            checks += [(name, lambda call=call: call(user_id)) for name, call in CALLS]
+
+            # A route that raises is an error: its remaining queries never ran
+            queries = []
+            errors = []
+            for name, check in checks:
+                del captured[:]
+                try:
+                    check()
+                except Exception as e:
+                    errors.append(name)
+                    print(f'{name}: ERROR {type(e).__name__}: {e}')
+                db.session.rollback()
+                queries += [(name, statement, parameters) for statement, parameters in captured]
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+            # EXPLAIN every distinct query
+            failures = 0
+            seen = set()
+            with db.engine.connect() as conn:
+                for name, statement, parameters in queries:
+                    if (name, statement) in seen:
+                        continue
+                    seen.add((name, statement))
+                    plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+                    scans = scanned_tables(plan, tables)
+                    if scans:
+                        failures += 1
+                    if scans or args.verbose:
+                        status = f'FULL SCAN of {", ".join(scans)}' if scans else 'ok'
+                        print(f'{name}: {status}\n  {" ".join(statement.split())}')
+                        for row in plan:
+                            print(f'    {row[3]}')
+
+            db.session.remove()
+            db.engine.dispose()
+
+    print(f'{len(seen)} queries checked, {failures} with full table scans')
+    if errors:
+        print(f'{len(errors)} routes or calls raised: {", ".join(errors)}')
+    return 1 if failures or errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+Delete analyses past retention and the files nobody needs any more.
+
+Private analyses nobody favorited are removed RETENTION_DAYS after they were
+created, with their notes, uploads and checkpoints; uploads, checkpoints
+and job scratch directories that no analysis refers to go as well. Run it
+from cron; it deletes in small batches, so the app keeps working meanwhile.
+
+    python cleanup_old_analyses.py [--days N]
+"""
+
+import argparse
+
+from app import create_app
+from app.tasks import cleanup_old_analyses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, help='Retention in days (default: RETENTION_DAYS)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(cleanup_old_analyses(args.days))
+
+if __name__ == '__main__':
+    main()
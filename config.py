@@ -6,6 +6,7 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-123'
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     TEMP_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp')
+    CHECKPOINT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
     # Database
@@ -88,6 +89,151 @@ class Config:
     FRAME_LENGTH = 2048
     HOP_LENGTH = 512
     CONFIDENCE_THRESHOLD = 0.7
+    PITCH_CHUNK_SECONDS = 10.0  # Audio per pitch-tracking chunk (progress granularity)
+    NOTE_INSERT_BATCH_SIZE = 5000  # Notes per executemany when saving results
+    NOTE_STORAGE = os.environ.get('NOTE_STORAGE', 'rows')  # 'rows' (one Note per note) or 'packed' (one blob per analysis)
+    NOTES_WINDOW_MAX = 5000  # Notes returned for one time window at most (/api/analyses/<id>/notes?from=&to=)
+    CONTOUR_TILE_SIZE = 256  # Buckets per pitch contour tile (see app/contour.py)
+    EXPORT_CHUNK_SIZE = 5000  # Notes read and written per step of a streamed export (see app/export.py)
+    STORE_PITCH_TRACKS = True  # Keep each analysis' frame-level pitch track for columnar exports (about 5 bytes per frame)
+    
+    # Analysis profiles: the pitch backend and parameters a job is run with,
+    # ordered from the most accurate to the cheapest
+    ANALYSIS_PROFILES = {
+        'standard': {
+            'backend': 'pyin',
+            'sample_rate': SAMPLE_RATE,
+            'frame_length': FRAME_LENGTH,
+            'hop_length': HOP_LENGTH,
+        },
+        'reduced': {  # ~2.5x cheaper
+            'backend': 'pyin',
+            'sample_rate': 16000,
+            'frame_length': 1024,
+            'hop_length': 512,
+        },
+        'fast': {  # ~60x cheaper, more octave errors
+            'backend': 'yin',
+            'sample_rate': 22050,
+            'frame_length': 1024,
+            'hop_length': 256,
+        },
+    }
+    DEFAULT_PROFILE = 'standard'
+    
+    # Adaptive quality: under load new analyses step down to cheaper profiles
+    QUALITY_LATENCY_SLO = 300  # Seconds from submission to result the scheduler aims for
+    QUALITY_UPGRADE_INTERVAL = 30  # Seconds between looks for degraded results to redo while idle (0 disables)
+    
+    # Cost model (see app/admission.py). Until enough timings are recorded a
+    # stage is assumed to take overhead + rate * segment seconds, per profile.
+    COST_MODEL_DEFAULTS = {
+        'standard': {
+            'metadata': (2.0, 0.0),
+            'download': (3.0, 0.05),
+            'transcode': (0.5, 0.01),
+            'pitch': (1.0, 0.3),
+            'notes': (0.1, 0.002),
+            'save': (0.1, 0.002),
+        },
+        'reduced': {
+            'metadata': (2.0, 0.0),
+            'download': (3.0, 0.05),
+            'transcode': (0.5, 0.01),
+            'pitch': (1.0, 0.12),
+            'notes': (0.1, 0.001),
+            'save': (0.1, 0.001),
+        },
+        'fast': {
+            'metadata': (2.0, 0.0),
+            'download': (3.0, 0.05),
+            'transcode': (0.5, 0.01),
+            'pitch': (0.5, 0.005),
+            'notes': (0.1, 0.002),
+            'save': (0.1, 0.002),
+        },
+    }
+    COST_MODEL_MIN_SAMPLES = 5  # Recorded timings needed before a stage is calibrated
+    COST_MODEL_HISTORY = 200  # Most recent timings per stage the model is fitted to
+    COST_MODEL_REFRESH = 300  # Seconds between recalibrations
+    
+    # Admission control: costs are estimated worker-seconds
+    ADMISSION_USER_BUDGET = 1800  # Max cost of one user's unfinished analyses
+    ADMISSION_QUEUE_LIMIT = 3600  # Max estimated wait (seconds) before submissions are refused
+    
+    # Job control
+    CANCEL_CHECK_INTERVAL = 2.0  # Seconds between cancellation checks while a stage runs
+    STAGE_TIMEOUTS = {  # Hard limits in seconds; the stage's process is killed when exceeded
+        'metadata': 60,
+        'download': 600,
+        'transcode': 300,
+        'pitch': 1800,
+    }
+    
+    # Background pipeline (see app/pipeline.py)
+    PIPELINE_IO_WORKERS = int(os.environ.get('PIPELINE_IO_WORKERS', 4))  # metadata, download, transcode
+    PIPELINE_CPU_WORKERS = int(os.environ.get('PIPELINE_CPU_WORKERS', max(1, (os.cpu_count() or 2) - 1)))  # pitch, notes
+    PIPELINE_QUEUE_SIZE = 2  # Jobs buffered between stages before upstream workers wait
+    PIPELINE_AUTOSTART = os.environ.get('PIPELINE_AUTOSTART', '0') == '1'  # Start workers with the app
+    PIPELINE_RECOVER_AFTER = 600  # Seconds a job's lease outlives its last renewal before another process requeues it (0 disables)
+    PIPELINE_LEASE_INTERVAL = 60  # Seconds between renewals of the leases on a process' pending, queued and running jobs
+    
+    # Progress streaming (Server-Sent Events)
+    SSE_POLL_INTERVAL = 1.0  # Seconds between status checks per open stream
+    SSE_HEARTBEAT_INTERVAL = 15.0  # Seconds of silence before a keep-alive comment
+    SSE_NOTE_BATCH_SIZE = 500  # Max notes pushed per event
+    
+    # Search (see app/search.py)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'fts5')  # 'fts5' (SQLite full-text index) or 'like'
+    
+    # Listings (see app/pagination.py)
+    PAGINATION_COUNT_TTL = 60  # Seconds a listing's total count is reused
+    PAGINATION_COUNT_CACHE_SIZE = 256  # Distinct listings whose counts are cached per process
+    
+    # Favorite status on pages (see app/favorites.py)
+    FAVORITES_CACHE_TTL = 300  # Seconds a user's set of favorited IDs is reused (other processes lag by up to this)
+    FAVORITES_CACHE_SIZE = 1024  # Users whose favorites are cached per process
+    FAVORITES_CACHE_MAX_IDS = 2000  # Users with more favorites are looked up per page instead
+    
+    # HTTP caching of analysis responses (see app/http_cache.py)
+    ENGINE_VERSION = 1  # Part of every ETag; bump when a change alters the notes, exports or pages built from an analysis
+    HTTP_CACHE_MAX_AGE = 0  # Seconds clients may reuse a response before revalidating it
+    
+    # Page cache of anonymous visitors' index and browse pages and listing queries (see app/page_cache.py)
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')  # 'memory' (per process), 'filesystem' or 'sqlite' (shared by a host's workers), or 'none'
+    PAGE_CACHE_TIMEOUT = 300  # Seconds an entry is kept; committed changes to public analyses invalidate it sooner
+    PAGE_CACHE_SIZE = 1024  # Entries kept before the least recently used (memory) or oldest go
+    PAGE_CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')  # For the filesystem backend
+    PAGE_CACHE_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_cache.db')  # For the sqlite backend
+    
+    # Serialized analyses and notes, reused while unchanged (see app/serializers.py)
+    SERIALIZER_CACHE_BYTES = 32 * 1024 * 1024  # Max JSON cached per process
+    
+    # Retention (see app/retention.py)
+    RETENTION_DAYS = 30  # Private analyses nobody favorited are deleted after this many days
+    CLEANUP_BATCH_SIZE = 500  # Analyses deleted per transaction
+    CLEANUP_BATCH_PAUSE = 0.05  # Seconds between batches, so other writers get the database
+    ORPHAN_FILE_MIN_AGE = 24 * 3600  # Seconds before an unreferenced upload, checkpoint or scratch file is removed
+    
+    # Database concurrency (see app/database.py)
+    DB_ROLE = os.environ.get('DB_ROLE', 'web')  # Key of DB_ENGINE_OPTIONS for this process
+    DB_ENGINE_OPTIONS = {
+        # Request threads, plus the pipeline when it runs in the same process
+        'web': {'pool_size': 10 + PIPELINE_IO_WORKERS + PIPELINE_CPU_WORKERS, 'max_overflow': 10, 'pool_timeout': 10},
+        # Pipeline threads keep their connection for a whole stage; plus the writer and upgrader
+        'worker': {'pool_size': PIPELINE_IO_WORKERS + PIPELINE_CPU_WORKERS + 2, 'max_overflow': 0, 'pool_timeout': 60},
+        # Command-line tools, migrations and benchmarks
+        'script': {'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 30},
+    }
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # Readers and the writer don't block each other
+        'synchronous': 'NORMAL',  # Durable with WAL except on power loss; no fsync per commit
+        'mmap_size': 256 * 1024 * 1024,  # Bytes of the database read through memory mapping
+        'busy_timeout': 10000,  # Milliseconds to wait for the write lock before "database is locked"
+    }
+    DB_WRITE_QUEUE = True  # Pipeline writes go through one writer thread per process
+    DB_WRITE_BATCH = 50  # Queued writes the writer may commit in one transaction
+    QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', '0') == '1'  # Send each request's SQL statement count in X-Query-Count
     
     # Logging configuration
     LOG_LEVEL = 'DEBUG'
@@ -0,0 +1,45 @@
+import os
+import sys
+from sqlalchemy import text
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+
+# Admission control columns added to the analyses table
+NEW_COLUMNS = {
+    'profile': "VARCHAR(20) NOT NULL DEFAULT 'standard'",
+    'estimated_cost': 'FLOAT',
+    'requested_profile': 'VARCHAR(20)',
+}
+
+def upgrade():
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            # Get all columns in the analyses table
+            result = conn.execute(text("PRAGMA table_info(analyses)")).fetchall()
+            columns = [row[1] for row in result]  # Column names are in the second position
+
+            missing = [name for name in NEW_COLUMNS if name not in columns]
+            if not missing:
+                print("Admission columns already exist in analyses table.")
+            else:
+                print("Adding admission columns to analyses table...")
+                for name in missing:
+                    conn.execute(text(f"ALTER TABLE analyses ADD COLUMN {name} {NEW_COLUMNS[name]}"))
+                    print(f"Added column: {name}")
+
+                # Older rows never had their duration filled in
+                conn.execute(text("UPDATE analyses SET duration = end_time - start_time "
+                                  "WHERE duration IS NULL"))
+                conn.commit()
+                print("Successfully added admission columns to analyses table.")
+
+        # The stage_timings table is new and created by create_all
+        db.create_all()
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,37 @@
+import os
+import sys
+from sqlalchemy import text
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+
+# Uploaded audio, tracked so cleanup can delete it with its analysis
+NEW_COLUMNS = {
+    'audio_path': 'VARCHAR(512)',
+}
+
+def upgrade():
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            # Get all columns in the analyses table
+            result = conn.execute(text("PRAGMA table_info(analyses)")).fetchall()
+            columns = [row[1] for row in result]  # Column names are in the second position
+
+            missing = [name for name in NEW_COLUMNS if name not in columns]
+            if not missing:
+                print("audio_path column already exists in analyses table.")
+                return
+
+            print("Adding audio_path column to analyses table...")
+            for name in missing:
+                conn.execute(text(f"ALTER TABLE analyses ADD COLUMN {name} {NEW_COLUMNS[name]}"))
+                print(f"Added column: {name}")
+            conn.commit()
+            print("Successfully added audio_path column to analyses table.")
+
+if __name__ == '__main__':
+    upgrade()
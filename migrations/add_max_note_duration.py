@@ -0,0 +1,41 @@
+import os
+import sys
+from sqlalchemy import text
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+from app.models import Analysis, PackedNotes
+from app.note_store import load_notes
+
+def upgrade():
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            # Get all columns in the analyses table
+            result = conn.execute(text("PRAGMA table_info(analyses)")).fetchall()
+            columns = [row[1] for row in result]  # Column names are in the second position
+
+            if 'max_note_duration' not in columns:
+                print("Adding max_note_duration column to analyses table...")
+                conn.execute(text("ALTER TABLE analyses ADD COLUMN max_note_duration FLOAT"))
+                conn.commit()
+
+        # Longest note of every analysis stored as rows, in one statement
+        print("Computing the longest note of each analysis...")
+        db.session.execute(text(
+            "UPDATE analyses SET max_note_duration = "
+            "(SELECT max(duration) FROM notes WHERE notes.analysis_id = analyses.id)"))
+
+        # Packed notes have to be decoded
+        for analysis_id, in db.session.query(PackedNotes.analysis_id):
+            durations = load_notes(analysis_id).arrays['duration']
+            db.session.execute(Analysis.__table__.update().where(Analysis.id == analysis_id).values(
+                max_note_duration=float(durations.max()) if len(durations) else None))
+        db.session.commit()
+        print("Successfully added max_note_duration column to analyses table.")
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,41 @@
+import os
+import sys
+from sqlalchemy import text
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+
+# Job status columns added to the analyses table
+NEW_COLUMNS = {
+    'stage': 'VARCHAR(20)',
+    'progress': 'FLOAT DEFAULT 0.0',
+    'error_message': 'TEXT',
+    'started_at': 'DATETIME',
+    'completed_at': 'DATETIME',
+}
+
+def upgrade():
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            # Get all columns in the analyses table
+            result = conn.execute(text("PRAGMA table_info(analyses)")).fetchall()
+            columns = [row[1] for row in result]  # Column names are in the second position
+
+            missing = [name for name in NEW_COLUMNS if name not in columns]
+            if not missing:
+                print("Progress columns already exist in analyses table.")
+                return
+
+            print("Adding progress columns to analyses table...")
+            for name in missing:
+                conn.execute(text(f"ALTER TABLE analyses ADD COLUMN {name} {NEW_COLUMNS[name]}"))
+                print(f"Added column: {name}")
+            conn.commit()
+            print("Successfully added progress columns to analyses table.")
+
+if __name__ == '__main__':
+    upgrade()
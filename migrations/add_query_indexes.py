@@ -0,0 +1,23 @@
+import os
+import sys
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+from app.models import Analysis, Note, Favorite
+
+def upgrade():
+    app = create_app()
+    with app.app_context():
+        # Create the composite indexes declared in the models' __table_args__
+        with db.engine.begin() as conn:
+            for model in (Analysis, Note, Favorite):
+                for index in model.__table__.indexes:
+                    print(f"Creating index {index.name} on {model.__tablename__} if missing...")
+                    index.create(bind=conn, checkfirst=True)
+        print("Successfully added query indexes. Run check_query_plans.py to verify the query plans.")
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+from app.search import get_search_backend, Fts5SearchBackend
+
+def upgrade():
+    # create_app installs the search index and its triggers
+    app = create_app()
+    with app.app_context():
+        backend = get_search_backend(app)
+        if not isinstance(backend, Fts5SearchBackend):
+            print(f"Search backend is '{backend.name}'; there is no index to build.")
+            return
+
+        # Reindex everything, also rows written while the triggers were missing
+        print("Rebuilding the full-text search index...")
+        with db.engine.begin() as conn:
+            backend.rebuild(conn)
+        print("Successfully rebuilt the full-text search index.")
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,33 @@
+import os
+import sys
+from sqlalchemy import text
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+from app.stats import reconcile_stats
+
+def upgrade():
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            # Get all columns in the analyses table
+            result = conn.execute(text("PRAGMA table_info(analyses)")).fetchall()
+            columns = [row[1] for row in result]  # Column names are in the second position
+
+            if 'note_count' not in columns:
+                print("Adding note_count column to analyses table...")
+                conn.execute(text("ALTER TABLE analyses ADD COLUMN note_count INTEGER NOT NULL DEFAULT 0"))
+                conn.commit()
+
+        # Create the user_stats table
+        db.create_all()
+
+        # Fill in the counters from the existing data
+        users = reconcile_stats()
+        print(f"Counters computed for {users} users.")
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,43 @@
+import os
+import sys
+import argparse
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+from app.models import Note, PackedNotes
+from app.note_store import load_notes, save_notes
+
+def convert(storage):
+    """Move the notes of every analysis to the given storage format."""
+    app = create_app()
+    with app.app_context():
+        # The packed_notes table is new and created by create_all
+        db.create_all()
+
+        if storage == 'packed':
+            ids = [row[0] for row in db.session.query(Note.analysis_id).distinct()]
+        else:
+            ids = [row[0] for row in db.session.query(PackedNotes.analysis_id)]
+
+        print(f"Converting the notes of {len(ids)} analyses to {storage} storage...")
+        for analysis_id in ids:
+            # Back to the track_to_notes shape save_notes expects
+            notes = [{
+                'note': note['note'],
+                'frequency': note['frequency'],
+                'time': note['start_time'],
+                'duration': note['duration'],
+                'confidence': note['confidence']
+            } for note in load_notes(analysis_id).all()]
+            save_notes(analysis_id, notes, storage, app.config['NOTE_INSERT_BATCH_SIZE'])
+            db.session.commit()
+            print(f"Analysis {analysis_id}: {len(notes)} notes")
+        print("Done. Set NOTE_STORAGE to keep saving new analyses this way.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert stored notes between row and packed storage.')
+    parser.add_argument('--to', choices=['packed', 'rows'], default='packed')
+    convert(parser.parse_args().to)
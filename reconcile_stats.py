@@ -0,0 +1,25 @@
+"""
+Recompute the dashboard counters from the analyses, notes and favorites tables.
+
+The counters are kept up to date as analyses complete, are deleted and are
+favorited; run this after editing the database by hand or if they drift.
+
+    python reconcile_stats.py
+"""
+
+import argparse
+
+from app import create_app
+from app.stats import reconcile_stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        users = reconcile_stats()
+    print(f'Counters recomputed for {users} users')
+
+if __name__ == '__main__':
+    main()
@@ -60,8 +60,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(data.error || 'Failed to analyze video');
             }
             
+            // The analysis runs in the background; wait for its result
+            const result = await waitForJob(data.status_url);
+            
             // Display results with the correct timing
-            displayResults(data.notes, endTime - startTime, startTime);
+            displayResults(result.notes, endTime - startTime, startTime);
             
         } catch (error) {
             console.error('Error:', error);
@@ -73,6 +76,29 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    // Poll a job until it has finished, backing off from 1s to 5s between checks
+    async function waitForJob(statusUrl) {
+        let delay = 1000;
+        
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+            delay = Math.min(delay * 1.5, 5000);
+            
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+            
+            if (!response.ok) {
+                throw new Error(job.error || 'Lost track of the analysis');
+            }
+            if (job.status === 'completed') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Failed to analyze video');
+            }
+        }
+    }
+    
     // Display analysis results with timing information
     function displayResults(notes, duration, startTime) {
         resultsBody.innerHTML = '';
@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import unittest
+from unittest import mock
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from app import serializers
+from app.serializers import dumps, FastJSONProvider, orjson
+
+# Values as the pitch and note code hands them over
+NUMPY_VALUES = {'frequency': np.float64(261.63), 'confidence': np.float64(0.875), 'time': 1.5}
+
+class NumpyScalarTest(unittest.TestCase):
+    """NumPy scalars encode the same with and without orjson."""
+
+    def test_standard_library(self):
+        with mock.patch.object(serializers, 'orjson', None):
+            data = dumps(NUMPY_VALUES)
+        self.assertEqual(json.loads(data), {'frequency': 261.63, 'confidence': 0.875, 'time': 1.5})
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson(self):
+        with mock.patch.object(serializers, 'orjson', None):
+            expected = dumps(NUMPY_VALUES)
+        self.assertEqual(dumps(NUMPY_VALUES), expected)
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_provider(self):
+        app = Flask(__name__)
+        app.json = FastJSONProvider(app)
+        with app.app_context():
+            response = app.json.response(NUMPY_VALUES)
+            self.assertEqual(json.loads(response.get_data()), json.loads(dumps(NUMPY_VALUES)))
+            self.assertEqual(json.loads(app.json.dumps({'values': [np.float64(0.5)]})), {'values': [0.5]})
+
+if __name__ == '__main__':
+    unittest.main()
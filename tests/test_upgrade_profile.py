@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app import create_app, db
+from app.models import User, Analysis
+from app import tasks
+from app.jobs import JobCancelled
+from app.tasks import (AnalysisJob, run_stage, fetch_metadata, track_pitch_stage, find_upgradable_analysis,
+                       store_results)
+
+class UpgradeProfileTest(unittest.TestCase):
+    """A background upgrade reruns a degraded analysis at the profile it upgrades to."""
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+
+        class TestConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.root.name, 'test.db')
+            LOG_FILE = os.path.join(self.root.name, 'test.log')
+            TEMP_FOLDER = os.path.join(self.root.name, 'temp')
+            CHECKPOINT_FOLDER = os.path.join(self.root.name, 'checkpoints')
+            QUALITY_UPGRADE_INTERVAL = 0
+            DB_WRITE_QUEUE = False
+
+        self.app = create_app(TestConfig)
+        self.context = self.app.app_context()
+        self.context.push()
+
+        user = User(username='test', email='test@example.com')
+        db.session.add(user)
+        db.session.flush()
+        analysis = Analysis(user_id=user.id, title='test', video_url='https://example.com/video',
+                            start_time=0, end_time=30, duration=30, status='completed', profile='fast')
+        db.session.add(analysis)
+        db.session.commit()
+        self.analysis_id = analysis.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.context.pop()
+        self.root.cleanup()
+
+    def test_upgrade_runs_with_target_profile_settings(self):
+        standard = self.app.config['ANALYSIS_PROFILES']['standard']
+        job = AnalysisJob(self.analysis_id, profile='standard')
+
+        with mock.patch.object(tasks, 'run_subprocess'), \
+                mock.patch.object(tasks, 'record_stage_timing') as record_stage_timing:
+            job = run_stage('metadata', fetch_metadata, job)
+
+        self.assertIsNotNone(job)
+        self.assertEqual(job.profile, 'standard')
+        self.assertEqual(job.settings, standard)
+        self.assertEqual(record_stage_timing.call_args.args[2], 'standard')
+
+        # The pitch tracker gets the standard pYIN settings, not the fast YIN ones
+        job.audio_path = os.path.join(self.root.name, 'segment.wav')
+        with mock.patch.object(tasks, 'run_in_child', return_value={}) as run_in_child:
+            track_pitch_stage(job)
+        kwargs = run_in_child.call_args.kwargs['kwargs']
+        self.assertEqual(kwargs['backend'], 'pyin')
+        self.assertEqual(kwargs['sr'], standard['sample_rate'])
+        self.assertEqual(kwargs['frame_length'], standard['frame_length'])
+        self.assertEqual(kwargs['hop_length'], standard['hop_length'])
+
+        # The analysis keeps its status while the upgrade runs
+        self.assertEqual(db.session.get(Analysis, self.analysis_id).status, 'completed')
+
+    def test_explicit_profile_is_not_upgraded(self):
+        self.assertEqual(find_upgradable_analysis('standard'), self.analysis_id)
+
+        analysis = db.session.get(Analysis, self.analysis_id)
+        analysis.requested_profile = 'fast'
+        db.session.commit()
+        self.assertIsNone(find_upgradable_analysis('standard'))
+
+    def store_upgrade(self, version):
+        store_results(self.analysis_id, [], [], None, 'standard', True,
+                      self.app.config['NOTE_STORAGE'], self.app.config['NOTE_INSERT_BATCH_SIZE'],
+                      version=version)
+        db.session.commit()
+
+    def test_upgrade_of_changed_analysis_is_discarded(self):
+        version = db.session.get(Analysis, self.analysis_id).updated_at
+
+        # Requeued by an edit while the upgrade was running
+        analysis = db.session.get(Analysis, self.analysis_id)
+        analysis.status = 'queued'
+        db.session.commit()
+        with self.assertRaises(JobCancelled):
+            self.store_upgrade(version)
+        db.session.rollback()
+
+        analysis = db.session.get(Analysis, self.analysis_id)
+        self.assertEqual((analysis.status, analysis.profile), ('queued', 'fast'))
+
+    def test_upgrade_of_unchanged_analysis_is_stored(self):
+        self.store_upgrade(db.session.get(Analysis, self.analysis_id).updated_at)
+
+        analysis = db.session.get(Analysis, self.analysis_id)
+        self.assertEqual((analysis.status, analysis.profile), ('completed', 'standard'))
+
+if __name__ == '__main__':
+    unittest.main()